@@ -0,0 +1,112 @@
+import os
+import time
+from queue import Queue
+from threading import Thread, Lock
+
+from Stores.projectStore import ProjectStore, write_chunks
+from Utiles.chunkfile import ChunkAppender, ChunkWriter, compact
+
+AUTOSAVE_SUFFIX = ".autosave"
+UNTITLED_PATH = "untitled.xcp"
+
+
+def autosave_path(project_path):
+    return (project_path or UNTITLED_PATH) + AUTOSAVE_SUFFIX
+
+
+class AutoSaver:
+    """后台自动保存: 主循环在帧边界生成脏区块快照, 由后台线程追加写入自动保存文件"""
+
+    def __init__(self, interval=120.0, compact_ratio=0.5):
+        self.interval = interval
+        self.compact_ratio = compact_ratio
+        self.last_error = None
+        self._last_time = time.time()
+        self._queue = Queue()
+        self._lock = Lock()
+        self._busy = False
+        # 写入失败的区块组, 下次快照时重新写入
+        self._failed = set()
+        # 自动保存文件已包含完整项目时才能只追加脏区块
+        self._base_path = None
+        self._thread = Thread(target=self._run, name="AutoSaver", daemon=True)
+        self._thread.start()
+
+    def tick(self, project: ProjectStore):
+        """每帧调用一次, 只在间隔到达且后台空闲时生成快照, 不会等待磁盘"""
+        now = time.time()
+        if now - self._last_time < self.interval:
+            return
+        scene = project.scene
+        with self._lock:
+            if self._busy:
+                return
+            if not scene.dirty and not self._failed:
+                # 没有修改时不写入; 自动保存文件缺失或过期时, 也等到有修改后再写入完整项目
+                self._last_time = now
+                return
+            failed, self._failed = self._failed, set()
+            base_path = self._base_path
+
+        path = autosave_path(project.path)
+        groups = scene.dirty | failed
+        full = path != base_path
+        chunks = project.snapshot(None if full else groups)
+        scene.dirty = set()
+        self._last_time = now
+        with self._lock:
+            self._busy = True
+        self._queue.put((path, chunks, groups, full))
+
+    def reset(self):
+        """打开或手动保存项目后调用, 下次自动保存重新写入完整项目"""
+        self.wait()
+        with self._lock:
+            self._base_path = None
+
+    def wait(self):
+        """等待正在进行的写入完成, 手动保存前调用"""
+        self._queue.join()
+
+    def discard(self, project_path):
+        """项目已手动保存, 删除对应的自动保存文件"""
+        self.reset()
+        path = autosave_path(project_path)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _run(self):
+        while True:
+            path, chunks, groups, full = self._queue.get()
+            try:
+                self._write(path, chunks, full)
+                with self._lock:
+                    self._base_path = path
+                self.last_error = None
+            except Exception as e:
+                print(f"自动保存失败: {path}, 错误: {e}")
+                self.last_error = e
+                with self._lock:
+                    self._failed |= groups
+                    self._base_path = None
+            finally:
+                with self._lock:
+                    self._busy = False
+                self._queue.task_done()
+
+    def _write(self, path, chunks, full):
+        if full:
+            writer = ChunkWriter(path)
+        else:
+            # 自动保存文件被外部删除时抛出异常, 下次重新写入完整项目
+            writer = ChunkAppender(path)
+        try:
+            write_chunks(writer, chunks)
+        except Exception:
+            writer.abort()
+            raise
+        needs_compact = not full and writer.garbage_ratio() > self.compact_ratio
+        writer.close()
+
+        if needs_compact:
+            compact(path)
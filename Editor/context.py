@@ -2,8 +2,10 @@ from enum import Enum, auto
 from queue import Queue
 from threading import Lock
 
-from Utiles.signal import SignalMeta
+from Utiles.signal import Signal, SignalMeta
 from renderer.ds_engine import RenderEngine
+from renderer.soft_raster import SoftwareRenderer
+from renderer.thumbnails import ThumbnailRenderer
 
 
 class AppModeEnum(Enum):
@@ -27,14 +29,25 @@ class Context(metaclass=SignalMeta):
         super().__init__(*args, **kwargs)
         self.render_mode = RenderModeEnum.OPENGL
         self.app_mode = AppModeEnum.EDITOR
+        # 模式切换时发出, 参数为新的模式
+        self.render_mode_changed = Signal("render_mode_changed")
+        self.app_mode_changed = Signal("app_mode_changed")
         self.render = RenderEngine()
         self.render.initialize()
+        # NONE/OTHER 模式下使用的软件渲染器, 不依赖 GPU
+        self.software_render = SoftwareRenderer()
+        # 材质库缩略图, GL 资源在第一次绘制材质列表时创建
+        self.thumbnails = ThumbnailRenderer(self.render)
 
     def switch_app_mode(self, mode: AppModeEnum):
-        self.app_mode = mode
+        if mode != self.app_mode:
+            self.app_mode = mode
+            self.app_mode_changed.emit(mode)
 
     def switch_render_mode(self, mode: RenderModeEnum):
-        self.render_mode = mode
+        if mode != self.render_mode:
+            self.render_mode = mode
+            self.render_mode_changed.emit(mode)
 
     def command_handle(self):
         pass
@@ -3,9 +3,13 @@ import imgui
 from imgui.integrations.glfw import GlfwRenderer
 import OpenGL.GL as gl
 
+from Editor.autosave import AutoSaver
 from Editor.context import Context
+from Editor.mesh_service import MeshService
 from Stores.mainwindowStore import MainWindowStore
+from Utiles.signal import QUEUED, dispatch_queued
 from Views.ui_main_imgui import MainUI
+from renderer import gl_resources
 
 
 class Editor:
@@ -14,6 +18,10 @@ class Editor:
         self.window = -1
         self.impl = None
         self.store = MainWindowStore()
+        self.autosave = AutoSaver()
+        self.mesh_service = MeshService()
+        # 任务在后台线程结束, 结果在下一帧开始时于主线程写回场景
+        self.mesh_service.job_done.connect(self.__on_mesh_job_done, QUEUED)
         self.set_up_imgui()
         self.context = Context()
         self.ui = MainUI(self)
@@ -95,6 +103,10 @@ class Editor:
         while not glfw.window_should_close(self.window):
             glfw.poll_events()
             self.impl.process_inputs()
+            if self.mesh_service.scene is not self.store.project.scene:
+                self.mesh_service.bind(self.store.project.scene)
+            # 执行其它线程排队的信号
+            dispatch_queued()
 
             imgui.new_frame()
             # 渲染主界面
@@ -107,6 +119,30 @@ class Editor:
             self.impl.render(imgui.get_draw_data())
             glfw.swap_buffers(self.window)
 
+            # 帧边界: 生成自动保存快照, 写盘在后台线程完成
+            self.autosave.tick(self.store.project)
+
+        self.mesh_service.shutdown()
+        # 等待缩略图写盘完成, 在 GL 上下文销毁之前释放图集
+        self.context.thumbnails.cleanup()
+        self.context.software_render.shutdown()
+        self.ui.software_texture.cleanup()
+        self.context.render.cleanup()
+        # 此时仍存活的 GL 对象都是泄漏
+        report = gl_resources.TRACKER.leak_report()
+        if report:
+            print(report)
+
+    def __on_mesh_job_done(self, _job):
+        # 同一帧完成的多个任务由第一次调用一起应用, 之后的调用什么也不做
+        for job in self.mesh_service.poll():
+            if job.cancelled:
+                continue
+            if job.future.exception() is not None:
+                self.store.status = f"Failed to process {job.name}"
+            else:
+                self.store.status = f"Processed {job.name}"
+
     def __del__(self):
         # 清理
         self.impl.shutdown()
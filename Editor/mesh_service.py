@@ -0,0 +1,299 @@
+import dataclasses
+import importlib.util
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from Stores.sceneStore import MeshData, NodeKind
+from Utiles.signal import Signal
+
+# 导入网格时默认执行的处理步骤
+IMPORT_OPERATIONS = (("cleanup", {}), ("weld", {}), ("normals", {}))
+# 依赖可选包的处理步骤: 简化需要 fast_simplification, 展开 UV 需要 xatlas
+OPTIONAL_DEPENDENCIES = {"decimate": "fast_simplification", "unwrap": "xatlas"}
+# 当前环境缺少依赖、无法执行的处理步骤
+UNAVAILABLE_OPERATIONS = frozenset(
+    name for name, module in OPTIONAL_DEPENDENCIES.items() if importlib.util.find_spec(module) is None
+)
+# 状态共享内存: [进度, 取消标记]
+PROGRESS, CANCEL = 0, 1
+
+
+class MeshJobCancelled(Exception):
+    pass
+
+
+# 以下函数在子进程中运行, 只依赖 numpy 和 trimesh
+
+def _share(array):
+    """把数组复制到新的共享内存, 返回 (共享内存, 描述符)"""
+    array = np.ascontiguousarray(array)
+    shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach(descriptor):
+    name, shape, dtype = descriptor
+    shm = SharedMemory(name=name)
+    return shm, np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+
+
+def _share_result(array):
+    """子进程创建的结果内存由主进程释放, 不能让子进程的资源跟踪器在退出时删除它"""
+    shm, descriptor = _share(array)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+    return descriptor
+
+
+def _op_normals(mesh):
+    # 统一面的朝向, 顶点法线在输出时重新计算
+    mesh.fix_normals()
+    return mesh
+
+
+def _op_weld(mesh):
+    mesh.merge_vertices()
+    return mesh
+
+
+def _op_cleanup(mesh):
+    # 布尔运算后常见的退化面、重复面和孤立顶点
+    mesh.update_faces(mesh.nondegenerate_faces())
+    mesh.update_faces(mesh.unique_faces())
+    mesh.remove_unreferenced_vertices()
+    mesh.fill_holes()
+    return mesh
+
+
+def _op_decimate(mesh, ratio=0.5):
+    return mesh.simplify_quadric_decimation(face_count=max(4, int(len(mesh.faces) * ratio)))
+
+
+def _op_unwrap(mesh):
+    return mesh.unwrap()
+
+
+OPERATIONS = {
+    "normals": _op_normals,
+    "weld": _op_weld,
+    "cleanup": _op_cleanup,
+    "decimate": _op_decimate,
+    "unwrap": _op_unwrap,
+}
+
+
+def _worker_init():
+    # 降低子进程优先级, 导入时占满所有核心也不影响编辑器帧率
+    if hasattr(os, "nice"):
+        os.nice(10)
+
+
+def _run_job(status_descriptor, source, operations):
+    """子进程入口; source 为文件路径, 或 (顶点描述符, 索引描述符)"""
+    import trimesh
+
+    status_shm, status = _attach(status_descriptor)
+    shms = [status_shm]
+    try:
+        steps = len(operations) + 1
+        if isinstance(source, str):
+            mesh = trimesh.load(source, force="mesh", process=False)
+        else:
+            vertex_shm, vertices = _attach(source[0])
+            index_shm, indices = _attach(source[1])
+            shms += [vertex_shm, index_shm]
+            mesh = trimesh.Trimesh(
+                vertices[:, :3].copy(), indices.reshape(-1, 3).copy(), process=False,
+                visual=trimesh.visual.TextureVisuals(uv=vertices[:, 6:8].copy()),
+            )
+        status[PROGRESS] = 1 / steps
+
+        for i, (name, args) in enumerate(operations):
+            # 只能在步骤之间响应取消
+            if status[CANCEL]:
+                raise MeshJobCancelled()
+            mesh = OPERATIONS[name](mesh, **args)
+            status[PROGRESS] = (i + 2) / steps
+
+        uv = getattr(mesh.visual, "uv", None)
+        if uv is None or len(uv) != len(mesh.vertices):
+            uv = np.zeros((len(mesh.vertices), 2))
+        vertices = np.hstack([mesh.vertices, mesh.vertex_normals, uv]).astype(np.float32)
+        indices = mesh.faces.astype(np.uint32).ravel()
+        return _share_result(vertices), _share_result(indices)
+    finally:
+        # 共享内存描述符在函数返回后失效, 先释放引用再关闭
+        status = vertices = indices = None
+        for shm in shms:
+            shm.close()
+
+
+def _take(descriptor):
+    """读取子进程返回的结果并释放共享内存"""
+    shm, array = _attach(descriptor)
+    try:
+        return array.copy()
+    finally:
+        array = None
+        shm.close()
+        shm.unlink()
+
+
+@dataclasses.dataclass
+class MeshJob:
+    name: str
+    mesh_id: int  # 为 None 时是导入, 完成后添加新网格和节点
+    future: object
+    status_shm: SharedMemory
+    status: np.ndarray
+    inputs: list
+    cancelled: bool = False
+
+    @property
+    def progress(self):
+        return float(self.status[PROGRESS])
+
+
+class MeshService:
+    """网格处理服务: 法线、焊接、减面、清理和 UV 展开在进程池中运行, 不占用界面进程的 GIL
+
+    顶点和索引通过共享内存传递, 进度和取消标记也放在共享内存中。
+    任务结束时在进程池的管理线程中发出 job_done, 以排队方式连接的槽在主循环中调用 poll,
+    把完成的结果写回场景。
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.jobs = []
+        self.last_error = None
+        self.scene = None
+        self._pool = None
+        self._applying = False
+        # 任务完成、失败或取消时发出, 参数为 MeshJob
+        self.job_done = Signal("job_done")
+
+    def bind(self, scene):
+        if self.scene is not None and self in self.scene.observers:
+            self.scene.observers.remove(self)
+        # 换了场景后旧场景的任务结果没有意义
+        for job in list(self.jobs):
+            self._cancel(job)
+        self.scene = scene
+        scene.observers.append(self)
+
+    def _executor(self):
+        if self._pool is None:
+            # 使用 spawn, 不复制带有 GL 上下文和线程的界面进程
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_worker_init
+            )
+        return self._pool
+
+    def process(self, mesh_id, operations):
+        """对已有网格执行处理步骤; 同一网格上未完成的任务会被取消"""
+        self.cancel(mesh_id)
+        mesh = self.scene.mesh(mesh_id)
+        vertex_shm, vertex_descriptor = _share(mesh.vertices.astype(np.float32))
+        index_shm, index_descriptor = _share(mesh.indices.astype(np.uint32))
+        return self._submit(mesh.name, mesh_id, (vertex_descriptor, index_descriptor), operations,
+                            [vertex_shm, index_shm])
+
+    def import_file(self, path, operations=IMPORT_OPERATIONS):
+        """在子进程中加载并处理网格文件, 完成后添加到场景根节点下"""
+        name = os.path.splitext(os.path.basename(path))[0]
+        return self._submit(name, None, path, operations, [])
+
+    def _submit(self, name, mesh_id, source, operations, inputs):
+        for op, _ in operations:
+            if op not in OPERATIONS:
+                raise ValueError(f"未知的网格处理步骤: {op}")
+            if op in UNAVAILABLE_OPERATIONS:
+                raise ValueError(f"网格处理步骤 {op} 需要安装 {OPTIONAL_DEPENDENCIES[op]}")
+        status_shm, status_descriptor = _share(np.zeros(2, dtype=np.float64))
+        status = np.ndarray((2,), np.float64, buffer=status_shm.buf)
+        future = self._executor().submit(_run_job, status_descriptor, source, tuple(operations))
+        job = MeshJob(name, mesh_id, future, status_shm, status, inputs)
+        self.jobs.append(job)
+        future.add_done_callback(lambda _, job=job: self.job_done.emit(job))
+        return job
+
+    def cancel(self, mesh_id):
+        for job in list(self.jobs):
+            if job.mesh_id is not None and job.mesh_id == mesh_id:
+                self._cancel(job)
+
+    def _cancel(self, job):
+        # 还没开始的任务直接取消, 正在运行的在下一个步骤之前退出
+        job.cancelled = True
+        job.future.cancel()
+        job.status[CANCEL] = 1.0
+
+    def on_mesh_changed(self, mesh_id):
+        # 用户再次编辑了网格, 正在处理的旧数据已经过期
+        if not self._applying:
+            self.cancel(mesh_id)
+
+    def poll(self):
+        """在主线程中应用已完成的任务, 返回这次处理的任务"""
+        finished = []
+        for job in [job for job in self.jobs if job.future.done()]:
+            self.jobs.remove(job)
+            finished.append(job)
+            try:
+                result = None if job.future.cancelled() else job.future.result()
+            except MeshJobCancelled:
+                result = None
+            except Exception as e:
+                print(f"网格处理失败: {job.name}, 错误: {e}")
+                self.last_error = f"{job.name}: {e}"
+                result = None
+            finally:
+                self._release(job)
+            if result is None:
+                continue
+
+            vertices, indices = _take(result[0]), _take(result[1])
+            if job.cancelled:
+                continue
+            self._apply(job, MeshData(job.name, vertices, indices))
+        return finished
+
+    def _apply(self, job, mesh):
+        scene = self.scene
+        self._applying = True
+        try:
+            if job.mesh_id is None:
+                mesh_id = scene.add_mesh(mesh)
+                scene.add_node(job.name, -1, NodeKind.MESH, mesh_id=mesh_id, material_id=0)
+            else:
+                scene.set_mesh(job.mesh_id, mesh)
+        finally:
+            self._applying = False
+
+    def _release(self, job):
+        job.status = None
+        for shm in [job.status_shm] + job.inputs:
+            shm.close()
+            shm.unlink()
+        job.inputs = []
+
+    @property
+    def progress(self):
+        """所有未完成任务的平均进度"""
+        if not self.jobs:
+            return 1.0
+        return sum(job.progress for job in self.jobs) / len(self.jobs)
+
+    def shutdown(self):
+        for job in list(self.jobs):
+            self._cancel(job)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        self.poll()
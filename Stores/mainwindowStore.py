@@ -1,6 +1,15 @@
 import dataclasses
 
+from Stores.projectStore import ProjectStore
+from Stores.selectionStore import SelectionStore
+
 
 @dataclasses.dataclass
 class MainWindowStore:
-    pass
\ No newline at end of file
+    project: ProjectStore = dataclasses.field(default_factory=ProjectStore)
+    # 文件对话框: "open" / "save_as" / None
+    file_dialog: str = None
+    file_path_input: str = ""
+    status: str = "Ready"
+    # 当前选中的场景节点 id
+    selection: SelectionStore = dataclasses.field(default_factory=SelectionStore)
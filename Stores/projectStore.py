@@ -0,0 +1,192 @@
+import numpy as np
+
+from Stores.sceneStore import SceneStore, MeshData, TextureData
+from Utiles.chunkfile import ChunkReader, ChunkWriter
+
+
+def write_chunks(writer, chunks, reader=None):
+    """把快照写入 ChunkWriter, "copy" 类型的区块从 data 指向的文件中复制"""
+    readers = {}
+    try:
+        for name, kind, data in chunks:
+            if kind == "array":
+                writer.write_array(name, data)
+            elif kind == "strings":
+                writer.write_strings(name, data)
+            elif kind == "json":
+                writer.write_json(name, data)
+            elif kind == "copy":
+                if reader is not None and reader.path == data:
+                    source = reader
+                else:
+                    source = readers.get(data)
+                    if source is None:
+                        source = readers[data] = ChunkReader(data)
+                writer.copy_from(source, name)
+            else:
+                raise ValueError(f"未知的区块类型: {kind}")
+    finally:
+        for source in readers.values():
+            source.close()
+
+
+class ProjectStore:
+    """项目文件读写: 场景、网格、材质、纹理和编辑器状态分别存放在独立区块中"""
+
+    def __init__(self):
+        self.path = None
+        self.scene = SceneStore.default()
+        self.editor_state = {}
+        self._reader = None
+        self._mesh_names = []
+        self._texture_info = []
+
+    def new(self):
+        self.close()
+        self.path = None
+        self.scene = SceneStore.default()
+        self.editor_state = {}
+
+    def open(self, path):
+        reader = ChunkReader(path)
+        try:
+            scene = SceneStore(
+                names=reader.read_strings("scene/names"),
+                parents=reader.read_array("scene/parents"),
+                kinds=reader.read_array("scene/kinds"),
+                alive=reader.read_array("scene/alive"),
+                transforms=reader.read_array("scene/transforms"),
+                mesh_ids=reader.read_array("scene/mesh_ids"),
+                material_ids=reader.read_array("scene/material_ids"),
+                tags={int(k): tuple(v) for k, v in reader.read_json("scene/tags").items()},
+                material_names=reader.read_strings("materials/names"),
+                materials=reader.read_array("materials/params"),
+                material_textures=reader.read_array("materials/textures"),
+            )
+            mesh_names = reader.read_json("meshes")
+            textures = reader.read_json("textures")
+            editor_state = reader.read_json("editor")
+        except Exception:
+            reader.close()
+            raise
+
+        scene.meshes = [None] * len(mesh_names)
+        scene.textures = [None] * len(textures)
+        scene.dirty.clear()
+
+        self.close()
+        self.scene = scene
+        self.editor_state = editor_state
+        self._attach(path, reader, mesh_names, textures)
+
+    def _attach(self, path, reader, mesh_names, texture_info):
+        self.path = path
+        self._reader = reader
+        self._mesh_names = mesh_names
+        self._texture_info = texture_info
+        self.scene.loader = self
+
+    def load_mesh(self, mesh_id):
+        return MeshData(
+            self._mesh_names[mesh_id],
+            self._reader.read_array(f"mesh/{mesh_id}/vertices"),
+            self._reader.read_array(f"mesh/{mesh_id}/indices"),
+        )
+
+    def load_texture(self, texture_id):
+        info = self._texture_info[texture_id]
+        name = f"texture/{texture_id}"
+        pixels = self._reader.read_array(name) if name in self._reader else None
+        return TextureData(info["name"], info["path"], pixels)
+
+    def snapshot(self, groups=None):
+        """生成区块快照 [(name, kind, data)], groups 为 None 时包含全部区块
+
+        场景数组会被复制, 网格和纹理数组只整体替换不原地修改, 直接引用即可;
+        快照生成后可以交给其他线程写入文件
+        """
+        scene = self.scene
+
+        def want(group):
+            return groups is None or group in groups
+
+        chunks = []
+        if want("names"):
+            chunks.append(("scene/names", "strings", list(scene.names)))
+        if want("nodes"):
+            for field in ("parents", "kinds", "alive", "mesh_ids", "material_ids"):
+                chunks.append((f"scene/{field}", "array", getattr(scene, field).copy()))
+        if want("transforms"):
+            chunks.append(("scene/transforms", "array", scene.transforms.copy()))
+        if want("tags"):
+            chunks.append(("scene/tags", "json", {str(k): list(v) for k, v in scene.tags.items()}))
+        if want("materials"):
+            chunks.append(("materials/names", "strings", list(scene.material_names)))
+            chunks.append(("materials/params", "array", scene.materials.copy()))
+            chunks.append(("materials/textures", "array", scene.material_textures.copy()))
+        if want("editor"):
+            chunks.append(("editor", "json", dict(self.editor_state)))
+
+        # 未加载的网格和纹理直接从原文件复制区块
+        if want("meshes"):
+            names = [self._mesh_names[i] if mesh is None else mesh.name for i, mesh in enumerate(scene.meshes)]
+            chunks.append(("meshes", "json", names))
+        for i, mesh in enumerate(scene.meshes):
+            if not want(f"mesh/{i}"):
+                continue
+            if mesh is None:
+                chunks.append((f"mesh/{i}/vertices", "copy", self.path))
+                chunks.append((f"mesh/{i}/indices", "copy", self.path))
+            else:
+                chunks.append((f"mesh/{i}/vertices", "array", mesh.vertices))
+                chunks.append((f"mesh/{i}/indices", "array", mesh.indices))
+
+        if want("textures"):
+            info = [self._texture_info[i] if texture is None else {"name": texture.name, "path": texture.path}
+                    for i, texture in enumerate(scene.textures)]
+            chunks.append(("textures", "json", info))
+        for i, texture in enumerate(scene.textures):
+            name = f"texture/{i}"
+            if not want(name):
+                continue
+            if texture is None:
+                if name in self._reader:
+                    chunks.append((name, "copy", self.path))
+            elif texture.pixels is not None:
+                chunks.append((name, "array", np.asarray(texture.pixels)))
+        return chunks
+
+    def save(self, path=None):
+        path = path or self.path
+        if path is None:
+            raise ValueError("项目尚未指定保存路径")
+
+        chunks = self.snapshot()
+        writer = ChunkWriter(path)
+        try:
+            write_chunks(writer, chunks, self._reader)
+        except Exception:
+            writer.abort()
+            raise
+        mesh_names = next(data for name, _, data in chunks if name == "meshes")
+        texture_info = next(data for name, _, data in chunks if name == "textures")
+
+        # 替换文件前必须释放旧文件的映射(Windows 下无法替换已映射的文件)
+        old_path = self.path
+        self.close()
+        try:
+            writer.close()
+        except Exception:
+            if old_path is not None:
+                self._attach(old_path, ChunkReader(old_path), self._mesh_names, self._texture_info)
+            raise
+        # 已加载的数据保留在内存中, 未加载的区块改为从新文件读取
+        self._attach(path, ChunkReader(path), mesh_names, texture_info)
+        self.scene.dirty.clear()
+
+    def close(self):
+        if self._reader is None:
+            return
+        self.scene.loader = None
+        self._reader.close()
+        self._reader = None
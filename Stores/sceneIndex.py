@@ -0,0 +1,246 @@
+from threading import Thread
+
+import numpy as np
+
+from Stores.sceneStore import NodeKind
+
+# 名字末尾补两个 0, 保证每个字符都是某个三元组的开头, 便于 1~2 个字符的前缀查询
+PAD = b"\0\0"
+# 增量部分超过该比例时重建基础索引
+REBUILD_RATIO = 0.1
+
+
+def _trigram_postings(names, ids):
+    """计算所有 (三元组, 节点) 对, 按三元组再按节点排序"""
+    encoded = [name.lower().encode("utf-8") + PAD for name in names]
+    if not encoded:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32)
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint32)
+    owner = np.repeat(np.asarray(ids, dtype=np.uint64), lengths)
+
+    # 去掉每个名字末尾两个填充字节开头的位置
+    valid = np.ones(len(data), dtype=np.bool_)
+    ends = np.cumsum(lengths)
+    valid[ends - 1] = False
+    valid[ends - 2] = False
+    pos = np.flatnonzero(valid)
+
+    codes = (data[pos] << 16) | (data[pos + 1] << 8) | data[pos + 2]
+    pairs = np.unique((codes.astype(np.uint64) << np.uint64(32)) | owner[pos])
+    return (pairs >> np.uint64(32)).astype(np.uint32), (pairs & np.uint64(0xFFFFFFFF)).astype(np.int32)
+
+
+class SceneIndex:
+    """场景搜索索引: 名字的三元组倒排索引, 以及标签倒排索引
+
+    三元组索引由不可变的基础部分和增量部分组成: 新增或改名的节点进入增量部分,
+    基础部分中过期的节点只做标记, 增量过大时再整体重建。基础部分在后台线程中建立,
+    完成前名字查询逐个比较, 建立期间修改过的节点在安装新索引时补进增量部分。
+    类型和材质直接在 SceneStore 的数组上做向量化比较, 10 万节点也只需几十微秒。
+    """
+
+    def __init__(self):
+        self.scene = None
+        # 每次索引变化时递增, 供界面判断是否需要重新查询
+        self.revision = 0
+        self._codes = np.zeros(0, dtype=np.uint32)
+        self._postings = np.zeros(0, dtype=np.int32)
+        self._stale = np.zeros(0, dtype=np.bool_)
+        self._delta = {}
+        self._tags = {}
+        self._built = False
+        # 后台建立中的基础索引 (线程, 结果), 以及建立期间修改过的节点
+        self._build = None
+        self._pending = set()
+
+    def bind(self, scene):
+        if self.scene is not None and self in self.scene.observers:
+            self.scene.observers.remove(self)
+        self.scene = scene
+        scene.observers.append(self)
+        self._tags = {}
+        for node, tags in scene.tags.items():
+            self._add_tags(node, tags)
+        # 三元组索引在后台建立, 不拖慢项目打开和界面
+        self._built = False
+        self._start_build()
+        self.revision += 1
+
+    def rebuild(self):
+        """立即在当前线程重建基础索引"""
+        self._build = None
+        self._pending = set()
+        names, ids, node_count = self._snapshot()
+        self._install(_trigram_postings(names, ids) + (node_count,))
+
+    def wait(self, timeout=None):
+        """等待后台建立完成并安装, 返回索引是否可用"""
+        if self._build is not None:
+            self._build[0].join(timeout)
+        self._poll()
+        return self._built
+
+    def _snapshot(self):
+        scene = self.scene
+        ids = np.flatnonzero(scene.alive)
+        names = scene.names
+        return [names[i] for i in ids], ids, scene.node_count
+
+    def _start_build(self):
+        names, ids, node_count = self._snapshot()
+        result = []
+
+        def run():
+            result.append(_trigram_postings(names, ids) + (node_count,))
+
+        thread = Thread(target=run, name="SceneIndexBuild", daemon=True)
+        self._build = (thread, result)
+        self._pending = set()
+        thread.start()
+
+    def _poll(self):
+        """后台建立完成时安装新的基础索引"""
+        if self._build is None or self._build[0].is_alive():
+            return
+        _, result = self._build
+        self._build = None
+        if result:
+            self._install(result[0])
+
+    def _install(self, built):
+        self._codes, self._postings, node_count = built
+        scene = self.scene
+        self._stale = np.zeros(scene.node_count, dtype=np.bool_)
+        self._delta = {}
+        # 快照之后修改过的节点: 基础部分中的旧名字作废, 现在的名字进入增量部分
+        pending, self._pending = self._pending, set()
+        for node in pending:
+            if node < node_count:
+                self._stale[node] = True
+            if scene.alive[node]:
+                self._delta[node] = scene.names[node].lower()
+        self._built = True
+        self.revision += 1
+
+    # 场景回调
+    def on_nodes_added(self, ids):
+        if self._build is not None:
+            self._pending.update(ids.tolist())
+        if not self._built:
+            return
+        self._stale = np.concatenate([self._stale, np.zeros(len(ids), dtype=np.bool_)])
+        names = self.scene.names
+        for node in ids.tolist():
+            self._delta[node] = names[node].lower()
+        self._changed()
+
+    def on_nodes_removed(self, ids):
+        for node in ids.tolist():
+            self._remove_tags(node, self.scene.tags.get(node, ()))
+        if self._build is not None:
+            self._pending.update(ids.tolist())
+        if not self._built:
+            return
+        self._stale[ids] = True
+        for node in ids.tolist():
+            self._delta.pop(node, None)
+        self._changed()
+
+    def on_node_renamed(self, node, old_name):
+        if self._build is not None:
+            self._pending.add(node)
+        if not self._built:
+            return
+        self._stale[node] = True
+        self._delta[node] = self.scene.names[node].lower()
+        self._changed()
+
+    def on_node_tags_changed(self, node, old_tags):
+        self._remove_tags(node, old_tags)
+        self._add_tags(node, self.scene.tags.get(node, ()))
+        self.revision += 1
+
+    def _changed(self):
+        if self._build is None and len(self._delta) > max(1000, REBUILD_RATIO * len(self._stale)):
+            # 新的基础索引建好之前, 旧索引加增量部分仍然可用
+            self._start_build()
+        self.revision += 1
+
+    def _add_tags(self, node, tags):
+        for tag in tags:
+            self._tags.setdefault(tag.lower(), set()).add(node)
+
+    def _remove_tags(self, node, tags):
+        for tag in tags:
+            nodes = self._tags.get(tag.lower())
+            if nodes is not None:
+                nodes.discard(node)
+
+    def _lookup(self, lo, hi):
+        """返回三元组编码在 [lo, hi) 区间内的所有节点"""
+        start, end = np.searchsorted(self._codes, [lo, hi])
+        return self._postings[start:end]
+
+    def search_name(self, text):
+        """名字包含 text(不区分大小写)的节点, 返回有序 id 数组"""
+        self._poll()
+        query = text.lower()
+        if not self._built:
+            # 索引还在后台建立, 逐个比较
+            names = self.scene.names
+            alive = np.flatnonzero(self.scene.alive).tolist()
+            return np.asarray([node for node in alive if query in names[node].lower()], dtype=np.int32)
+        data = query.encode("utf-8")
+        if len(data) >= 3:
+            codes = {(data[i] << 16) | (data[i + 1] << 8) | data[i + 2] for i in range(len(data) - 2)}
+            # 从最短的倒排表开始求交集
+            postings = sorted((self._lookup(code, code + 1) for code in codes), key=len)
+            candidates = postings[0]
+            for found in postings[1:]:
+                if not len(candidates):
+                    break
+                candidates = np.intersect1d(candidates, found, assume_unique=True)
+        else:
+            # 1~2 个字符: 以它们开头的三元组在编码上是连续区间
+            lo = data[0] << 16 | (data[1] << 8 if len(data) == 2 else 0)
+            hi = lo + (1 << 8 if len(data) == 2 else 1 << 16)
+            candidates = np.unique(self._lookup(lo, hi))
+
+        candidates = candidates[~self._stale[candidates]]
+        names = self.scene.names
+        if len(data) > 3:
+            # 多个三元组同时命中不代表连续出现, 需要逐个确认
+            candidates = [node for node in candidates.tolist() if query in names[node].lower()]
+        delta = [node for node, name in self._delta.items() if query in name]
+        return np.union1d(np.asarray(candidates, dtype=np.int32), np.asarray(delta, dtype=np.int32))
+
+    def search(self, text):
+        """解析过滤框内容并返回匹配节点, 支持 type:/mat:/tag: 前缀, 其余部分按名字匹配"""
+        scene = self.scene
+        mask = scene.alive.copy()
+        words = []
+        for token in text.split():
+            key, _, value = token.partition(":")
+            key = key.lower()
+            if not value:
+                words.append(token)
+            elif key == "type":
+                kinds = [k.value for k in NodeKind if k.name.lower().startswith(value.lower())]
+                mask &= np.isin(scene.kinds, kinds)
+            elif key in ("mat", "material"):
+                materials = [i for i, name in enumerate(scene.material_names) if value.lower() in name.lower()]
+                mask &= np.isin(scene.material_ids, materials)
+            elif key == "tag":
+                nodes = np.fromiter(self._tags.get(value.lower(), ()), dtype=np.int64)
+                tagged = np.zeros_like(mask)
+                tagged[nodes] = True
+                mask &= tagged
+            else:
+                words.append(token)
+
+        for word in words:
+            matched = np.zeros_like(mask)
+            matched[self.search_name(word)] = True
+            mask &= matched
+        return np.flatnonzero(mask).astype(np.int32)
@@ -0,0 +1,251 @@
+import dataclasses
+from enum import IntEnum
+
+import numpy as np
+
+from renderer.geometry import cube_vertices, cube_indices
+
+# 变换: 位置(3) 旋转(3, 角度) 缩放(3)
+TRANSFORM_SIZE = 9
+# 材质: 颜色(3) 金属度 粗糙度 不透明度
+MATERIAL_SIZE = 6
+
+
+class NodeKind(IntEnum):
+    GROUP = 0
+    MESH = 1
+    LIGHT = 2
+    CAMERA = 3
+
+
+@dataclasses.dataclass
+class MeshData:
+    name: str
+    vertices: np.ndarray  # (n, 8) 位置, 法线, 纹理坐标
+    indices: np.ndarray
+
+
+@dataclasses.dataclass
+class TextureData:
+    name: str
+    path: str = ""
+    pixels: np.ndarray = None
+
+
+def _empty(dtype, width=0):
+    shape = (0, width) if width else (0,)
+    return np.zeros(shape, dtype=dtype)
+
+
+@dataclasses.dataclass
+class SceneStore:
+    """场景数据: 节点按列存储在 NumPy 数组中, 节点 id 即数组下标"""
+    names: list = dataclasses.field(default_factory=list)
+    parents: np.ndarray = dataclasses.field(default_factory=lambda: _empty(np.int32))
+    kinds: np.ndarray = dataclasses.field(default_factory=lambda: _empty(np.uint8))
+    alive: np.ndarray = dataclasses.field(default_factory=lambda: _empty(np.bool_))
+    transforms: np.ndarray = dataclasses.field(default_factory=lambda: _empty(np.float32, TRANSFORM_SIZE))
+    mesh_ids: np.ndarray = dataclasses.field(default_factory=lambda: _empty(np.int32))
+    material_ids: np.ndarray = dataclasses.field(default_factory=lambda: _empty(np.int32))
+    tags: dict = dataclasses.field(default_factory=dict)
+
+    material_names: list = dataclasses.field(default_factory=list)
+    materials: np.ndarray = dataclasses.field(default_factory=lambda: _empty(np.float32, MATERIAL_SIZE))
+    material_textures: np.ndarray = dataclasses.field(default_factory=lambda: _empty(np.int32))
+
+    # 网格与纹理可能尚未从项目文件中加载, 此时对应位置为 None
+    meshes: list = dataclasses.field(default_factory=list)
+    textures: list = dataclasses.field(default_factory=list)
+    loader: object = None
+    # 自上次保存以来修改过的区块组, 供自动保存只写入变化的部分
+    dirty: set = dataclasses.field(default_factory=set)
+    # 需要上传到 GPU 的行区间 {数组名: (lo, hi)}, 由渲染器取走
+    gpu_dirty: dict = dataclasses.field(default_factory=dict, repr=False, compare=False)
+    # 场景变化的监听者, 按需实现 on_nodes_added / on_nodes_removed / on_node_renamed / on_node_tags_changed
+    observers: list = dataclasses.field(default_factory=list, repr=False, compare=False)
+
+    @property
+    def node_count(self):
+        return len(self.names)
+
+    def add_nodes(self, names, parents, kinds, mesh_ids=None, material_ids=None, transforms=None):
+        """批量添加节点, 返回新节点的 id 数组"""
+        count = len(names)
+        start = self.node_count
+        if transforms is None:
+            transforms = np.zeros((count, TRANSFORM_SIZE), dtype=np.float32)
+            transforms[:, 6:9] = 1.0
+        if mesh_ids is None:
+            mesh_ids = np.full(count, -1, dtype=np.int32)
+        if material_ids is None:
+            material_ids = np.full(count, -1, dtype=np.int32)
+
+        self.names.extend(names)
+        self.parents = np.concatenate([self.parents, np.asarray(parents, dtype=np.int32)])
+        self.kinds = np.concatenate([self.kinds, np.asarray(kinds, dtype=np.uint8)])
+        self.alive = np.concatenate([self.alive, np.ones(count, dtype=np.bool_)])
+        self.transforms = np.concatenate([self.transforms, np.asarray(transforms, dtype=np.float32)])
+        self.mesh_ids = np.concatenate([self.mesh_ids, np.asarray(mesh_ids, dtype=np.int32)])
+        self.material_ids = np.concatenate([self.material_ids, np.asarray(material_ids, dtype=np.int32)])
+        self.mark_dirty("nodes", "names", "transforms")
+        self._touch_gpu("transforms", start, start + count)
+        ids = np.arange(start, start + count, dtype=np.int32)
+        self._notify("on_nodes_added", ids)
+        return ids
+
+    def add_node(self, name, parent=-1, kind=NodeKind.GROUP, mesh_id=-1, material_id=-1):
+        """添加单个节点"""
+        return int(self.add_nodes([name], [parent], [kind], [mesh_id], [material_id])[0])
+
+    def remove_nodes(self, ids):
+        """删除节点及其子树, 只做标记, id 保持不变"""
+        removed = np.zeros(self.node_count, dtype=np.bool_)
+        removed[np.asarray(ids, dtype=np.int32)] = True
+        # 逐层向下传播, 直到没有新的子节点被标记
+        while True:
+            has_parent = self.parents >= 0
+            inherited = np.zeros_like(removed)
+            inherited[has_parent] = removed[self.parents[has_parent]]
+            grown = removed | inherited
+            if np.array_equal(grown, removed):
+                break
+            removed = grown
+        removed &= self.alive
+        self.alive[removed] = False
+        self.mark_dirty("nodes")
+        ids = np.flatnonzero(removed).astype(np.int32)
+        if len(ids):
+            # 被删除节点所在的视口需要重绘
+            self._touch_gpu("transforms", ids.min(), ids.max() + 1)
+        self._notify("on_nodes_removed", ids)
+        return ids
+
+    def rename_node(self, node_id, name):
+        old_name = self.names[node_id]
+        self.names[node_id] = name
+        self.mark_dirty("names")
+        self._notify("on_node_renamed", node_id, old_name)
+
+    def set_tags(self, node_id, tags):
+        old_tags = self.tags.get(node_id, ())
+        if tags:
+            self.tags[node_id] = tuple(tags)
+        else:
+            self.tags.pop(node_id, None)
+        self.mark_dirty("tags")
+        self._notify("on_node_tags_changed", node_id, old_tags)
+
+    def path_mask(self, ids):
+        """返回 ids 及其所有祖先节点的掩码"""
+        mask = np.zeros(self.node_count, dtype=np.bool_)
+        current = np.asarray(ids, dtype=np.int32)
+        while len(current):
+            current = current[~mask[current]]
+            mask[current] = True
+            current = self.parents[current]
+            current = current[current >= 0]
+        return mask
+
+    def _notify(self, event, *args):
+        for observer in self.observers:
+            handler = getattr(observer, event, None)
+            if handler is not None:
+                handler(*args)
+
+    def mark_dirty(self, *groups):
+        """标记区块组已修改, 直接写数组(如 transforms)后需要手动调用"""
+        self.dirty.update(groups)
+
+    def _touch_gpu(self, name, lo, hi):
+        old = self.gpu_dirty.get(name)
+        if old is not None:
+            lo, hi = min(lo, old[0]), max(hi, old[1])
+        self.gpu_dirty[name] = (int(lo), int(hi))
+
+    def offset_transforms(self, ids, column, delta):
+        """批量平移/旋转: 给 ids 的 transforms[:, column:column + 3] 加上 delta"""
+        if not len(ids):
+            return
+        self.transforms[ids, column:column + 3] += np.asarray(delta, dtype=np.float32)
+        self.mark_dirty("transforms")
+        self._touch_gpu("transforms", ids.min(), ids.max() + 1)
+
+    def set_transforms(self, ids, column, value, axes=(True, True, True)):
+        """批量设置: 把 ids 的 transforms[:, column:column + 3] 中 axes 选中的轴设为 value"""
+        axes = np.flatnonzero(axes)
+        if not len(ids) or not len(axes):
+            return
+        self.transforms[np.ix_(ids, column + axes)] = np.asarray(value, dtype=np.float32)[axes]
+        self.mark_dirty("transforms")
+        self._touch_gpu("transforms", ids.min(), ids.max() + 1)
+
+    def set_material_params(self, material_ids, column, value):
+        """批量设置材质参数, value 可以是标量或与列宽一致的向量"""
+        material_ids = material_ids[material_ids >= 0]
+        if not len(material_ids):
+            return
+        value = np.asarray(value, dtype=np.float32)
+        self.materials[material_ids, column:column + max(value.size, 1)] = value
+        self.mark_dirty("materials")
+        self._touch_gpu("materials", material_ids.min(), material_ids.max() + 1)
+
+    def add_material(self, name, color=(1.0, 1.0, 1.0), metallic=0.0, roughness=0.5, opacity=1.0, texture=-1):
+        """添加材质, 返回材质 id"""
+        row = np.array([[*color, metallic, roughness, opacity]], dtype=np.float32)
+        self.material_names.append(name)
+        self.materials = np.concatenate([self.materials, row])
+        self.material_textures = np.append(self.material_textures, np.int32(texture))
+        self.mark_dirty("materials")
+        self._touch_gpu("materials", len(self.material_names) - 1, len(self.material_names))
+        return len(self.material_names) - 1
+
+    def add_mesh(self, mesh: MeshData):
+        self.meshes.append(mesh)
+        mesh_id = len(self.meshes) - 1
+        self.mark_dirty("meshes", f"mesh/{mesh_id}")
+        return mesh_id
+
+    def set_mesh(self, mesh_id, mesh: MeshData):
+        """替换网格数据; 网格数组只整体替换不原地修改, 快照可以直接引用"""
+        self.meshes[mesh_id] = mesh
+        self.mark_dirty("meshes", f"mesh/{mesh_id}")
+        self._notify("on_mesh_changed", mesh_id)
+
+    def add_texture(self, texture: TextureData):
+        self.textures.append(texture)
+        texture_id = len(self.textures) - 1
+        self.mark_dirty("textures", f"texture/{texture_id}")
+        return texture_id
+
+    def mesh(self, mesh_id):
+        """获取网格, 未加载时按需从项目文件中读取"""
+        if self.meshes[mesh_id] is None and self.loader is not None:
+            self.meshes[mesh_id] = self.loader.load_mesh(mesh_id)
+        return self.meshes[mesh_id]
+
+    def texture(self, texture_id):
+        """获取纹理, 未加载时按需从项目文件中读取"""
+        if self.textures[texture_id] is None and self.loader is not None:
+            self.textures[texture_id] = self.loader.load_texture(texture_id)
+        return self.textures[texture_id]
+
+    @classmethod
+    def default(cls):
+        """新建项目时的默认场景"""
+        scene = cls()
+        for name, color, metallic, roughness, opacity in [
+            ("Default", (1.0, 1.0, 1.0), 0.0, 0.5, 1.0),
+            ("Metal", (0.8, 0.8, 0.8), 1.0, 0.3, 1.0),
+            ("Wood", (0.6, 0.4, 0.2), 0.0, 0.8, 1.0),
+            ("Glass", (0.9, 0.9, 1.0), 0.0, 0.05, 0.2),
+            ("Plastic", (0.8, 0.1, 0.1), 0.0, 0.4, 1.0),
+        ]:
+            scene.add_material(name, color, metallic, roughness, opacity)
+
+        cube = scene.add_mesh(MeshData("Cube", cube_vertices().reshape(-1, 8), cube_indices()))
+        root = scene.add_node("Scene")
+        scene.add_node("Model", root, NodeKind.MESH, mesh_id=cube, material_id=0)
+        light = scene.add_node("Light", root, NodeKind.LIGHT)
+        scene.transforms[light, 0:3] = (1.2, 1.0, 2.0)
+        scene.transforms[light, 6:9] = 0.2
+        return scene
@@ -0,0 +1,53 @@
+import numpy as np
+
+
+class SelectionStore:
+    """选中的节点: 集合用于逐行判断是否选中, 有序数组用于批量编辑"""
+
+    def __init__(self):
+        self._nodes = set()
+        self._ids = None
+        # 最后点击的节点, 属性面板显示它的值
+        self.active = -1
+
+    def __contains__(self, node):
+        return node in self._nodes
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            self._ids = np.fromiter(self._nodes, dtype=np.int32, count=len(self._nodes))
+            self._ids.sort()
+        return self._ids
+
+    def clear(self):
+        self._nodes.clear()
+        self._ids = None
+        self.active = -1
+
+    def add(self, node):
+        self._nodes.add(node)
+        self._ids = None
+        self.active = node
+
+    def toggle(self, node):
+        if node in self._nodes:
+            self._nodes.discard(node)
+            if self.active == node:
+                self.active = next(iter(self._nodes), -1)
+        else:
+            self._nodes.add(node)
+            self.active = node
+        self._ids = None
+
+    def set(self, ids):
+        ids = np.unique(np.asarray(ids, dtype=np.int32))
+        self._nodes = set(ids.tolist())
+        self._ids = ids
+        self.active = int(ids[0]) if len(ids) else -1
@@ -0,0 +1,228 @@
+import dataclasses
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+# 文件布局: 文件头 | 区块数据 ... | 目录表(JSON)
+# 文件头记录目录表的位置, 打开文件时只需读取文件头和目录表
+MAGIC = b"XCPJ"
+VERSION = 1
+HEADER = struct.Struct("<4sIQQ")  # magic, version, toc_offset, toc_size
+ALIGN = 64  # 区块按 64 字节对齐, 便于直接从映射内存上传
+
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+@dataclasses.dataclass
+class ChunkEntry:
+    name: str
+    offset: int
+    size: int
+    meta: dict = dataclasses.field(default_factory=dict)
+
+
+def _parse_toc(data, path):
+    """从文件头和目录表解析区块列表; 文件过短或内容损坏时抛出 ValueError"""
+    try:
+        magic, version, toc_offset, toc_size = HEADER.unpack_from(data, 0)
+    except struct.error:
+        raise ValueError(f"不是有效的项目文件: {path}") from None
+    if magic != MAGIC:
+        raise ValueError(f"不是有效的项目文件: {path}")
+    if version != VERSION:
+        raise ValueError(f"不支持的项目文件版本: {version}")
+    if toc_offset + toc_size > len(data):
+        raise ValueError(f"项目文件已损坏: {path}")
+    try:
+        toc = json.loads(bytes(data[toc_offset:toc_offset + toc_size]).decode("utf-8"))
+        return {item["name"]: ChunkEntry(**item) for item in toc}
+    except (TypeError, KeyError) as e:
+        # json 和 utf-8 的解码错误本身就是 ValueError
+        raise ValueError(f"项目文件目录表已损坏: {path}") from e
+
+
+class ChunkReader:
+    """以内存映射方式打开项目文件, 区块只在读取时才会被解码"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            # 空文件无法映射, mmap 抛出 ValueError
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.entries = _parse_toc(self._mm, path)
+        except Exception:
+            self.close()
+            raise
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def names(self, prefix=""):
+        return [name for name in self.entries if name.startswith(prefix)]
+
+    def read_bytes(self, name):
+        entry = self.entries[name]
+        return self._mm[entry.offset:entry.offset + entry.size]
+
+    def read_array(self, name):
+        """读取数组区块, 返回与映射内存无关的副本"""
+        entry = self.entries[name]
+        dtype = np.dtype(entry.meta["dtype"])
+        if not entry.size:
+            return np.zeros(entry.meta["shape"], dtype=dtype)
+        count = entry.size // dtype.itemsize
+        array = np.frombuffer(self._mm, dtype=dtype, count=count, offset=entry.offset)
+        return array.reshape(entry.meta["shape"]).copy()
+
+    def view_array(self, name):
+        """数组区块的只读视图, 直接引用映射内存不复制; 视图必须在 close 之前释放"""
+        entry = self.entries[name]
+        dtype = np.dtype(entry.meta["dtype"])
+        if not entry.size:
+            return np.zeros(entry.meta["shape"], dtype=dtype)
+        count = entry.size // dtype.itemsize
+        return np.frombuffer(self._mm, dtype=dtype, count=count, offset=entry.offset).reshape(entry.meta["shape"])
+
+    def read_json(self, name):
+        return json.loads(self.read_bytes(name).decode("utf-8"))
+
+    def read_strings(self, name):
+        data = self.read_bytes(name)
+        return data.decode("utf-8").split("\0") if data else []
+
+    def close(self):
+        mm = getattr(self, "_mm", None)
+        if mm is not None:
+            mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ChunkWriter:
+    """写入项目文件: 先写到临时文件, close 时再原子替换目标文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.entries = {}
+        self._file = open(self.tmp_path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+
+    def write_bytes(self, name, data, meta=None):
+        offset = _align(self._file.tell())
+        self._file.seek(offset)
+        self._file.write(data)
+        self.entries[name] = ChunkEntry(name, offset, len(data), meta or {})
+
+    def write_array(self, name, array):
+        array = np.ascontiguousarray(array)
+        meta = {"dtype": array.dtype.str, "shape": list(array.shape)}
+        # 空数组写成零长度区块, memoryview 不能转换形状中有 0 的视图
+        self.write_bytes(name, memoryview(array).cast("B") if array.size else b"", meta)
+
+    def write_json(self, name, obj):
+        self.write_bytes(name, json.dumps(obj).encode("utf-8"))
+
+    def write_strings(self, name, strings):
+        self.write_bytes(name, "\0".join(strings).encode("utf-8"))
+
+    def copy_from(self, reader: ChunkReader, name):
+        """原样复制另一个文件中的区块, 不做解码"""
+        entry = reader.entries[name]
+        self.write_bytes(name, reader.read_bytes(name), entry.meta)
+
+    def close(self):
+        toc = json.dumps([dataclasses.asdict(e) for e in self.entries.values()]).encode("utf-8")
+        toc_offset = _align(self._file.tell())
+        self._file.seek(toc_offset)
+        self._file.write(toc)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, toc_offset, len(toc)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ChunkAppender(ChunkWriter):
+    """向已有文件末尾追加区块和新的目录表, 最后才改写文件头
+
+    写入中途崩溃时文件头仍指向旧目录表, 文件保持可读; 被覆盖的旧区块成为
+    垃圾数据, 由 garbage_ratio 判断何时需要 compact
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "r+b")
+        try:
+            self.entries = _parse_toc(self._file.read(), path)
+        except Exception:
+            self._file.close()
+            raise
+        self._file.seek(0, os.SEEK_END)
+
+    def garbage_ratio(self):
+        """文件中不再被目录表引用的数据所占比例"""
+        size = self._file.seek(0, os.SEEK_END)
+        live = sum(entry.size for entry in self.entries.values())
+        return 1.0 - live / size if size else 0.0
+
+    def close(self):
+        toc = json.dumps([dataclasses.asdict(e) for e in self.entries.values()]).encode("utf-8")
+        toc_offset = _align(self._file.seek(0, os.SEEK_END))
+        self._file.seek(toc_offset)
+        self._file.write(toc)
+        # 先确保区块和目录表落盘, 再改写文件头
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, toc_offset, len(toc)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def abort(self):
+        self._file.close()
+
+
+def compact(path):
+    """只保留目录表引用的区块, 重写文件并原子替换"""
+    reader = ChunkReader(path)
+    writer = ChunkWriter(path)
+    try:
+        for name in reader.names():
+            writer.copy_from(reader, name)
+    except Exception:
+        reader.close()
+        writer.abort()
+        raise
+    reader.close()
+    writer.close()
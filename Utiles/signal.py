@@ -1,5 +1,15 @@
+import threading
+import weakref
+from collections import deque
 from threading import Lock
 
+# 连接方式: 直接调用; 排队到主循环; 在主线程发出时直接调用, 其它线程发出时排队
+DIRECT, QUEUED, AUTO = "direct", "queued", "auto"
+
+_MAIN_THREAD = threading.main_thread().ident
+# 排队的调用 (接收者弱引用, 函数, 参数); deque 的 append/popleft 是线程安全的
+_queue = deque()
+
 
 class SignalMeta(type):
     _lock = Lock()
@@ -11,3 +21,114 @@ class SignalMeta(type):
                 if cls not in cls._instances:
                     cls._instances[cls] = super().__call__(*args, **kwargs)
         return cls._instances[cls]
+
+
+def _invoke(ref, func, args):
+    target = ref()
+    if target is None:
+        return
+    if func is None:
+        target(*args)
+    else:
+        func(target, *args)
+
+
+def dispatch_queued():
+    """主循环每帧调用一次, 按发出顺序执行排队的调用, 返回执行的数量
+
+    执行期间新排队的调用留到下一帧, 槽里再次发出信号不会让这里无限循环。
+    """
+    count = len(_queue)
+    for _ in range(count):
+        _invoke(*_queue.popleft())
+    return count
+
+
+class Signal:
+    """信号: 槽通过弱引用连接, 接收者被回收后连接自动断开; 同一个槽只连接一次
+
+    绑定方法弱引用其对象, 普通函数弱引用函数本身 (连接 lambda 时调用方需要自己保存引用)。
+    连接变化时预先生成各连接方式的调用列表, emit 只遍历列表, 不做额外的分配。
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self._lock = Lock()
+        # [(弱引用, 函数, 连接方式)], 以及预先生成的调用列表
+        self._connections = []
+        self._direct = ()
+        self._queued = ()
+        self._auto = ()
+        # 接收者被回收时只设置这个标记, 弱引用回调不取锁; 下一次 connect/disconnect/emit 时清理
+        self._has_dead = False
+
+    def connect(self, slot, mode=DIRECT):
+        """连接槽, 返回 slot 以便用作装饰器"""
+        if mode not in (DIRECT, QUEUED, AUTO):
+            raise ValueError(f"未知的连接方式: {mode}")
+        if hasattr(slot, "__self__") and hasattr(slot, "__func__"):
+            target, func = slot.__self__, slot.__func__
+        else:
+            target, func = slot, None
+        with self._lock:
+            self.__prune()
+            if not any(ref() is target and f is func for ref, f, _ in self._connections):
+                self._connections.append((weakref.ref(target, self.__disconnect_dead), func, mode))
+                self.__rebuild()
+        return slot
+
+    def disconnect(self, slot=None):
+        """断开一个槽; slot 为 None 时断开全部"""
+        with self._lock:
+            if slot is None:
+                self._connections = []
+            else:
+                target = getattr(slot, "__self__", slot)
+                func = getattr(slot, "__func__", None)
+                self._connections = [(ref, f, mode) for ref, f, mode in self._connections
+                                     if not (ref() is target and f is func)]
+            self.__prune()
+            self.__rebuild()
+
+    def __disconnect_dead(self, _):
+        # 循环垃圾回收可能在本线程持有 _lock 时触发回调, 这里取锁会死锁
+        self._has_dead = True
+
+    def __prune(self):
+        """调用方持有 _lock: 去掉接收者已被回收的连接"""
+        if self._has_dead:
+            self._has_dead = False
+            self._connections = [connection for connection in self._connections if connection[0]() is not None]
+            self.__rebuild()
+
+    def __prune_locked(self):
+        with self._lock:
+            self.__prune()
+
+    def __rebuild(self):
+        self._direct = tuple((ref, func) for ref, func, mode in self._connections if mode == DIRECT)
+        self._queued = tuple((ref, func) for ref, func, mode in self._connections if mode == QUEUED)
+        self._auto = tuple((ref, func) for ref, func, mode in self._connections if mode == AUTO)
+
+    def __len__(self):
+        return len(self._connections)
+
+    def emit(self, *args):
+        if self._has_dead:
+            self.__prune_locked()
+        for ref, func in self._direct:
+            target = ref()
+            if target is not None:
+                if func is None:
+                    target(*args)
+                else:
+                    func(target, *args)
+        for ref, func in self._queued:
+            _queue.append((ref, func, args))
+        if self._auto:
+            if threading.get_ident() == _MAIN_THREAD:
+                for ref, func in self._auto:
+                    _invoke(ref, func, args)
+            else:
+                for ref, func in self._auto:
+                    _queue.append((ref, func, args))
@@ -0,0 +1,214 @@
+import imgui
+import numpy as np
+
+from Stores.sceneIndex import SceneIndex
+
+ROW_INDENT = 14.0
+TREE_HEIGHT = 260
+
+BASE_FLAGS = (
+        imgui.TREE_NODE_OPEN_ON_ARROW |
+        imgui.TREE_NODE_OPEN_ON_DOUBLE_CLICK |
+        imgui.TREE_NODE_NO_TREE_PUSH_ON_OPEN |
+        imgui.TREE_NODE_SPAN_AVAILABLE_WIDTH
+)
+
+
+class HierarchyView:
+    """虚拟化层级视图: 缓存展开后的扁平行列表, 每帧只提交滚动区域内可见的行"""
+
+    def __init__(self):
+        self.scene = None
+        self._expanded = np.zeros(0, dtype=np.bool_)
+        # 子节点表(CSR): 父节点 p 的子节点为 _child_ids[_child_start[p + 1]:_child_start[p + 2]]
+        self._child_ids = np.zeros(0, dtype=np.int32)
+        self._child_start = np.zeros(2, dtype=np.int64)
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._depths = np.zeros(0, dtype=np.int32)
+        self._structure_dirty = True
+        # 过滤: 匹配节点及其祖先的掩码, 为 None 时显示完整层级
+        self.index = SceneIndex()
+        self.filter_text = ""
+        self._filter = None
+        self._filter_revision = -1
+
+    def bind(self, scene):
+        if self.scene is not None and self in self.scene.observers:
+            self.scene.observers.remove(self)
+        self.scene = scene
+        scene.observers.append(self)
+        self.index.bind(scene)
+        self._filter_revision = -1
+        # 默认展开根节点
+        self._expanded = np.zeros(scene.node_count, dtype=np.bool_)
+        self._expanded[scene.parents < 0] = True
+        self._structure_dirty = True
+
+    def on_nodes_added(self, ids):
+        self._expanded = np.concatenate([self._expanded, np.zeros(len(ids), dtype=np.bool_)])
+        self._structure_dirty = True
+
+    def on_nodes_removed(self, ids):
+        self._expanded[ids] = False
+        self._structure_dirty = True
+
+    @property
+    def row_count(self):
+        return len(self._rows)
+
+    def children(self, node):
+        """node 为 -1 时返回所有根节点"""
+        k = node + 1
+        return self._child_ids[self._child_start[k]:self._child_start[k + 1]]
+
+    def has_children(self, node):
+        k = node + 1
+        return self._child_start[k + 1] > self._child_start[k]
+
+    def _build_children(self):
+        scene = self.scene
+        ids = np.flatnonzero(scene.alive).astype(np.int32)
+        keys = scene.parents[ids] + 1
+        order = np.argsort(keys, kind="stable")
+        self._child_ids = ids[order]
+        counts = np.bincount(keys, minlength=scene.node_count + 1)
+        self._child_start = np.zeros(scene.node_count + 2, dtype=np.int64)
+        np.cumsum(counts, out=self._child_start[1:])
+
+    def _visible_children(self, node):
+        """node 的可见子节点, 以及其中展开且含子节点(需要继续向下收集)的位置"""
+        children = self.children(node)
+        expanded = self._expanded
+        if self._filter is not None:
+            # 过滤时只显示命中的路径, 并全部展开
+            children = children[self._filter[children]]
+            expanded = self._filter
+        has_children = self._child_start[children + 2] > self._child_start[children + 1]
+        return children, np.flatnonzero(expanded[children] & has_children).tolist()
+
+    def _collect(self, node, depth, out_ids, out_depths):
+        """按先序收集 node 下所有可见行, 未展开的兄弟节点整段追加
+
+        用显式栈代替递归, 很深的层级(长链)也不会超出递归深度。
+        栈中每层为 [子节点, 需要向下收集的位置, 下一个位置的下标, 未追加部分的起点, 深度]。
+        """
+        children, opened = self._visible_children(node)
+        stack = [[children, opened, 0, 0, depth]] if len(children) else []
+        while stack:
+            frame = stack[-1]
+            children, opened, cursor, start, depth = frame
+            if cursor < len(opened):
+                pos = opened[cursor]
+                segment = children[start:pos + 1]
+                out_ids.append(segment)
+                out_depths.append(np.full(len(segment), depth, dtype=np.int32))
+                frame[2], frame[3] = cursor + 1, pos + 1
+                children, opened = self._visible_children(int(children[pos]))
+                if len(children):
+                    stack.append([children, opened, 0, 0, depth + 1])
+            else:
+                segment = children[start:]
+                out_ids.append(segment)
+                out_depths.append(np.full(len(segment), depth, dtype=np.int32))
+                stack.pop()
+
+    def _subtree_rows(self, node, depth):
+        out_ids, out_depths = [], []
+        self._collect(node, depth, out_ids, out_depths)
+        if not out_ids:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        return np.concatenate(out_ids), np.concatenate(out_depths)
+
+    def rebuild(self):
+        """结构变化后重建子节点表和行列表, 耗时只与展开的行数相关"""
+        self._build_children()
+        self._rows, self._depths = self._subtree_rows(-1, 0)
+        self._structure_dirty = False
+
+    def set_filter(self, text):
+        """按过滤框内容筛选行, 显示匹配节点及其祖先路径"""
+        self.filter_text = text
+        self._filter_revision = self.index.revision
+        if text.strip():
+            self._filter = self.scene.path_mask(self.index.search(text))
+        else:
+            self._filter = None
+        self._structure_dirty = True
+
+    def toggle(self, row):
+        """展开或折叠第 row 行, 只插入/删除该节点子树对应的行"""
+        node = int(self._rows[row])
+        depth = int(self._depths[row])
+        if self._expanded[node]:
+            self._expanded[node] = False
+            after = self._depths[row + 1:] <= depth
+            end = row + 1 + (int(np.argmax(after)) if after.any() else len(after))
+            self._rows = np.concatenate([self._rows[:row + 1], self._rows[end:]])
+            self._depths = np.concatenate([self._depths[:row + 1], self._depths[end:]])
+        else:
+            self._expanded[node] = True
+            ids, depths = self._subtree_rows(node, depth + 1)
+            self._rows = np.concatenate([self._rows[:row + 1], ids, self._rows[row + 1:]])
+            self._depths = np.concatenate([self._depths[:row + 1], depths, self._depths[row + 1:]])
+
+    def draw(self, store):
+        scene = store.project.scene
+        if scene is not self.scene:
+            self.bind(scene)
+
+        imgui.push_item_width(-1)
+        changed, text = imgui.input_text("##HierarchyFilter", self.filter_text, 256)
+        imgui.pop_item_width()
+        # 文本变化或场景变化时才重新查询
+        if changed or (self._filter is not None and self._filter_revision != self.index.revision):
+            self.set_filter(text)
+
+        if self._structure_dirty:
+            self.rebuild()
+
+        imgui.begin_child("HierarchyTree", 0, TREE_HEIGHT)
+        filtering = self._filter is not None
+
+        names = scene.names
+        selection = store.selection
+        toggled = None
+        clicked = None
+
+        clipper = imgui.ListClipper()
+        clipper.begin(len(self._rows))
+        while clipper.step():
+            for row in range(clipper.display_start, clipper.display_end):
+                node = int(self._rows[row])
+                indent = float(self._depths[row]) * ROW_INDENT
+
+                flags = BASE_FLAGS
+                if not self.has_children(node):
+                    flags |= imgui.TREE_NODE_LEAF
+                if node in selection:
+                    flags |= imgui.TREE_NODE_SELECTED
+
+                if indent:
+                    imgui.indent(indent)
+                expanded = filtering or bool(self._expanded[node])
+                imgui.set_next_item_open(expanded)
+                opened = imgui.tree_node(f"{names[node]}##{node}", flags)
+                if opened != expanded and self.has_children(node):
+                    if not filtering:
+                        toggled = row
+                elif imgui.is_item_clicked():
+                    clicked = node
+                if indent:
+                    imgui.unindent(indent)
+        clipper.end()
+
+        # 遍历结束后再修改行列表
+        if toggled is not None:
+            self.toggle(toggled)
+        if clicked is not None:
+            if imgui.get_io().key_ctrl:
+                selection.toggle(clicked)
+            else:
+                selection.clear()
+                selection.add(clicked)
+
+        imgui.end_child()
@@ -1,11 +1,55 @@
 import time
 
+import numpy as np
+
 from Editor.context import AppModeEnum, RenderModeEnum
+from Editor.mesh_service import UNAVAILABLE_OPERATIONS
+from Views.hierarchy import HierarchyView
+from renderer import gl_resources
+from renderer.ds_engine import SHADING_MODES
+from renderer.readback import image_format
+from renderer.soft_raster import UNSUPPORTED
+from renderer.viewport import ImageTexture
 # from Editor.editor import Editor
 import imgui
 
 render_viewport_current_view = 0
 
+VIEWPORT_LAYOUTS = ["Single", "Four-up"]
+# 四视图布局中的视口: (名字, 投影)
+FOUR_UP_VIEWPORTS = [("Top", "top"), ("Front", "front"), ("Side", "side")]
+
+# 使用软件渲染器的渲染模式, 以及软件渲染相对视口的分辨率比例
+SOFTWARE_RENDER_MODES = (RenderModeEnum.NONE, RenderModeEnum.OTHER)
+SOFTWARE_RENDER_SCALE = 0.5
+
+MATERIAL_LIST_HEIGHT = 200
+MATERIAL_ROW_HEIGHT = 36
+MATERIAL_THUMBNAIL_SIZE = 32
+# GPU 资源浏览器中最多列出的对象数
+RESOURCE_LIST_LIMIT = 200
+
+FILE_DIALOG_TITLES = {
+    "open": "Open Project",
+    "save_as": "Save Project As",
+    "import": "Import Mesh",
+    "screenshot": "Save Screenshot",
+    "sequence": "Export Image Sequence",
+}
+# 右侧面板中的网格处理按钮: (标题, 处理步骤)
+MESH_OPERATIONS = [
+    ("Recompute Normals", [("normals", {})]),
+    ("Weld Vertices", [("weld", {})]),
+    ("Cleanup", [("cleanup", {}), ("normals", {})]),
+    ("Decimate 50%", [("decimate", {"ratio": 0.5})]),
+    ("Unwrap UVs", [("unwrap", {})]),
+]
+# 隐藏缺少可选依赖的处理
+MESH_OPERATIONS = [
+    (label, operations) for label, operations in MESH_OPERATIONS
+    if not any(name in UNAVAILABLE_OPERATIONS for name, _ in operations)
+]
+
 
 class MainUI:
 
@@ -17,6 +61,14 @@ class MainUI:
 
         self.selected_material = 0
         self.start_time = time.time()
+        self.hierarchy = HierarchyView()
+        self.viewport_dragging = {}
+        self.viewport_layout = 0
+        self.software_texture = ImageTexture()
+        # 最近一次软件渲染的图像, 软件渲染模式下截图保存它
+        self.software_image = None
+        self.show_resources = False
+        editor.context.render_mode_changed.connect(self.__on_render_mode_changed)
 
     def __call__(self, *args, **kwargs):
         self.__draw()
@@ -37,13 +89,28 @@ class MainUI:
         if imgui.begin_menu_bar():
             if imgui.begin_menu("File"):
                 if imgui.menu_item("New")[0]:
-                    pass  # 创建新项目
+                    self.__new_project()  # 创建新项目
                 if imgui.menu_item("Open")[0]:
-                    pass  # 打开文件
+                    self.__show_file_dialog("open")  # 打开文件
                 if imgui.menu_item("Save")[0]:
-                    pass  # 保存文件
+                    if self.editor.store.project.path:
+                        self.__save_project()  # 保存文件
+                    else:
+                        self.__show_file_dialog("save_as")
                 if imgui.menu_item("Save As...")[0]:
-                    pass  # 另存为
+                    self.__show_file_dialog("save_as")  # 另存为
+                imgui.separator()
+                if imgui.menu_item("Import Mesh...")[0]:
+                    self.__show_file_dialog("import")  # 导入网格
+                imgui.separator()
+                if imgui.menu_item("Save Screenshot...")[0]:
+                    self.__show_file_dialog("screenshot")  # 保存截图
+                recorder = self.editor.context.render.recorder
+                if recorder.recording:
+                    if imgui.menu_item("Stop Image Sequence")[0]:
+                        self.__stop_sequence()
+                elif imgui.menu_item("Export Image Sequence...")[0]:
+                    self.__show_file_dialog("sequence")  # 导出图像序列
                 imgui.separator()
                 if imgui.menu_item("Exit")[0]:
                     pass  # 退出应用
@@ -66,8 +133,15 @@ class MainUI:
             if imgui.begin_menu("View"):
                 if imgui.menu_item("Reset View")[0]:
                     pass  # 重置视图
+                context = self.editor.context
+                software = context.render_mode in SOFTWARE_RENDER_MODES
+                if imgui.menu_item("Software Renderer", None, software)[0]:
+                    # 在 OpenGL 和软件渲染之间切换
+                    context.switch_render_mode(RenderModeEnum.OPENGL if software else RenderModeEnum.NONE)
                 if imgui.menu_item("Wireframe")[0]:
                     pass  # 线框模式
+                if imgui.menu_item("GPU Resources", None, self.show_resources)[0]:
+                    self.show_resources = not self.show_resources
                 imgui.end_menu()
 
             if imgui.begin_menu("Help"):
@@ -77,6 +151,9 @@ class MainUI:
 
             imgui.end_menu_bar()
 
+        # 文件对话框
+        self.__file_dialog()
+
         # 主要区域布局
         menu_height = imgui.get_frame_height_with_spacing()
         work_pos = (0, menu_height)
@@ -106,6 +183,138 @@ class MainUI:
         # 渲染状态栏
         self.__status_bar()
 
+        if self.show_resources:
+            self.__resource_browser()
+
+    def __show_file_dialog(self, mode):
+        store = self.editor.store
+        store.file_dialog = mode
+        store.file_path_input = "" if mode in ("import", "screenshot", "sequence") else store.project.path or ""
+
+    def __file_dialog(self):
+        store = self.editor.store
+        if store.file_dialog is None:
+            return
+
+        title = FILE_DIALOG_TITLES[store.file_dialog]
+        if not imgui.is_popup_open(title):
+            imgui.open_popup(title)
+
+        opened, _ = imgui.begin_popup_modal(title, flags=imgui.WINDOW_ALWAYS_AUTO_RESIZE)
+        if not opened:
+            return
+
+        imgui.text("Path")
+        _, store.file_path_input = imgui.input_text("##ProjectPath", store.file_path_input, 512)
+
+        if imgui.button("OK") and store.file_path_input:
+            if store.file_dialog == "open":
+                self.__open_project(store.file_path_input)
+            elif store.file_dialog == "import":
+                self.__import_mesh(store.file_path_input)
+            elif store.file_dialog == "screenshot":
+                self.__save_screenshot(store.file_path_input)
+            elif store.file_dialog == "sequence":
+                self.__start_sequence(store.file_path_input)
+            else:
+                self.__save_project(store.file_path_input)
+            store.file_dialog = None
+            imgui.close_current_popup()
+        imgui.same_line()
+        if imgui.button("Cancel"):
+            store.file_dialog = None
+            imgui.close_current_popup()
+        imgui.end_popup()
+
+    def __new_project(self):
+        self.editor.autosave.reset()
+        self.editor.store.project.new()
+        self.editor.store.selection.clear()
+        self.editor.store.status = "New project"
+
+    def __open_project(self, path):
+        store = self.editor.store
+        self.editor.autosave.reset()
+        try:
+            store.project.open(path)
+        except (OSError, ValueError) as e:
+            print(f"打开项目失败: {path}, 错误: {e}")
+            store.status = f"Failed to open {path}"
+            return
+        store.selection.clear()
+        self.__apply_editor_state(store.project.editor_state)
+        store.status = f"Opened {path}"
+
+    def __save_project(self, path=None):
+        store = self.editor.store
+        store.project.editor_state = self.__collect_editor_state()
+        # 等待后台自动保存结束, 避免与手动保存同时访问项目文件
+        self.editor.autosave.wait()
+        previous_path = store.project.path
+        try:
+            store.project.save(path)
+        except (OSError, ValueError) as e:
+            print(f"保存项目失败: {path}, 错误: {e}")
+            store.status = f"Failed to save {path}"
+            return
+        self.editor.autosave.discard(previous_path)
+        store.status = f"Saved {store.project.path}"
+
+    def __import_mesh(self, path):
+        # 加载和处理在进程池中进行, 完成后由 Editor 主循环添加到场景
+        self.editor.mesh_service.import_file(path)
+        self.editor.store.status = f"Importing {path}"
+
+    def __save_screenshot(self, path):
+        render = self.editor.context.render
+        try:
+            if self.editor.context.render_mode in SOFTWARE_RENDER_MODES:
+                # 软件渲染时帧缓冲不再更新, 保存显示中的软件渲染图像
+                if self.software_image is None:
+                    raise ValueError("还没有软件渲染的图像")
+                image_format(path)
+                # 软件渲染图像第一行在上, 写盘时按帧缓冲的顺序(第一行在下)翻转
+                render.recorder.readback.writer.submit(path, self.software_image[::-1])
+            else:
+                render.recorder.screenshot(render.main_viewport, path)
+        except ValueError as e:
+            self.editor.store.status = str(e)
+            return
+        self.editor.store.status = f"Saved screenshot {path}"
+
+    def __start_sequence(self, directory):
+        # 每一帧读回到像素缓冲, 几帧后取回并在后台线程写成 PNG
+        render = self.editor.context.render
+        render.recorder.start(render.main_viewport, directory)
+        self.editor.store.status = f"Exporting image sequence to {directory}"
+
+    def __stop_sequence(self):
+        recorder = self.editor.context.render.recorder
+        frames = recorder.frame
+        recorder.stop()
+        self.editor.store.status = f"Exported {frames} frame(s)"
+
+    def __collect_editor_state(self):
+        """收集需要随项目保存的编辑器状态"""
+        render = self.editor.context.render
+        return {
+            "selected_tool": self.selected_tool,
+            "selected_material": self.selected_material,
+            "camera_pos": render.camera_pos.tolist(),
+            "camera_front": render.camera_front.tolist(),
+            "viewport_layout": self.viewport_layout,
+        }
+
+    def __apply_editor_state(self, state):
+        render = self.editor.context.render
+        self.selected_tool = state.get("selected_tool", 0)
+        self.selected_material = state.get("selected_material", 0)
+        if "camera_pos" in state:
+            render.camera_pos[:] = state["camera_pos"]
+        if "camera_front" in state:
+            render.camera_front[:] = state["camera_front"]
+        self.viewport_layout = state.get("viewport_layout", 0)
+
     def __left_panel(self):
         imgui.begin_child("LeftPanel", 200, 0, True)
 
@@ -126,119 +335,155 @@ class MainUI:
         if imgui.collapsing_header("Hierarchy", flags=imgui.TREE_NODE_DEFAULT_OPEN):
             imgui.spacing()
 
-            # 模拟对象树
-            scene_node_open = imgui.tree_node("Scene")
-            if scene_node_open:
-                # 使用 TreeNodeEx flags
-                model_node_open = imgui.tree_node("Model##leaf", flags=imgui.TREE_NODE_LEAF)
-                if model_node_open:
-                    imgui.bullet_text("Mesh Renderer")
-                    imgui.bullet_text("Material")
-                    imgui.tree_pop()  # 对应 Model 的 tree_node
-
-                light_node_open = imgui.tree_node("Light##leaf", flags=imgui.TREE_NODE_LEAF)
-                if light_node_open:
-                    imgui.bullet_text("Point Light")
-                    imgui.tree_pop()  # 对应 Light 的 tree_node
-
-                imgui.tree_pop()  # 对应 Scene 的 tree_node
+            self.hierarchy.draw(self.editor.store)
 
         # 材质库
         if imgui.collapsing_header("Materials", flags=imgui.TREE_NODE_DEFAULT_OPEN):
             imgui.spacing()
 
-            materials = ["Default", "Metal", "Wood", "Glass", "Plastic"]
-
-            for i, material in enumerate(materials):
-                clicked, selected = imgui.selectable(material, self.selected_material == i)
-                if clicked:
-                    self.selected_material = i
-                if self.selected_material == i:
-                    imgui.set_item_default_focus()
+            self.__material_list()
 
             imgui.spacing()
             if imgui.button("New Material"):
-                pass  # 创建新材质
+                scene = self.editor.store.project.scene
+                self.selected_material = scene.add_material(f"Material {len(scene.material_names)}")
 
         imgui.end_child()
 
+    def __material_list(self):
+        """材质列表, 只为滚动到可见区域的行请求缩略图"""
+        scene = self.editor.store.project.scene
+        thumbnails = self.editor.context.thumbnails
+        names = scene.material_names
+
+        imgui.begin_child("MaterialList", 0, MATERIAL_LIST_HEIGHT)
+        clipper = imgui.ListClipper()
+        clipper.begin(len(names), MATERIAL_ROW_HEIGHT)
+        while clipper.step():
+            for i in range(clipper.display_start, clipper.display_end):
+                start = imgui.get_cursor_pos()
+                clicked, _ = imgui.selectable(f"##Material{i}", self.selected_material == i,
+                                              height=MATERIAL_ROW_HEIGHT - 4)
+                if clicked:
+                    self.selected_material = i
+                imgui.set_cursor_pos(start)
+                thumbnail = thumbnails.request(scene, i)
+                if thumbnail is not None:
+                    texture_id, uv0, uv1 = thumbnail
+                    imgui.image(texture_id, MATERIAL_THUMBNAIL_SIZE, MATERIAL_THUMBNAIL_SIZE, uv0, uv1)
+                else:
+                    imgui.dummy(MATERIAL_THUMBNAIL_SIZE, MATERIAL_THUMBNAIL_SIZE)
+                imgui.same_line()
+                imgui.text(names[i])
+        clipper.end()
+        imgui.end_child()
+        # 可见行都已请求, 统一读取缓存或批量渲染
+        thumbnails.update(scene)
+
     def __right_panel(self):
-        right_panel = self.__left_panel
         imgui.begin_child("RightPanel", 250, 0, True)
 
-        # 变换属性
-        if imgui.collapsing_header("Transform", flags=imgui.TREE_NODE_DEFAULT_OPEN):
-            imgui.spacing()
-
-            position = getattr(self.__left_panel, 'position', [0.0, 0.0, 0.0])
-            rotation = getattr(right_panel, 'rotation', [0.0, 0.0, 0.0])
-            scale = getattr(right_panel, 'scale', [1.0, 1.0, 1.0])
-
-            imgui.text("Position")
-            changed, position = imgui.drag_float3("##Position", *position, 0.1)
-            if changed:
-                right_panel.position = list(position)
-
-            imgui.spacing()
-            imgui.text("Rotation")
-            changed, rotation = imgui.drag_float3("##Rotation", *rotation, 1.0)
-            if changed:
-                right_panel.rotation = list(rotation)
+        store = self.editor.store
+        scene = store.project.scene
+        render = self.editor.context.render
+        selected = store.selection.ids
+        selected = selected[scene.alive[selected]]
+        active = store.selection.active
+        if len(selected) and (active < 0 or not scene.alive[active]):
+            active = int(selected[0])
 
+        # 变换属性: 显示活动节点的值, 修改量一次性作用到整个选择集
+        if imgui.collapsing_header("Transform", flags=imgui.TREE_NODE_DEFAULT_OPEN):
             imgui.spacing()
-            imgui.text("Scale")
-            changed, scale = imgui.drag_float3("##Scale", *scale, 0.1)
-            if changed:
-                right_panel.scale = list(scale)
 
-        # 材质属性
+            if not len(selected):
+                imgui.text_disabled("No selection")
+            else:
+                if len(selected) > 1:
+                    imgui.text(f"{len(selected)} objects selected")
+                transform = scene.transforms[active]
+                position = transform[0:3].tolist()
+                rotation = transform[3:6].tolist()
+                scale = transform[6:9].tolist()
+
+                imgui.text("Position")
+                changed, value = imgui.drag_float3("##Position", *position, 0.1)
+                if changed:
+                    scene.offset_transforms(selected, 0, np.subtract(value, position))
+
+                imgui.spacing()
+                imgui.text("Rotation")
+                changed, value = imgui.drag_float3("##Rotation", *rotation, 1.0)
+                if changed:
+                    scene.offset_transforms(selected, 3, np.subtract(value, rotation))
+
+                imgui.spacing()
+                imgui.text("Scale")
+                changed, value = imgui.drag_float3("##Scale", *scale, 0.1)
+                if changed:
+                    # 只把拖动的轴直接设为新值, 其余轴保留各节点自己的缩放
+                    scene.set_transforms(selected, 6, value, np.not_equal(value, scale))
+
+        # 材质属性: 修改选择集引用到的所有材质
         if imgui.collapsing_header("Material", flags=imgui.TREE_NODE_DEFAULT_OPEN):
             imgui.spacing()
 
-            color = getattr(right_panel, 'color', [1.0, 1.0, 1.0])
-            changed, color = imgui.color_edit3("Color", *color)
-            if changed:
-                right_panel.color = list(color)
-
-            metallic = getattr(right_panel, 'metallic', 0.0)
-            changed, metallic = imgui.slider_float("Metallic", metallic, 0.0, 1.0)
-            if changed:
-                right_panel.metallic = metallic
-
-            roughness = getattr(right_panel, 'roughness', 0.5)
-            changed, roughness = imgui.slider_float("Roughness", roughness, 0.0, 1.0)
-            if changed:
-                right_panel.roughness = roughness
+            material = int(scene.material_ids[active]) if len(selected) else -1
+            if material < 0:
+                imgui.text_disabled("No material")
+            else:
+                materials = np.unique(scene.material_ids[selected])
+                imgui.text(scene.material_names[material])
+                params = scene.materials[material].tolist()
+
+                changed, color = imgui.color_edit3("Color", *params[0:3])
+                if changed:
+                    scene.set_material_params(materials, 0, color)
+
+                changed, metallic = imgui.slider_float("Metallic", params[3], 0.0, 1.0)
+                if changed:
+                    scene.set_material_params(materials, 3, metallic)
+
+                changed, roughness = imgui.slider_float("Roughness", params[4], 0.0, 1.0)
+                if changed:
+                    scene.set_material_params(materials, 4, roughness)
+
+                changed, opacity = imgui.slider_float("Opacity", params[5], 0.0, 1.0)
+                if changed:
+                    scene.set_material_params(materials, 5, opacity)
+
+        # 网格处理: 在后台进程中运行, 再次处理同一网格会取消未完成的任务
+        mesh_id = int(scene.mesh_ids[active]) if len(selected) else -1
+        if mesh_id >= 0 and imgui.collapsing_header("Mesh")[0]:
+            imgui.spacing()
 
-            opacity = getattr(right_panel, 'opacity', 1.0)
-            changed, opacity = imgui.slider_float("Opacity", opacity, 0.0, 1.0)
-            if changed:
-                right_panel.opacity = opacity
+            service = self.editor.mesh_service
+            jobs = [job for job in service.jobs if job.mesh_id == mesh_id]
+            for label, operations in MESH_OPERATIONS:
+                if imgui.button(label, -1):
+                    service.process(mesh_id, operations)
+            if jobs:
+                imgui.progress_bar(jobs[0].progress, (-1, 0), f"{jobs[0].progress * 100:.0f}%")
+                if imgui.button("Cancel", -1):
+                    service.cancel(mesh_id)
 
         # 渲染设置
         if imgui.collapsing_header("Rendering", flags=imgui.TREE_NODE_DEFAULT_OPEN):
             imgui.spacing()
 
-            wireframe = getattr(right_panel, 'wireframe', False)
-            changed, wireframe = imgui.checkbox("Wireframe", wireframe)
-            if changed:
-                right_panel.wireframe = wireframe
+            _, render.wireframe_mode = imgui.checkbox("Wireframe", render.wireframe_mode)
+            _, render.show_normals = imgui.checkbox("Show Normals", render.show_normals)
+            _, render.show_grid = imgui.checkbox("Show Grid", render.show_grid)
+            _, render.show_mip_overlay = imgui.checkbox("Mip Overlay", render.show_mip_overlay)
 
-            normals = getattr(right_panel, 'normals', False)
-            changed, normals = imgui.checkbox("Show Normals", normals)
-            if changed:
-                right_panel.normals = normals
+            _, render.shading_mode = imgui.combo("Shading", render.shading_mode, list(SHADING_MODES))
 
-            shading_mode = getattr(right_panel, 'shading_mode', 0)
-            shading_modes = ["Solid", "Lit", "Unlit"]
-            changed, shading_mode = imgui.combo("Shading", shading_mode, shading_modes)
-            if changed:
-                right_panel.shading_mode = shading_mode
+            _, render.backface_culling = imgui.checkbox("Backface Culling", render.backface_culling)
 
-            backface_culling = getattr(right_panel, 'backface_culling', True)
-            changed, backface_culling = imgui.checkbox("Backface Culling", backface_culling)
-            if changed:
-                right_panel.backface_culling = backface_culling
+            if self.editor.context.render_mode in SOFTWARE_RENDER_MODES:
+                # 软件渲染器只支持材质、纹理和着色模式
+                imgui.text_disabled("Software renderer ignores:")
+                imgui.text_disabled(", ".join(UNSUPPORTED))
 
         # 性能信息
         if imgui.collapsing_header("Performance", flags=imgui.TREE_NODE_DEFAULT_OPEN):
@@ -250,11 +495,81 @@ class MainUI:
             imgui.text("Vertices: 1024")  # 示例数据
             imgui.text("Triangles: 512")  # 示例数据
 
-            render_time = getattr(right_panel, 'render_time', 5.3)
-            imgui.text(f"Render Time: {render_time:.2f} ms")
+            imgui.text(f"Render Time: {render.gpu_time_ms:.2f} ms")
+            imgui.text(f"Render Scale: {render.render_scale * 100:.0f}%")
+            if render.packet is not None:
+                # 工作线程生成渲染包的耗时, 与主线程提交并行
+                imgui.text(f"Scene Update: {render.packet.build_ms:.2f} ms")
+                view_packet = render.packet.views.get(render.main_viewport.name)
+                if view_packet is not None:
+                    imgui.text(f"Visible Meshes: {len(view_packet.nodes)}")
+            queue = render.queue.stats
+            imgui.text(f"Draws: {queue.draws} (sort {queue.sort_ms:.2f} ms)")
+            imgui.text(f"Switches: shader {queue.shader_switches}, material {queue.material_switches}, "
+                       f"mesh {queue.mesh_switches}")
+            table = render.material_table
+            imgui.text(f"Materials: {table.material_count} ({table.unique_count} unique), "
+                       f"Texture Arrays: {len(table.arrays)}")
+            loads = render.texture_cache.stats
+            imgui.text(f"Texture Loads: warm {loads.warm_count} ({loads.average_ms(False):.1f} ms), "
+                       f"cold {loads.cold_count} ({loads.average_ms(True):.1f} ms)")
+            streamer = render.material_table.streamer
+            if streamer is not None:
+                imgui.text(f"Texture Memory: {streamer.resident_bytes / 1048576:.1f} / "
+                           f"{streamer.budget / 1048576:.0f} MB, Streaming: {streamer.pending}")
+            imgui.text(f"Debug Vertices: {render.debug.vertex_count}")
+            stream = render.stream_buffer
+            imgui.text(f"Stream Upload: {stream.last_frame_bytes / 1024:.1f} KB/frame "
+                       f"({'persistent' if stream.persistent else 'orphaning'}), "
+                       f"stalls {stream.stalls}, orphans {stream.orphans}")
+            lights = render.clustered_lights
+            imgui.text(f"Lights: {lights.light_count} (max {lights.max_per_cluster} per cluster)")
+            shadows = render.shadows
+            imgui.text(f"Shadow Tiles Redrawn: {shadows.redrawn_tiles}, Dynamic Casters: {shadows.dynamic_count}")
+            _, render.dynamic_resolution.enabled = imgui.checkbox(
+                "Dynamic Resolution", render.dynamic_resolution.enabled
+            )
+            if render.dynamic_resolution.enabled:
+                # 交互时和静止时各自的 GPU 耗时预算, 静止时超出预算同样会降低渲染比例
+                dynamic = render.dynamic_resolution
+                _, dynamic.target_ms = imgui.slider_float("Interactive Budget (ms)", dynamic.target_ms, 4.0, 50.0)
+                _, dynamic.rest_target_ms = imgui.slider_float("Rest Budget (ms)", dynamic.rest_target_ms, 4.0, 100.0)
 
         imgui.end_child()
 
+    def __resource_browser(self):
+        """列出所有登记的 GL 对象: 按类型和所有者汇总, 以及占用最大的对象和分配位置"""
+        tracker = gl_resources.TRACKER
+        imgui.set_next_window_size(640, 420, imgui.FIRST_USE_EVER)
+        expanded, self.show_resources = imgui.begin("GPU Resources", True)
+        if expanded:
+            imgui.text(f"Live: {len(tracker.resources)} objects, {tracker.total_bytes / 1048576:.1f} MB "
+                       f"(peak {tracker.peak_bytes / 1048576:.1f} MB)")
+            imgui.text(f"Allocations: {tracker.allocations}, Releases: {tracker.releases}")
+            pool = gl_resources.POOL
+            imgui.text(f"Pool: {pool.free_bytes / 1048576:.1f} MB free, {pool.reused} reused, "
+                       f"{pool.pending} pending delete")
+            for title, key in (("By Kind", "kind"), ("By Owner", "owner")):
+                if imgui.tree_node(title, imgui.TREE_NODE_DEFAULT_OPEN):
+                    for name, (count, size) in tracker.totals(key).items():
+                        imgui.text(f"{name}: {count}, {size / 1048576:.2f} MB")
+                    imgui.tree_pop()
+            if imgui.tree_node("Objects"):
+                imgui.columns(5, "gl_resources")
+                for header in ("Kind", "Handle", "Size", "Owner", "Site"):
+                    imgui.text(header)
+                    imgui.next_column()
+                imgui.separator()
+                for resource in tracker.live()[:RESOURCE_LIST_LIMIT]:
+                    label = f" ({resource.label})" if resource.label else ""
+                    for value in (resource.kind, str(resource.handle), f"{resource.size / 1024:.1f} KB",
+                                  resource.owner + label, resource.site):
+                        imgui.text(value)
+                        imgui.next_column()
+                imgui.columns(1)
+                imgui.tree_pop()
+        imgui.end()
+
     def __status_bar(self):
         status_bar = self.__status_bar
         io = imgui.get_io()
@@ -289,9 +604,23 @@ class MainUI:
 
         # 文本内容
         imgui.set_cursor_pos_y(4)
-        imgui.text("Ready")
+        imgui.text(self.editor.store.status)
         imgui.same_line()
 
+        # 后台网格处理进度
+        service = self.editor.mesh_service
+        if service.jobs:
+            imgui.text(f"  Processing {len(service.jobs)} mesh(es)")
+            imgui.same_line()
+            imgui.progress_bar(service.progress, (120, 0))
+            imgui.same_line()
+
+        # 图像序列导出进度
+        recorder = self.editor.context.render.recorder
+        if recorder.recording:
+            imgui.text(f"  Recording frame {recorder.frame} ({recorder.readback.writer.pending} writing)")
+            imgui.same_line()
+
         # 显示当前工具
         available_width = imgui.get_content_region_available_width()
         imgui.set_cursor_pos_x(available_width - 200)
@@ -317,7 +646,13 @@ class MainUI:
 
         # 视口标题
         imgui.text("Viewport")
-        imgui.same_line(imgui.get_content_region_available_width() - 120)
+
+        # 视口布局
+        imgui.same_line(imgui.get_content_region_available_width() - 250)
+        imgui.push_item_width(120)
+        _, self.viewport_layout = imgui.combo("##ViewportLayout", self.viewport_layout, VIEWPORT_LAYOUTS)
+        imgui.pop_item_width()
+        imgui.same_line()
 
         # 视图模式选择
         view_modes = ["Edit", "Command", "ViewPort", "OPERATE"]
@@ -335,19 +670,13 @@ class MainUI:
                 context.switch_app_mode(AppModeEnum.OPERATE)
 
         # 3D视图区域
-        if context.render_mode == RenderModeEnum.NONE:
-
+        if context.render_mode in SOFTWARE_RENDER_MODES:
             viewport_size = imgui.get_content_region_available()
             viewport_pos = imgui.get_cursor_screen_position()
 
-            # 这里应该渲染3D场景到纹理，然后显示纹理
-            # 示例中使用占位符
+            # 软件渲染到 CPU 图像, 上传为纹理后显示
+            self.__draw_software_view(viewport_size)
             draw_list = imgui.get_window_draw_list()
-            draw_list.add_rect_filled(
-                viewport_pos[0], viewport_pos[1],
-                viewport_pos[0] + viewport_size[0], viewport_pos[1] + viewport_size[1],
-                imgui.get_color_u32_rgba(0.2, 0.2, 0.2, 1.0)
-            )
 
             # 绘制简单的3D坐标轴指示器
             axis_size = 80.0
@@ -396,20 +725,84 @@ class MainUI:
         else:
             # 使用 OpenGL 渲染器
             render = context.render
-            viewport_size = imgui.get_content_region_available()
-
-            # 初始化渲染器
-            render.resize(int(viewport_size[0]), int(viewport_size[1]))
-            # 设置背景色
-            # render.set_background_color(0.2, 0.2, 0.2)
-            # 渲染场景
+            # 上传本帧修改过的变换和材质
+            render.sync_scene(self.editor.store.project.scene)
             current_time = time.time() - self.start_time
-            render.render(current_time)
 
-            # 在ImGui窗口中显示渲染结果
-            imgui.image(
-                render.get_texture_id(),
-                int(viewport_size[0]), int(viewport_size[1]),
-                (0, 1), (1, 0)  # 翻转Y轴
-            )
+            if self.viewport_layout == 0:
+                for viewport in render.viewports[1:]:
+                    viewport.set_visible(False)
+                render.main_viewport.set_visible(True)
+                self.__draw_viewport_image(render, render.main_viewport, current_time)
+            else:
+                self.__draw_four_up(render, current_time)
+            # 录制时排队读回主视口, 并取回已经完成的读回
+            render.recorder.tick()
         imgui.end_child()
+
+    def __on_render_mode_changed(self, mode):
+        if mode in SOFTWARE_RENDER_MODES:
+            # 不使用 OpenGL 渲染时所有视口都不渲染
+            for viewport in self.editor.context.render.viewports:
+                viewport.set_visible(False)
+        else:
+            # 回到 OpenGL 后软件渲染的纹理不再需要
+            self.software_texture.cleanup()
+
+    def __draw_software_view(self, viewport_size):
+        context = self.editor.context
+        width = max(1, int(viewport_size[0] * SOFTWARE_RENDER_SCALE))
+        height = max(1, int(viewport_size[1] * SOFTWARE_RENDER_SCALE))
+        current_time = time.time() - self.start_time
+        image = context.software_render.render(
+            self.editor.store.project.scene, context.render.main_viewport, current_time,
+            context.render, width, height
+        )
+        self.software_image = image
+        self.software_texture.upload(image)
+        imgui.image(self.software_texture.texture_id, int(viewport_size[0]), int(viewport_size[1]))
+
+    def __draw_viewport_image(self, render, viewport, current_time):
+        """在当前子窗口中渲染并显示一个视口, 视口没有变化时直接显示上一次的结果"""
+        viewport_size = imgui.get_content_region_available()
+        # 尺寸不变时不会重新分配帧缓冲
+        viewport.resize(int(viewport_size[0]), int(viewport_size[1]))
+        # 拖动视口或控件(如变换属性)时视为正在交互, 允许降低渲染分辨率
+        viewport.interacting = self.viewport_dragging.get(viewport.name, False) or imgui.is_any_item_active()
+        render.render_viewport(viewport, current_time)
+
+        # 在ImGui窗口中显示渲染结果
+        uv0, uv1 = viewport.get_texture_uv()
+        imgui.image(
+            viewport.texture_id,
+            int(viewport_size[0]), int(viewport_size[1]),
+            uv0, uv1  # 翻转Y轴
+        )
+        self.viewport_dragging[viewport.name] = imgui.is_item_hovered() and any(
+            imgui.is_mouse_dragging(button) for button in range(3)
+        )
+
+    def __draw_four_up(self, render, current_time):
+        """2x2 视图: 透视视口加顶/前/侧三个正交视口, 被裁剪的子窗口不渲染"""
+        names = [viewport.name for viewport in render.viewports]
+        for name, projection in FOUR_UP_VIEWPORTS:
+            if name not in names:
+                render.add_viewport(name, projection)
+        viewports = [render.main_viewport] + [
+            viewport for viewport in render.viewports
+            if viewport.name in dict(FOUR_UP_VIEWPORTS)
+        ]
+
+        spacing = imgui.get_style().item_spacing
+        available = imgui.get_content_region_available()
+        width = max(1, int((available[0] - spacing[0]) / 2))
+        height = max(1, int((available[1] - spacing[1]) / 2))
+        for i, viewport in enumerate(viewports):
+            if i % 2:
+                imgui.same_line()
+            visible = imgui.begin_child(f"Viewport{viewport.name}", width, height, True)
+            viewport.set_visible(visible)
+            if visible:
+                imgui.text(viewport.name)
+                self.__draw_viewport_image(render, viewport, current_time)
+            imgui.end_child()
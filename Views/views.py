@@ -4,6 +4,7 @@ import time
 from Editor.context import Context, AppModeEnum, RenderModeEnum
 import imgui
 from Stores.mainwindowStore import MainWindowStore
+from Views.hierarchy import HierarchyView
 
 start_time = time.time()
 
@@ -79,7 +80,7 @@ def main_window(store: MainWindowStore):
 
     # 左侧面板
     if context.app_mode == AppModeEnum.EDITOR:
-        left_panel()
+        left_panel(store)
 
     # 中间视图区域
     imgui.same_line()
@@ -98,9 +99,10 @@ def main_window(store: MainWindowStore):
 
 render_left_panel_selected_tool = 0
 render_left_panel_selected_material = 0
+hierarchy_view = HierarchyView()
 
 
-def left_panel():
+def left_panel(store: MainWindowStore):
     imgui.begin_child("LeftPanel", 200, 0, True)
 
     # 工具选择
@@ -121,22 +123,7 @@ def left_panel():
     if imgui.collapsing_header("Hierarchy", flags=imgui.TREE_NODE_DEFAULT_OPEN):
         imgui.spacing()
 
-        # 模拟对象树
-        scene_node_open = imgui.tree_node("Scene")
-        if scene_node_open:
-            # 使用 TreeNodeEx flags
-            model_node_open = imgui.tree_node("Model##leaf", flags=imgui.TREE_NODE_LEAF)
-            if model_node_open:
-                imgui.bullet_text("Mesh Renderer")
-                imgui.bullet_text("Material")
-                imgui.tree_pop()  # 对应 Model 的 tree_node
-
-            light_node_open = imgui.tree_node("Light##leaf", flags=imgui.TREE_NODE_LEAF)
-            if light_node_open:
-                imgui.bullet_text("Point Light")
-                imgui.tree_pop()  # 对应 Light 的 tree_node
-
-            imgui.tree_pop()  # 对应 Scene 的 tree_node
+        hierarchy_view.draw(store)
 
     # 材质库
     if imgui.collapsing_header("Materials", flags=imgui.TREE_NODE_DEFAULT_OPEN):
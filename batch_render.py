@@ -0,0 +1,213 @@
+# batch_render.py
+"""无界面批量渲染: 加载项目, 离屏渲染指定帧范围并写出图像
+
+    python batch_render.py scene.proj -o renders/frame_{:05d}.png --frames 1-240 --workers 4
+
+没有显示器的渲染节点上默认使用 Mesa 的 OSMesa 软件 GL, 不创建窗口也不初始化 ImGui。
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def parse_frames(text):
+    """解析帧范围, 如 "1-100", "1-100:2", "5" 或 "1,3,10-12" """
+    frames = []
+    for part in text.split(","):
+        part, _, step = part.partition(":")
+        start, _, end = part.partition("-")
+        start = int(start)
+        end = int(end) if end else start
+        frames.extend(range(start, end + 1, int(step) if step else 1))
+    if not frames:
+        raise ValueError(f"帧范围为空: {text}")
+    return frames
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render a project offscreen to an image sequence.")
+    parser.add_argument("project", help="project file to render")
+    parser.add_argument("-o", "--output", default="renders/frame_{:05d}.png",
+                        help="output path pattern, formatted with the frame number")
+    parser.add_argument("--frames", default="1", help='frame range, e.g. "1-240", "1-240:2" or "1,5,10-20"')
+    parser.add_argument("--fps", type=float, default=24.0, help="frames per second of the animation time")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--camera-pos", type=float, nargs=3, metavar=("X", "Y", "Z"),
+                        help="camera position, defaults to the camera saved in the project")
+    parser.add_argument("--camera-front", type=float, nargs=3, metavar=("X", "Y", "Z"),
+                        help="camera direction, defaults to the camera saved in the project")
+    parser.add_argument("--fov", type=float, default=45.0)
+    parser.add_argument("--workers", type=int, default=1, help="number of render processes")
+    parser.add_argument("--backend", choices=("osmesa", "glfw"),
+                        help="offscreen GL backend, defaults to glfw with a display and osmesa without")
+    args = parser.parse_args(argv)
+    if args.backend is None:
+        args.backend = "glfw" if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin") else "osmesa"
+    return args
+
+
+def _select_platform(backend):
+    """PyOpenGL 在第一次导入时根据环境变量选择平台, 必须在导入 OpenGL 之前设置"""
+    if backend == "osmesa":
+        os.environ["PYOPENGL_PLATFORM"] = "osmesa"
+
+
+class OffscreenContext:
+    """离屏 GL 上下文; 渲染结果写入 RenderEngine 的帧缓冲, 默认缓冲只需 1x1"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._handle = None
+        self._buffer = None
+
+    def __enter__(self):
+        if self.backend == "osmesa":
+            from OpenGL import arrays, osmesa
+            import OpenGL.GL as gl
+            self._handle = osmesa.OSMesaCreateContextAttribs([
+                osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA,
+                osmesa.OSMESA_DEPTH_BITS, 24,
+                osmesa.OSMESA_PROFILE, osmesa.OSMESA_CORE_PROFILE,
+                osmesa.OSMESA_CONTEXT_MAJOR_VERSION, 3,
+                osmesa.OSMESA_CONTEXT_MINOR_VERSION, 3,
+                0,
+            ], None)
+            if not self._handle:
+                raise RuntimeError("创建 OSMesa 上下文失败")
+            self._buffer = arrays.GLubyteArray.zeros((1, 1, 4))
+            if not osmesa.OSMesaMakeCurrent(self._handle, self._buffer, gl.GL_UNSIGNED_BYTE, 1, 1):
+                raise RuntimeError("激活 OSMesa 上下文失败")
+        else:
+            import glfw
+            import OpenGL.GL as gl
+            if not glfw.init():
+                raise RuntimeError("Failed to initialize GLFW")
+            glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+            glfw.window_hint(glfw.CONTEXT_VERSION_MAJOR, 3)
+            glfw.window_hint(glfw.CONTEXT_VERSION_MINOR, 3)
+            glfw.window_hint(glfw.OPENGL_PROFILE, glfw.OPENGL_CORE_PROFILE)
+            glfw.window_hint(glfw.OPENGL_FORWARD_COMPAT, gl.GL_TRUE)
+            self._handle = glfw.create_window(1, 1, "batch_render", None, None)
+            if not self._handle:
+                glfw.terminate()
+                raise RuntimeError("Failed to create GLFW window")
+            glfw.make_context_current(self._handle)
+        return self
+
+    def __exit__(self, *exc):
+        if self.backend == "osmesa":
+            from OpenGL import osmesa
+            osmesa.OSMesaDestroyContext(self._handle)
+        else:
+            import glfw
+            glfw.destroy_window(self._handle)
+            glfw.terminate()
+        return False
+
+
+def render_complete(render, viewport, scene, time):
+    """渲染一帧, 直到渲染时请求的纹理级别全部驻留
+
+    纹理级别在渲染时请求, 下一次 sync_scene 时才调度加载, 每帧最多上传几个级别;
+    交互时可以先显示粗级别, 离线输出则必须等到完整的纹理再读回。
+    """
+    render.sync_scene(scene)
+    render.render_viewport(viewport, time)
+    streamer = render.material_table.streamer
+    if streamer is None:
+        return
+    while True:
+        streamer.wait()
+        render.sync_scene(scene)
+        if streamer.settled and not viewport.dirty:
+            return
+        viewport.dirty = True
+        render.render_viewport(viewport, time)
+
+
+def render_frames(args, frames, worker=0):
+    """在当前进程中创建上下文并渲染 frames, 返回写出的帧数"""
+    _select_platform(args.backend)
+    import numpy as np
+
+    from Stores.projectStore import ProjectStore
+    from renderer import gl_resources
+    from renderer.ds_engine import RenderEngine
+
+    project = ProjectStore()
+    project.open(args.project)
+    state = project.editor_state
+
+    with OffscreenContext(args.backend):
+        render = RenderEngine(args.width, args.height)
+        render.initialize()
+        viewport = render.main_viewport
+        # 批量渲染总是输出完整分辨率
+        viewport.dynamic_resolution.enabled = False
+        viewport.fov = args.fov
+        camera_pos = args.camera_pos or state.get("camera_pos")
+        camera_front = args.camera_front or state.get("camera_front")
+        if camera_pos is not None:
+            viewport.camera_pos[:] = camera_pos
+        if camera_front is not None:
+            viewport.camera_front[:] = np.asarray(camera_front) / np.linalg.norm(camera_front)
+
+        readback = render.recorder.readback
+        start = time.perf_counter()
+        try:
+            for frame in frames:
+                # 相机固定, 动画时间由帧号决定, 与实际耗时无关
+                render_complete(render, viewport, project.scene, frame / args.fps)
+                readback.capture(viewport, args.output.format(frame))
+                readback.poll()
+            readback.flush()
+            readback.writer.wait()
+        finally:
+            render.cleanup()
+            project.close()
+            report = gl_resources.TRACKER.leak_report()
+            if report:
+                print(f"[worker {worker}] {report}")
+
+    elapsed = time.perf_counter() - start
+    print(f"[worker {worker}] {len(frames)} frame(s) in {elapsed:.1f}s "
+          f"({len(frames) / max(elapsed, 1e-6):.1f} fps), {readback.writer.written} written")
+    if readback.writer.last_error:
+        raise RuntimeError(readback.writer.last_error)
+    return readback.writer.written
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    frames = parse_frames(args.frames)
+    # 单进程时在本进程渲染, 导入任何 OpenGL 模块之前先选择平台
+    _select_platform(args.backend)
+    # 提前检查输出格式, 避免所有进程启动后才报错
+    from renderer.readback import image_format
+    image_format(args.output.format(frames[0]))
+
+    workers = max(1, min(args.workers, len(frames)))
+    if workers == 1:
+        render_frames(args, frames)
+        return 0
+
+    # 交错分片: 每个进程分到的帧在时间上均匀分布, 耗时不同的片段也能平衡负载
+    shards = [frames[i::workers] for i in range(workers)]
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(render_frames, args, shard, i) for i, shard in enumerate(shards)]
+        failed = 0
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"渲染进程失败, 错误: {e}")
+                failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+import numpy as np
+import OpenGL.GL as gl
+
+from renderer import gl_resources
+
+# 视锥划分: 屏幕 16x9 块, 深度方向按指数划分 24 层
+CLUSTER_X, CLUSTER_Y, CLUSTER_Z = 16, 9, 24
+CLUSTER_COUNT = CLUSTER_X * CLUSTER_Y * CLUSTER_Z
+# 每盏灯 4 个 RGBA32F 纹素: 位置+半径, 颜色+类型, 方向+外锥角余弦, 内锥角余弦
+LIGHT_SIZE = 16
+POINT, SPOT = 0.0, 1.0
+# 场景中的灯光节点: 影响半径为最大缩放的倍数
+LIGHT_RANGE_SCALE = 10.0
+
+
+def pack_lights(positions, colors, ranges, kinds=None, directions=None, cos_outer=None, cos_inner=None):
+    """把灯光参数打包为 (N, LIGHT_SIZE) float32"""
+    count = len(positions)
+    lights = np.zeros((count, LIGHT_SIZE), dtype=np.float32)
+    lights[:, 0:3] = positions
+    lights[:, 3] = ranges
+    lights[:, 4:7] = colors
+    lights[:, 7] = POINT if kinds is None else kinds
+    lights[:, 8:11] = (0.0, -1.0, 0.0) if directions is None else directions
+    lights[:, 11] = -1.0 if cos_outer is None else cos_outer
+    lights[:, 12] = -1.0 if cos_inner is None else cos_inner
+    return lights
+
+
+class LightSet:
+    """由代码添加的灯光 (场景灯光节点之外), 按列存储"""
+
+    def __init__(self):
+        self.lights = np.zeros((0, LIGHT_SIZE), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.lights)
+
+    def clear(self):
+        self.lights = self.lights[:0]
+
+    def add_point(self, position, color=(1.0, 1.0, 1.0), radius=5.0):
+        self.lights = np.concatenate([self.lights, pack_lights([position], [color], [radius])])
+        return len(self.lights) - 1
+
+    def add_spot(self, position, direction, color=(1.0, 1.0, 1.0), radius=10.0, outer_angle=30.0, inner_angle=20.0):
+        direction = np.asarray(direction, dtype=np.float32)
+        direction = direction / np.linalg.norm(direction)
+        light = pack_lights(
+            [position], [color], [radius], [SPOT], [direction],
+            [np.cos(np.radians(outer_angle))], [np.cos(np.radians(inner_angle))],
+        )
+        self.lights = np.concatenate([self.lights, light])
+        return len(self.lights) - 1
+
+
+def cluster_depths(near, far):
+    """指数划分的深度层边界 (CLUSTER_Z + 1,), 近处分得更细"""
+    return near * (far / near) ** (np.arange(CLUSTER_Z + 1) / CLUSTER_Z)
+
+
+def assign_lights(lights, view, projection, near, far):
+    """计算每个簇受影响的灯光列表
+
+    返回 (grid (CLUSTER_COUNT, 2) uint32 [偏移, 数量], indices (M,) uint32)。
+    灯光用包围球在视图空间的包围盒投影到屏幕, 再按深度层求覆盖的簇范围, 全部向量化。
+    """
+    count = len(lights)
+    if not count:
+        return np.zeros((CLUSTER_COUNT, 2), dtype=np.uint32), np.zeros(1, dtype=np.uint32)
+
+    centers = np.hstack([lights[:, 0:3], np.ones((count, 1), dtype=np.float32)]) @ view
+    x, y, depth = centers[:, 0], centers[:, 1], -centers[:, 2]
+    radius = lights[:, 3]
+    near_depth = np.maximum(depth - radius, near)
+    far_depth = depth + radius
+    # 完全在相机后方或远平面之外的灯光不影响任何簇
+    keep = (far_depth > near) & (depth - radius < far)
+
+    if projection[3, 3] == 0.0:
+        # 透视: 包围盒四个角中投影最小和最大的分量
+        def extent(center, scale):
+            lo = np.minimum((center - radius) / near_depth, (center - radius) / far_depth) * scale
+            hi = np.maximum((center + radius) / near_depth, (center + radius) / far_depth) * scale
+            return lo, hi
+        x0, x1 = extent(x, projection[0, 0])
+        y0, y1 = extent(y, projection[1, 1])
+    else:
+        x0, x1 = (x - radius) * projection[0, 0] + projection[3, 0], (x + radius) * projection[0, 0] + projection[3, 0]
+        y0, y1 = (y - radius) * projection[1, 1] + projection[3, 1], (y + radius) * projection[1, 1] + projection[3, 1]
+    keep &= (x1 > -1.0) & (x0 < 1.0) & (y1 > -1.0) & (y0 < 1.0)
+
+    def tiles(lo, hi, n):
+        return (np.clip(np.floor((lo + 1.0) * 0.5 * n), 0, n - 1).astype(np.int64),
+                np.clip(np.floor((hi + 1.0) * 0.5 * n), 0, n - 1).astype(np.int64))
+    tx0, tx1 = tiles(x0, x1, CLUSTER_X)
+    ty0, ty1 = tiles(y0, y1, CLUSTER_Y)
+    log_scale = CLUSTER_Z / np.log(far / near)
+    tz0 = np.clip(np.floor(np.log(near_depth / near) * log_scale), 0, CLUSTER_Z - 1).astype(np.int64)
+    tz1 = np.clip(np.floor(np.log(np.maximum(far_depth, near) / near) * log_scale), 0, CLUSTER_Z - 1).astype(np.int64)
+
+    ids = np.flatnonzero(keep)
+    nx, ny, nz = (tx1 - tx0 + 1)[ids], (ty1 - ty0 + 1)[ids], (tz1 - tz0 + 1)[ids]
+    per_light = nx * ny * nz
+    total = int(per_light.sum())
+
+    # 展开每盏灯覆盖的所有簇: local 是灯光内部的序号, 再拆成 x/y/z 偏移
+    owner = np.repeat(np.arange(len(ids)), per_light)
+    local = np.arange(total) - np.repeat(np.cumsum(per_light) - per_light, per_light)
+    lx = local % nx[owner]
+    ly = (local // nx[owner]) % ny[owner]
+    lz = local // (nx[owner] * ny[owner])
+    light = ids[owner]
+    cluster = ((tz0[light] + lz) * CLUSTER_Y + (ty0[light] + ly)) * CLUSTER_X + (tx0[light] + lx)
+
+    order = np.argsort(cluster, kind="stable")
+    counts = np.bincount(cluster, minlength=CLUSTER_COUNT)
+    grid = np.empty((CLUSTER_COUNT, 2), dtype=np.uint32)
+    grid[:, 0] = np.cumsum(counts) - counts
+    grid[:, 1] = counts
+    indices = light[order].astype(np.uint32)
+    # 纹理缓冲不能为空
+    return grid, indices if len(indices) else np.zeros(1, dtype=np.uint32)
+
+
+class TextureBuffer:
+    """纹理缓冲: 着色器中用 texelFetch 按下标读取的一维数据"""
+
+    def __init__(self, internal_format, label="", stream=None):
+        self.internal_format = internal_format
+        # 每帧都重新上传的数据从 StreamBuffer 切出一段, 纹理缓冲直接引用该段
+        self.stream = stream if stream is not None and stream.texture_ranges else None
+        self.buffer = gl_resources.create("buffer", self, label)
+        # 纹理缓冲只是缓冲的视图, 不另外占用显存
+        self.texture = gl_resources.create("texture", self, label)
+        self.capacity = 0
+
+    def upload(self, data):
+        if self.stream is not None:
+            offset = self.stream.write(data, self.stream.texture_alignment)
+            gl.glBindTexture(gl.GL_TEXTURE_BUFFER, self.texture)
+            gl.glTexBufferRange(gl.GL_TEXTURE_BUFFER, self.internal_format, self.stream.buffer, offset, data.nbytes)
+            gl.glBindTexture(gl.GL_TEXTURE_BUFFER, 0)
+            return
+        gl.glBindBuffer(gl.GL_TEXTURE_BUFFER, self.buffer)
+        if data.nbytes > self.capacity:
+            self.capacity = max(data.nbytes, self.capacity * 2)
+            gl_resources.set_size("buffer", self.buffer, self.capacity)
+        # 每帧重新分配, 不等待上一帧对旧内容的读取
+        gl.glBufferData(gl.GL_TEXTURE_BUFFER, self.capacity, None, gl.GL_STREAM_DRAW)
+        gl.glBufferSubData(gl.GL_TEXTURE_BUFFER, 0, data.nbytes, data)
+        gl.glBindTexture(gl.GL_TEXTURE_BUFFER, self.texture)
+        gl.glTexBuffer(gl.GL_TEXTURE_BUFFER, self.internal_format, self.buffer)
+        gl.glBindBuffer(gl.GL_TEXTURE_BUFFER, 0)
+
+    def bind(self, unit):
+        gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+        gl.glBindTexture(gl.GL_TEXTURE_BUFFER, self.texture)
+
+    def cleanup(self):
+        gl_resources.delete("texture", self.texture)
+        gl_resources.delete("buffer", self.buffer)
+
+
+class ClusteredLights:
+    """分簇前向光照: 灯光数据、簇网格和灯光下标列表放在三个纹理缓冲中
+
+    每帧每个视口在 CPU 上用 NumPy 重新分配灯光, 片段着色器只遍历所在簇的灯光。
+    """
+
+    # 纹理单元, 0 号留给材质纹理
+    LIGHTS_UNIT, GRID_UNIT, INDICES_UNIT = 1, 2, 3
+
+    def __init__(self):
+        self.lights = None
+        self.grid = None
+        self.indices = None
+        # 上一次分配的统计: 灯光数和最拥挤的簇中的灯光数
+        self.light_count = 0
+        self.max_per_cluster = 0
+        self.created = False
+
+    def create(self, stream=None):
+        """stream 为 StreamBuffer 时, 每个视口每帧的分配结果写入环形缓冲"""
+        self.lights = TextureBuffer(gl.GL_RGBA32F, "cluster lights", stream)
+        self.grid = TextureBuffer(gl.GL_RG32UI, "cluster grid", stream)
+        self.indices = TextureBuffer(gl.GL_R32UI, "cluster indices", stream)
+        self.created = True
+
+    def update(self, lights, view, projection, near, far):
+        grid, indices = assign_lights(lights, view, projection, near, far)
+        data = lights if len(lights) else np.zeros((1, LIGHT_SIZE), dtype=np.float32)
+        self.lights.upload(np.ascontiguousarray(data, dtype=np.float32))
+        self.grid.upload(grid)
+        self.indices.upload(indices)
+        self.light_count = len(lights)
+        self.max_per_cluster = int(grid[:, 1].max())
+
+    def bind(self, shader, near, far, width, height):
+        self.lights.bind(self.LIGHTS_UNIT)
+        self.grid.bind(self.GRID_UNIT)
+        self.indices.bind(self.INDICES_UNIT)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glUniform1i(gl.glGetUniformLocation(shader, "clusterLights"), self.LIGHTS_UNIT)
+        gl.glUniform1i(gl.glGetUniformLocation(shader, "clusterGrid"), self.GRID_UNIT)
+        gl.glUniform1i(gl.glGetUniformLocation(shader, "clusterIndices"), self.INDICES_UNIT)
+        gl.glUniform2f(gl.glGetUniformLocation(shader, "clusterScreen"), width, height)
+        gl.glUniform2f(gl.glGetUniformLocation(shader, "clusterDepth"), near, CLUSTER_Z / np.log(far / near))
+
+    def cleanup(self):
+        if not self.created:
+            return
+        for buffer in (self.lights, self.grid, self.indices):
+            buffer.cleanup()
+        self.created = False
+
+
+# 片段着色器中的分簇光照函数, 由 RenderEngine 的片段着色器拼接使用
+CLUSTER_SHADER_FUNCTIONS = f"""
+        uniform samplerBuffer clusterLights;
+        uniform usamplerBuffer clusterGrid;
+        uniform usamplerBuffer clusterIndices;
+        uniform vec2 clusterScreen;
+        uniform vec2 clusterDepth;  // 近平面, 深度层换算系数
+
+        vec3 clusteredLighting(vec3 fragPos, vec3 norm, vec3 viewDir, float viewDepth, vec3 albedo, float shininess)
+        {{
+            ivec2 tile = ivec2(gl_FragCoord.xy / clusterScreen * vec2({CLUSTER_X}, {CLUSTER_Y}));
+            tile = clamp(tile, ivec2(0), ivec2({CLUSTER_X - 1}, {CLUSTER_Y - 1}));
+            int slice = clamp(int(log(max(viewDepth, clusterDepth.x) / clusterDepth.x) * clusterDepth.y), 0, {CLUSTER_Z - 1});
+            uvec2 cell = texelFetch(clusterGrid, (slice * {CLUSTER_Y} + tile.y) * {CLUSTER_X} + tile.x).xy;
+
+            vec3 result = vec3(0.0);
+            for (uint i = 0u; i < cell.y; i++) {{
+                int index = int(texelFetch(clusterIndices, int(cell.x + i)).r) * 4;
+                vec4 positionRange = texelFetch(clusterLights, index);
+                vec4 colorKind = texelFetch(clusterLights, index + 1);
+                vec4 directionOuter = texelFetch(clusterLights, index + 2);
+                float cosInner = texelFetch(clusterLights, index + 3).x;
+
+                vec3 toLight = positionRange.xyz - fragPos;
+                float distance = length(toLight);
+                if (distance >= positionRange.w)
+                    continue;
+                vec3 lightDir = toLight / distance;
+                // 在半径处平滑衰减到 0
+                float ratio = distance / positionRange.w;
+                float window = clamp(1.0 - ratio * ratio * ratio * ratio, 0.0, 1.0);
+                float attenuation = window * window / (distance * distance + 1.0);
+                if (colorKind.w > 0.5) {{
+                    float cosAngle = dot(-lightDir, directionOuter.xyz);
+                    attenuation *= smoothstep(directionOuter.w, cosInner, cosAngle);
+                }}
+
+                float diff = max(dot(norm, lightDir), 0.0);
+                vec3 reflectDir = reflect(-lightDir, norm);
+                float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
+                result += colorKind.rgb * attenuation * (diff * albedo + spec);
+            }}
+            return result;
+        }}
+"""
@@ -0,0 +1,335 @@
+import ctypes
+
+import numpy as np
+import OpenGL.GL as gl
+
+from renderer import gl_resources
+
+# 每个顶点: 位置(3) 颜色(3)
+VERTEX_SIZE = 6
+# 法线线段的每个顶点: 位置(3) 法线(3) 端点(1)
+NORMAL_VERTEX_SIZE = 7
+# 包围盒 12 条边的端点, 用单位立方体 8 个角的下标表示
+BOX_EDGES = np.array([
+    0, 1, 1, 3, 3, 2, 2, 0,
+    4, 5, 5, 7, 7, 6, 6, 4,
+    0, 4, 1, 5, 2, 6, 3, 7,
+])
+BOX_CORNERS = np.array([[x, y, z] for z in (0, 1) for y in (0, 1) for x in (0, 1)], dtype=np.float32)
+AXIS_COLORS = ((1.0, 0.2, 0.2), (0.2, 1.0, 0.2), (0.3, 0.5, 1.0))
+
+
+def _vertices(points, color):
+    """(N, 3) 点和单一颜色或 (N, 3) 颜色拼成顶点数组"""
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+    vertices = np.empty((len(points), VERTEX_SIZE), dtype=np.float32)
+    vertices[:, :3] = points
+    vertices[:, 3:] = color
+    return vertices
+
+
+def _transform(points, matrix):
+    """行向量约定的点变换, matrix 可以是 (4, 4) 或 (K, 4, 4), 后者返回 (K * N, 3)"""
+    homogeneous = np.concatenate([points, np.ones((len(points), 1), dtype=np.float32)], axis=1)
+    result = homogeneous @ matrix
+    result = result[..., :3] / result[..., 3:]
+    return result.reshape(-1, 3)
+
+
+def normal_segments(vertices):
+    """网格法线线段的局部数据 (2V, 7): 位置(3) 法线(3) 端点(起点 0, 终点 1), 每个顶点两行"""
+    segments = np.zeros((len(vertices), 2, NORMAL_VERTEX_SIZE), dtype=np.float32)
+    segments[:, :, 0:6] = vertices[:, None, 0:6]
+    segments[:, 1, 6] = 1.0
+    return segments.reshape(-1, NORMAL_VERTEX_SIZE)
+
+
+def normal_matrices(matrices):
+    """各实例的法线矩阵 (K, 3, 3): 模型矩阵 3x3 部分的逆转置, 行向量约定下 n_world = n @ N"""
+    matrices = np.asarray(matrices, dtype=np.float32).reshape(-1, 4, 4)
+    return np.linalg.inv(matrices[:, :3, :3]).transpose(0, 2, 1).astype(np.float32)
+
+
+def grid_lines(size, step):
+    """XZ 平面上以原点为中心的网格线 (2N, 3)"""
+    ticks = np.arange(-size, size + step * 0.5, step, dtype=np.float32)
+    count = len(ticks)
+    lines = np.zeros((count * 2, 2, 3), dtype=np.float32)
+    lines[:count, 0, 0] = lines[:count, 1, 0] = ticks
+    lines[:count, 0, 2], lines[:count, 1, 2] = -size, size
+    lines[count:, 0, 2] = lines[count:, 1, 2] = ticks
+    lines[count:, 0, 0], lines[count:, 1, 0] = -size, size
+    return lines.reshape(-1, 3)
+
+
+class DebugDraw:
+    """立即模式的调试绘制: 线段和点在一帧内累积到 CPU 数组, 绘制时一次上传到流式顶点缓冲
+
+    所有线段一次 glDrawArrays(GL_LINES), 所有点一次 glDrawArrays(GL_POINTS), 并参与深度测试。
+    图元在 clear 之前对每个视口都有效。
+
+    网格法线的数据量与顶点数成正比, 不经过流式缓冲: 局部线段按网格上传一次到静态缓冲,
+    每个实例只设置模型矩阵和法线矩阵, 由着色器变换到世界空间。
+    """
+
+    def __init__(self):
+        self._lines = []
+        self._points = []
+        # 法线批次 (网格 id, 顶点数组, 模型矩阵 (K, 4, 4), 长度, 颜色)
+        self._normals = []
+        self._grid_cache = {}
+        # 网格 id -> (顶点数组, 缓冲, 顶点数); 顶点数组换成新对象时重新上传
+        self._normal_buffers = {}
+        self.vao = 0
+        self.normal_vao = 0
+        self.stream = None
+        self.shader = None
+        self.normal_shader = None
+        # 上一次绘制的顶点数, 用于性能面板
+        self.vertex_count = 0
+
+    @property
+    def empty(self):
+        return not self._lines and not self._points and not self._normals
+
+    def create(self, create_shader, stream):
+        """顶点数据每帧写入 stream (StreamBuffer)"""
+        self.shader = create_shader(DEBUG_VERTEX_SHADER, DEBUG_FRAGMENT_SHADER, owner=self)
+        self.normal_shader = create_shader(DEBUG_NORMAL_VERTEX_SHADER, DEBUG_FRAGMENT_SHADER,
+                                           owner=self, label="debug normals")
+        self.vao = gl_resources.create("vertex_array", self, "debug lines")
+        self.normal_vao = gl_resources.create("vertex_array", self, "debug normals")
+        self.stream = stream
+        gl.glBindVertexArray(self.vao)
+        gl.glEnableVertexAttribArray(0)
+        gl.glEnableVertexAttribArray(1)
+        gl.glBindVertexArray(self.normal_vao)
+        for location in range(3):
+            gl.glEnableVertexAttribArray(location)
+        gl.glBindVertexArray(0)
+
+    def clear(self):
+        self._lines = []
+        self._points = []
+        self._normals = []
+
+    def mark(self):
+        """记录当前位置, 之后用 rewind 撤销只属于某个视口的图元"""
+        return len(self._lines), len(self._points), len(self._normals)
+
+    def rewind(self, mark):
+        del self._lines[mark[0]:]
+        del self._points[mark[1]:]
+        del self._normals[mark[2]:]
+
+    # 图元
+
+    def line(self, start, end, color=(1.0, 1.0, 1.0)):
+        self.lines([start], [end], color)
+
+    def lines(self, starts, ends, color=(1.0, 1.0, 1.0)):
+        """批量线段, starts/ends 为 (N, 3), color 为单一颜色或 (N, 3)"""
+        starts = np.asarray(starts, dtype=np.float32).reshape(-1, 3)
+        ends = np.asarray(ends, dtype=np.float32).reshape(-1, 3)
+        points = np.stack([starts, ends], axis=1).reshape(-1, 3)
+        color = np.asarray(color, dtype=np.float32)
+        if color.ndim == 2:
+            color = np.repeat(color, 2, axis=0)
+        self._lines.append(_vertices(points, color))
+
+    def segments(self, points, color=(1.0, 1.0, 1.0)):
+        """已经按端点成对排列的线段 (2N, 3), 法线和网格等大批量数据走这里, 不再复制一次"""
+        self._lines.append(_vertices(points, color))
+
+    def point(self, position, color=(1.0, 1.0, 1.0)):
+        self.points([position], color)
+
+    def points(self, positions, color=(1.0, 1.0, 1.0)):
+        self._points.append(_vertices(positions, color))
+
+    def box(self, lo, hi, color=(1.0, 1.0, 0.0), matrix=None):
+        """轴对齐包围盒, 给出 matrix 时先变换到世界空间"""
+        lo = np.asarray(lo, dtype=np.float32)
+        hi = np.asarray(hi, dtype=np.float32)
+        corners = lo + BOX_CORNERS * (hi - lo)
+        if matrix is not None:
+            corners = _transform(corners, matrix)
+        self.segments(corners[BOX_EDGES], color)
+
+    def boxes(self, lo, hi, matrices, color=(1.0, 1.0, 0.0)):
+        """同一局部包围盒的多个实例, matrices 为 (K, 4, 4)"""
+        lo = np.asarray(lo, dtype=np.float32)
+        hi = np.asarray(hi, dtype=np.float32)
+        edges = (lo + BOX_CORNERS * (hi - lo))[BOX_EDGES]
+        self.segments(_transform(edges, matrices), color)
+
+    def frustum(self, view, projection, color=(1.0, 0.6, 0.0)):
+        """相机视锥: 把 NDC 立方体的角点变换回世界空间"""
+        inverse = np.linalg.inv(np.asarray(view @ projection, dtype=np.float64))
+        corners = _transform(BOX_CORNERS * 2.0 - 1.0, inverse)
+        self.segments(corners[BOX_EDGES], color)
+
+    def axes(self, matrix=None, size=1.0):
+        """坐标轴: X 红 Y 绿 Z 蓝"""
+        points = np.zeros((6, 3), dtype=np.float32)
+        points[1, 0] = points[3, 1] = points[5, 2] = size
+        if matrix is not None:
+            points = _transform(points, matrix)
+        self.segments(points, np.repeat(np.asarray(AXIS_COLORS, dtype=np.float32), 2, axis=0))
+
+    def grid(self, size=10.0, step=1.0, color=(0.35, 0.35, 0.35)):
+        key = (size, step)
+        if key not in self._grid_cache:
+            self._grid_cache[key] = grid_lines(size, step)
+        self.segments(self._grid_cache[key], color)
+        self.axes(size=step)
+
+    def normals(self, mesh_id, mesh, matrices, length=0.1, color=(0.2, 0.6, 1.0)):
+        """网格所有实例 (matrices (K, 4, 4)) 的顶点法线, 线段在世界空间中长 length"""
+        matrices = np.asarray(matrices, dtype=np.float32).reshape(-1, 4, 4)
+        if len(matrices) and len(mesh.vertices):
+            self._normals.append((mesh_id, mesh.vertices, matrices, length, color))
+
+    # 绘制
+
+    def draw(self, view, projection):
+        """把累积的图元上传到流式缓冲并绘制, 调用前应绑定目标帧缓冲"""
+        self.vertex_count = 0
+        if self._lines or self._points:
+            self.__draw_primitives(view, projection)
+        if self._normals:
+            self.__draw_normals(view, projection)
+
+    def __draw_primitives(self, view, projection):
+        lines = np.concatenate(self._lines) if self._lines else np.zeros((0, VERTEX_SIZE), np.float32)
+        points = np.concatenate(self._points) if self._points else np.zeros((0, VERTEX_SIZE), np.float32)
+        data = np.concatenate([lines, points])
+        self.vertex_count += len(data)
+
+        # 写入环形缓冲的新区间, 不等待 GPU 读取上一帧的顶点
+        stride = VERTEX_SIZE * 4
+        offset = self.stream.write(data, stride)
+
+        gl.glUseProgram(self.shader)
+        gl.glUniformMatrix4fv(gl.glGetUniformLocation(self.shader, "view"), 1, gl.GL_FALSE, view)
+        gl.glUniformMatrix4fv(gl.glGetUniformLocation(self.shader, "projection"), 1, gl.GL_FALSE, projection)
+        gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_FILL)
+        gl.glEnable(gl.GL_PROGRAM_POINT_SIZE)
+        gl.glBindVertexArray(self.vao)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.stream.buffer)
+        gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, stride, ctypes.c_void_p(offset))
+        gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, stride, ctypes.c_void_p(offset + 12))
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        if len(lines):
+            gl.glDrawArrays(gl.GL_LINES, 0, len(lines))
+        if len(points):
+            gl.glDrawArrays(gl.GL_POINTS, len(lines), len(points))
+        gl.glBindVertexArray(0)
+        gl.glDisable(gl.GL_PROGRAM_POINT_SIZE)
+
+    def __draw_normals(self, view, projection):
+        gl.glUseProgram(self.normal_shader)
+        gl.glUniformMatrix4fv(gl.glGetUniformLocation(self.normal_shader, "view"), 1, gl.GL_FALSE, view)
+        gl.glUniformMatrix4fv(gl.glGetUniformLocation(self.normal_shader, "projection"), 1, gl.GL_FALSE, projection)
+        model_location = gl.glGetUniformLocation(self.normal_shader, "model")
+        normal_location = gl.glGetUniformLocation(self.normal_shader, "normalMatrix")
+        gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_FILL)
+        gl.glBindVertexArray(self.normal_vao)
+        stride = NORMAL_VERTEX_SIZE * 4
+        for mesh_id, vertices, matrices, length, color in self._normals:
+            buffer, count = self.__normal_buffer(mesh_id, vertices)
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, buffer)
+            gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, stride, ctypes.c_void_p(0))
+            gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, stride, ctypes.c_void_p(12))
+            gl.glVertexAttribPointer(2, 1, gl.GL_FLOAT, gl.GL_FALSE, stride, ctypes.c_void_p(24))
+            gl.glUniform1f(gl.glGetUniformLocation(self.normal_shader, "normalLength"), length)
+            gl.glUniform3f(gl.glGetUniformLocation(self.normal_shader, "color"), *color)
+            # 所有实例的法线矩阵一次批量求逆
+            for model, normal_matrix in zip(matrices, normal_matrices(matrices)):
+                gl.glUniformMatrix4fv(model_location, 1, gl.GL_FALSE, model)
+                gl.glUniformMatrix3fv(normal_location, 1, gl.GL_FALSE, normal_matrix)
+                gl.glDrawArrays(gl.GL_LINES, 0, count)
+            self.vertex_count += count * len(matrices)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glBindVertexArray(0)
+
+    def __normal_buffer(self, mesh_id, vertices):
+        """网格法线的局部线段缓冲, 网格数据替换后重新上传"""
+        cached = self._normal_buffers.get(mesh_id)
+        if cached is not None and cached[0] is vertices:
+            return cached[1], cached[2]
+        if cached is not None:
+            gl_resources.release("buffer", cached[1])
+        data = normal_segments(vertices)
+        buffer = gl_resources.create("buffer", self, f"debug normals {mesh_id}", data.nbytes)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, buffer)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, data.nbytes, data, gl.GL_STATIC_DRAW)
+        self._normal_buffers[mesh_id] = (vertices, buffer, len(data))
+        return buffer, len(data)
+
+    def cleanup(self):
+        if not self.vao:
+            return
+        gl_resources.delete("vertex_array", self.vao, self.normal_vao)
+        gl_resources.delete("program", self.shader, self.normal_shader)
+        gl_resources.delete("buffer", *[buffer for _, buffer, _ in self._normal_buffers.values()])
+        self._normal_buffers = {}
+        self.vao = 0
+        self.normal_vao = 0
+        self.stream = None
+
+
+DEBUG_VERTEX_SHADER = """
+#version 330 core
+layout (location = 0) in vec3 aPos;
+layout (location = 1) in vec3 aColor;
+
+out vec3 Color;
+
+uniform mat4 view;
+uniform mat4 projection;
+
+void main()
+{
+    Color = aColor;
+    gl_PointSize = 5.0;
+    gl_Position = projection * view * vec4(aPos, 1.0);
+}
+"""
+
+# 法线线段: 起点为顶点的世界位置, 终点沿法线矩阵变换后的方向延长 normalLength
+DEBUG_NORMAL_VERTEX_SHADER = """
+#version 330 core
+layout (location = 0) in vec3 aPos;
+layout (location = 1) in vec3 aNormal;
+layout (location = 2) in float aEnd;
+
+out vec3 Color;
+
+uniform mat4 model;
+uniform mat3 normalMatrix;
+uniform mat4 view;
+uniform mat4 projection;
+uniform float normalLength;
+uniform vec3 color;
+
+void main()
+{
+    Color = color;
+    vec3 world = vec3(model * vec4(aPos, 1.0));
+    vec3 normal = normalize(normalMatrix * aNormal);
+    gl_Position = projection * view * vec4(world + normal * (normalLength * aEnd), 1.0);
+}
+"""
+
+DEBUG_FRAGMENT_SHADER = """
+#version 330 core
+out vec4 FragColor;
+
+in vec3 Color;
+
+void main()
+{
+    FragColor = vec4(Color, 1.0);
+}
+"""
@@ -0,0 +1,39 @@
+class DirtyRanges:
+    """跟踪场景变换和材质数组自上次同步以来修改过的行区间
+
+    绘制时模型矩阵以 uniform 传入着色器, 材质参数由 MaterialTable 上传, 这里不再保留 GPU 副本;
+    只把场景记录的脏区间合并成每帧每个数组一个区间, 供视口重绘和材质表刷新判断。
+    """
+
+    NAMES = ("transforms", "materials")
+
+    def __init__(self):
+        self.scene = None
+        self._rows = {}
+        # 最近一次同步修改过的行区间 name -> (lo, hi), 供视口判断是否需要重绘
+        self.changed = {}
+
+    def sync(self, scene):
+        """取出场景自上次同步以来修改过的行区间"""
+        if scene is not self.scene:
+            # 换了场景(新建/打开项目)时整体视为已修改
+            self.scene = scene
+            scene.gpu_dirty.clear()
+            self._rows = {}
+
+        self.changed = {}
+        for name in self.NAMES:
+            rows = len(getattr(scene, name))
+            dirty = scene.gpu_dirty.pop(name, None)
+            if self._rows.get(name) != rows:
+                dirty = (0, rows)
+            if dirty is not None and rows:
+                lo, hi = dirty[0], min(dirty[1], rows)
+                if hi > lo:
+                    self.changed[name] = (lo, hi)
+            self._rows[name] = rows
+
+    def cleanup(self):
+        self._rows = {}
+        self.changed = {}
+        self.scene = None
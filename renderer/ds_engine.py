@@ -3,6 +3,21 @@ import OpenGL.GL as gl
 from PIL import Image
 import pyrr
 
+from Stores.sceneStore import NodeKind
+from renderer import gl_resources
+from renderer.clustered_lights import CLUSTER_SHADER_FUNCTIONS, ClusteredLights, LightSet
+from renderer.debug_draw import DebugDraw
+from renderer.geometry import cube_vertices, cube_indices
+from renderer.materials import MATERIAL_SHADER_FUNCTIONS, MaterialTable
+from renderer.readback import SequenceRecorder
+from renderer.render_queue import RenderQueue
+from renderer.dirty_ranges import DirtyRanges
+from renderer.scene_pipeline import CameraInput, SceneSnapshot, ScenePipeline
+from renderer.shadows import SHADOW_SHADER_FUNCTIONS, ShadowMap
+from renderer.stream_buffer import StreamBuffer
+from renderer.texture_cache import TextureCache
+from renderer.viewport import Viewport
+
 
 class Shader:
     def __init__(self, vertex_path, fragment_path):
@@ -29,7 +44,7 @@ class Shader:
             raise RuntimeError(f"片段着色器编译错误:\n{error}")
 
         # 创建着色器程序
-        self.program = gl.glCreateProgram()
+        self.program = gl_resources.create("program", self, vertex_path)
         gl.glAttachShader(self.program, vertex_shader)
         gl.glAttachShader(self.program, fragment_shader)
         gl.glLinkProgram(self.program)
@@ -60,10 +75,18 @@ class Shader:
         loc = gl.glGetUniformLocation(self.program, name)
         gl.glUniform1i(loc, value)
 
+    def delete(self):
+        gl_resources.delete("program", self.program)
+        self.program = 0
+
 
 class Texture:
-    def __init__(self, path, texture_type=gl.GL_TEXTURE_2D):
-        self.texture_id = gl.glGenTextures(1)
+    def __init__(self, path, texture_type=gl.GL_TEXTURE_2D, cache=None):
+        if cache is not None and texture_type == gl.GL_TEXTURE_2D:
+            # 从纹理烘焙缓存加载, 不再解码和生成 mip
+            self.texture_id = cache.load(path)
+            return
+        self.texture_id = gl_resources.create("texture", self, path)
         gl.glBindTexture(texture_type, self.texture_id)
 
         # 设置纹理参数
@@ -88,6 +111,8 @@ class Texture:
             gl.glTexImage2D(texture_type, 0, format, image.width, image.height,
                             0, format, gl.GL_UNSIGNED_BYTE, img_data)
             gl.glGenerateMipmap(texture_type)
+            gl_resources.set_size("texture", self.texture_id,
+                                  gl_resources.texture_bytes(image.width, image.height, len(image.mode), mipmaps=True))
         except Exception as e:
             print(f"加载纹理失败: {path}, 错误: {e}")
             # 创建默认纹理
@@ -97,6 +122,7 @@ class Texture:
             gl.glTexImage2D(texture_type, 0, gl.GL_RGB, 64, 64,
                             0, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, default_data)
             gl.glGenerateMipmap(texture_type)
+            gl_resources.set_size("texture", self.texture_id, gl_resources.texture_bytes(64, 64, 3, mipmaps=True))
 
         gl.glBindTexture(texture_type, 0)
 
@@ -104,6 +130,10 @@ class Texture:
         gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
         gl.glBindTexture(texture_type, self.texture_id)
 
+    def delete(self):
+        gl_resources.delete("texture", self.texture_id)
+        self.texture_id = 0
+
 
 class Camera:
     def __init__(self, position=[0.0, 0.0, 3.0], up=[0.0, 1.0, 0.0], yaw=-90.0, pitch=0.0):
@@ -178,61 +208,18 @@ class Camera:
 
 class Model:
     def __init__(self):
-        self.vao = gl.glGenVertexArrays(1)
-        self.vbo = gl.glGenBuffers(1)
-        self.ebo = gl.glGenBuffers(1)
+        self.vao = gl_resources.create("vertex_array", self)
+        self.vbo = gl_resources.create("buffer", self, "vertices")
+        self.ebo = gl_resources.create("buffer", self, "indices")
         self.textures = []
         self.indices_count = 0
 
     def load_cube(self):
         # 立方体顶点数据 (位置, 法线, 纹理坐标)
-        vertices = np.array([
-            # 前面
-            -0.5, -0.5, 0.5, 0.0, 0.0, 1.0, 0.0, 0.0,
-            0.5, -0.5, 0.5, 0.0, 0.0, 1.0, 1.0, 0.0,
-            0.5, 0.5, 0.5, 0.0, 0.0, 1.0, 1.0, 1.0,
-            -0.5, 0.5, 0.5, 0.0, 0.0, 1.0, 0.0, 1.0,
-
-            # 后面
-            -0.5, -0.5, -0.5, 0.0, 0.0, -1.0, 1.0, 0.0,
-            0.5, -0.5, -0.5, 0.0, 0.0, -1.0, 0.0, 0.0,
-            0.5, 0.5, -0.5, 0.0, 0.0, -1.0, 0.0, 1.0,
-            -0.5, 0.5, -0.5, 0.0, 0.0, -1.0, 1.0, 1.0,
-
-            # 上面
-            -0.5, 0.5, 0.5, 0.0, 1.0, 0.0, 0.0, 0.0,
-            0.5, 0.5, 0.5, 0.0, 1.0, 0.0, 1.0, 0.0,
-            0.5, 0.5, -0.5, 0.0, 1.0, 0.0, 1.0, 1.0,
-            -0.5, 0.5, -0.5, 0.0, 1.0, 0.0, 0.0, 1.0,
-
-            # 下面
-            -0.5, -0.5, 0.5, 0.0, -1.0, 0.0, 0.0, 1.0,
-            0.5, -0.5, 0.5, 0.0, -1.0, 0.0, 1.0, 1.0,
-            0.5, -0.5, -0.5, 0.0, -1.0, 0.0, 1.0, 0.0,
-            -0.5, -0.5, -0.5, 0.0, -1.0, 0.0, 0.0, 0.0,
-
-            # 右面
-            0.5, -0.5, 0.5, 1.0, 0.0, 0.0, 0.0, 0.0,
-            0.5, -0.5, -0.5, 1.0, 0.0, 0.0, 1.0, 0.0,
-            0.5, 0.5, -0.5, 1.0, 0.0, 0.0, 1.0, 1.0,
-            0.5, 0.5, 0.5, 1.0, 0.0, 0.0, 0.0, 1.0,
-
-            # 左面
-            -0.5, -0.5, 0.5, -1.0, 0.0, 0.0, 1.0, 0.0,
-            -0.5, -0.5, -0.5, -1.0, 0.0, 0.0, 0.0, 0.0,
-            -0.5, 0.5, -0.5, -1.0, 0.0, 0.0, 0.0, 1.0,
-            -0.5, 0.5, 0.5, -1.0, 0.0, 0.0, 1.0, 1.0,
-        ], dtype=np.float32)
+        vertices = cube_vertices()
 
         # 立方体索引数据
-        indices = np.array([
-            0, 1, 2, 2, 3, 0,  # 前面
-            4, 5, 6, 6, 7, 4,  # 后面
-            8, 9, 10, 10, 11, 8,  # 上面
-            12, 13, 14, 14, 15, 12,  # 下面
-            16, 17, 18, 18, 19, 16,  # 右面
-            20, 21, 22, 22, 23, 20  # 左面
-        ], dtype=np.uint32)
+        indices = cube_indices()
 
         self.indices_count = len(indices)
 
@@ -242,10 +229,12 @@ class Model:
         # 顶点数据
         gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
         gl.glBufferData(gl.GL_ARRAY_BUFFER, vertices.nbytes, vertices, gl.GL_STATIC_DRAW)
+        gl_resources.set_size("buffer", self.vbo, vertices.nbytes)
 
         # 索引数据
         gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
         gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW)
+        gl_resources.set_size("buffer", self.ebo, indices.nbytes)
 
         # 位置属性
         gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 8 * 4, gl.ctypes.c_void_p(0))
@@ -263,6 +252,13 @@ class Model:
         gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
         gl.glBindVertexArray(0)
 
+    def cleanup(self):
+        gl_resources.delete("vertex_array", self.vao)
+        gl_resources.delete("buffer", self.vbo, self.ebo)
+        for texture in self.textures:
+            texture.delete()
+        self.textures = []
+
     def draw(self, shader):
         # 绑定纹理
         for i, texture in enumerate(self.textures):
@@ -275,30 +271,115 @@ class Model:
         gl.glBindVertexArray(0)
 
 
+# 渲染队列中的着色器编号
+SHADER_SCENE = 0
+SHADER_LIGHT = 1
+# 光源立方体的索引数
+CUBE_INDEX_COUNT = len(cube_indices())
+
+# 着色模式, 下标即片段着色器中 shadingMode 的取值:
+# 完整光照 / 只用材质颜色和朝向相机的光 / 不计算光照
+SHADING_MODES = ("Lit", "Solid", "Unlit")
+SHADING_LIT, SHADING_SOLID, SHADING_UNLIT = range(len(SHADING_MODES))
+
+
 class RenderEngine:
     def __init__(self, width=800, height=600):
-        self.width = width
-        self.height = height
-        self.camera_pos = np.array([0.0, 0.0, 3.0], dtype=np.float32)
-        self.camera_front = np.array([0.0, 0.0, -1.0], dtype=np.float32)
-        self.camera_up = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+        # 主视口; 引擎的相机数组就是主视口的相机数组, 界面和编辑器状态原地修改它们
+        self.main_viewport = Viewport("Perspective", "perspective", width, height)
+        self.viewports = [self.main_viewport]
+        self.camera_pos = self.main_viewport.camera_pos
+        self.camera_front = self.main_viewport.camera_front
+        self.camera_up = self.main_viewport.camera_up
         self.light_pos = np.array([1.2, 1.0, 2.0], dtype=np.float32)
         self.light_color = np.array([1.0, 1.0, 1.0], dtype=np.float32)
         self.background_color = (0.1, 0.1, 0.1, 1.0)
         self.light_intensity = 1.0
         self.rotation_speed = 0.5
         self.wireframe_mode = False
-        self.framebuffer = None
-        self.texture_id = None
-        self.renderbuffer = None
+        self.show_normals = False
+        self.show_grid = True
+        # 按驻留级别与所需级别给物体着色, 检查纹理流式加载
+        self.show_mip_overlay = False
+        # 主光源之外的点光源和聚光灯: 场景灯光节点加上 lights 中由代码添加的灯光, 按簇分配
+        self.lights = LightSet()
+        self.clustered_lights = ClusteredLights()
+        # 主光源的阴影: 静态部分缓存, 只有移动中的物体每帧重画
+        self.shadows = ShadowMap()
+        self._shadow_key = None
+        # 渲染队列: 按 通道/透明/着色器/材质/网格/深度 排序后提交
+        self.queue = RenderQueue()
+        self._view_state = None
+        self._model_location = -1
+        self._material_location = -1
+        # 材质表: 参数在一个纹理缓冲中, 纹理按尺寸放进纹理数组, 切换材质只改变下标
+        self.material_table = MaterialTable()
+        # 纹理烘焙缓存: 完整 mip 链 (可选压缩) 存在磁盘上, 之后的加载跳过解码和生成 mip
+        self.texture_cache = TextureCache()
+        # 每帧动态数据 (调试顶点、分簇光照) 的环形上传缓冲
+        self.stream_buffer = StreamBuffer()
+        # 调试绘制: 网格、法线、包围盒等线段, 每帧合并为一次绘制
+        self.debug = DebugDraw()
+        self.shading_mode = SHADING_LIT
+        self.backface_culling = True
+        self.dirty_ranges = DirtyRanges()
+        # 视口重绘判断: 上一帧的渲染设置, 以及上次同步时各节点的位置
+        self._settings = None
+        self._scene = None
+        self._positions = np.zeros((0, 3), dtype=np.float32)
+        # 场景更新与裁剪在工作线程中进行, 主线程只提交上一帧生成的渲染包
+        self.pipeline = ScenePipeline()
+        self.packet = None
+        self._snapshot = None
+        # 截图和图像序列导出, 通过像素缓冲异步读回
+        self.recorder = SequenceRecorder()
         self.vao = 0
         self.vbo = 0
         self.ebo = 0
+        # 场景网格的顶点数组: {网格 id: (顶点数组, vao, vbo, ebo, 索引数)}, 网格数据替换后重新上传
+        self.meshes = {}
+        self._index_count = 0
         self.shader = None
         self.light_shader = None
-        self.cube_texture = None
         self.initialized = False
 
+    # 以下属性转发到主视口, 保持单视口时的用法不变
+    @property
+    def width(self):
+        return self.main_viewport.width
+
+    @property
+    def height(self):
+        return self.main_viewport.height
+
+    @property
+    def framebuffer(self):
+        return self.main_viewport.framebuffer
+
+    @property
+    def texture_id(self):
+        return self.main_viewport.texture_id
+
+    @property
+    def dynamic_resolution(self):
+        return self.main_viewport.dynamic_resolution
+
+    @property
+    def render_scale(self):
+        return self.main_viewport.render_scale
+
+    @property
+    def gpu_time_ms(self):
+        return self.main_viewport.gpu_time_ms
+
+    @property
+    def interacting(self):
+        return self.main_viewport.interacting
+
+    @interacting.setter
+    def interacting(self, value):
+        self.main_viewport.interacting = value
+
     def initialize(self):
         """初始化渲染引擎和OpenGL资源"""
         if self.initialized:
@@ -312,33 +393,9 @@ class RenderEngine:
         if not gl.glGenFramebuffers:
             raise RuntimeError("Framebuffers not supported! Requires OpenGL 3.0+")
 
-        # 创建帧缓冲对象
-        self.framebuffer = gl.glGenFramebuffers(1)
-        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
-
-        # 创建纹理附件
-        self.texture_id = gl.glGenTextures(1)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
-        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGB, self.width, self.height,
-                        0, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, None)
-        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
-        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
-        gl.glFramebufferTexture2D(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0,
-                                  gl.GL_TEXTURE_2D, self.texture_id, 0)
-
-        # 创建渲染缓冲对象（深度和模板附件）
-        self.renderbuffer = gl.glGenRenderbuffers(1)
-        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, self.renderbuffer)
-        gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_DEPTH24_STENCIL8,
-                                 self.width, self.height)
-        gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, gl.GL_DEPTH_STENCIL_ATTACHMENT,
-                                     gl.GL_RENDERBUFFER, self.renderbuffer)
-
-        # 检查帧缓冲是否完整
-        if gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER) != gl.GL_FRAMEBUFFER_COMPLETE:
-            raise RuntimeError("帧缓冲不完整")
-
-        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        # 创建各视口的帧缓冲对象
+        for viewport in self.viewports:
+            viewport.create()
 
         # 初始化OpenGL状态
         gl.glEnable(gl.GL_DEPTH_TEST)
@@ -346,44 +403,71 @@ class RenderEngine:
         gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
 
         # 加载着色器
-        self.shader = self.create_shader(self.get_vertex_shader(), self.get_fragment_shader())
-        self.light_shader = self.create_shader(self.get_light_vertex_shader(), self.get_light_fragment_shader())
+        self.shader = self.create_shader(self.get_vertex_shader(), self.get_fragment_shader(), label="scene")
+        self.light_shader = self.create_shader(self.get_light_vertex_shader(), self.get_light_fragment_shader(),
+                                               label="light")
 
-        # 加载纹理
-        self.cube_texture = self.load_texture("container2.png")
+        # 加载纹理, 没有指定纹理的材质使用它
+        self.material_table.create(self.texture_cache, "container2.png")
 
         # 创建立方体几何
         self.create_cube_geometry()
+        self.stream_buffer.create()
+        self.debug.create(self.create_shader, self.stream_buffer)
+        self.clustered_lights.create(self.stream_buffer)
+        self.shadows.create(self.create_shader)
 
         self.initialized = True
 
-    def resize(self, width, height):
-        """调整渲染尺寸"""
-        if width <= 0 or height <= 0:
-            return
-
-        self.width = width
-        self.height = height
-
-        # 重新创建纹理附件
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
-        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGB, width, height,
-                        0, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, None)
-
-        # 重新创建渲染缓冲
-        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, self.renderbuffer)
-        gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_DEPTH24_STENCIL8, width, height)
+    def add_viewport(self, name, projection="perspective"):
+        """添加一个视口, 与主视口共享着色器、几何和纹理"""
+        viewport = Viewport(name, projection, self.width, self.height)
+        if self.initialized:
+            viewport.create()
+        self.viewports.append(viewport)
+        return viewport
+
+    def remove_viewport(self, viewport):
+        if viewport is self.main_viewport:
+            raise ValueError("不能删除主视口")
+        self.viewports.remove(viewport)
+        if self.material_table.streamer is not None:
+            self.material_table.streamer.reset(viewport.name)
+        viewport.cleanup()
 
-        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+    def resize(self, width, height):
+        """调整主视口的渲染尺寸"""
+        self.main_viewport.resize(width, height)
 
     def render(self, time):
-        """渲染场景到帧缓冲"""
-        if not self.initialized:
-            return
-
-        # 绑定到帧缓冲
-        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
-        gl.glViewport(0, 0, self.width, self.height)
+        """渲染主视口到帧缓冲"""
+        self.render_viewport(self.main_viewport, time)
+
+    def render_all(self, time):
+        """渲染所有可见且需要更新的视口, 返回实际渲染的视口数"""
+        return sum(self.render_viewport(viewport, time) for viewport in self.viewports)
+
+    def render_viewport(self, viewport, time):
+        """渲染一个视口; 不可见或内容没有变化时复用上一次的结果, 返回是否渲染"""
+        if not self.initialized or not viewport.visible:
+            return False
+
+        self.__check_settings()
+        # 根据上一次测得的 GPU 耗时决定本帧的渲染比例
+        viewport.update_render_scale()
+        # 渲染包(视口对应的绘制列表)由工作线程生成, 新的渲染包到达时也需要重绘
+        view_packet = self.packet.views.get(viewport.name) if self.packet is not None else None
+        # 立方体随时间旋转时每帧都有变化
+        if not viewport.dirty and not self.rotation_speed and view_packet is viewport.packet and self.debug.empty:
+            return False
+
+        rotation = self.__rotation(time)
+        self.__update_shadows(time, rotation)
+
+        # 绑定到帧缓冲, 只渲染到左下角 render_width x render_height 的区域
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, viewport.framebuffer)
+        gl.glViewport(0, 0, viewport.render_width, viewport.render_height)
+        viewport.gpu_timer.begin(viewport.render_scale)
 
         # 清除缓冲
         gl.glClearColor(*self.background_color)
@@ -392,189 +476,306 @@ class RenderEngine:
         # 设置线框模式
         gl.glPolygonMode(gl.GL_FRONT_AND_BACK,
                          gl.GL_LINE if self.wireframe_mode else gl.GL_FILL)
-
-        # 创建视图和投影矩阵
-        view = pyrr.matrix44.create_look_at(
-            self.camera_pos,
-            self.camera_pos + self.camera_front,
-            self.camera_up
-        )
-
-        projection = pyrr.matrix44.create_perspective_projection(
-            45.0, self.width / self.height, 0.1, 100.0
+        # 背面剔除, 立方体的三角形都是逆时针朝外
+        if self.backface_culling:
+            gl.glEnable(gl.GL_CULL_FACE)
+            gl.glCullFace(gl.GL_BACK)
+
+        # 创建视图和投影矩阵, 与渲染包裁剪时使用的相机保持一致
+        if view_packet is not None:
+            view, projection = view_packet.view, view_packet.projection
+        else:
+            view, projection = viewport.view_matrix(), viewport.projection_matrix()
+
+        # 其余灯光按视锥分簇, 每个片段只计算所在簇的灯光
+        scene_lights = self.packet.lights if self.packet is not None else self.lights.lights[:0]
+        self.clustered_lights.update(
+            np.concatenate([scene_lights, self.lights.lights]), view, projection, viewport.near, viewport.far
         )
 
-        # 渲染主立方体
-        gl.glUseProgram(self.shader)
-
-        # 设置矩阵
-        gl.glUniformMatrix4fv(
-            gl.glGetUniformLocation(self.shader, "view"),
-            1, gl.GL_FALSE, view
-        )
-        gl.glUniformMatrix4fv(
-            gl.glGetUniformLocation(self.shader, "projection"),
-            1, gl.GL_FALSE, projection
-        )
+        # 所有绘制经过渲染队列, 按排序键统一提交; bind_shader 等回调使用本视口的参数
+        self._view_state = (viewport, view, projection)
+        # 视图空间深度: 行向量约定下 z = p · view[:3, 2] + view[3, 2]
+        view_z = np.asarray(view[:3, 2], dtype=np.float32)
+
+        # 渲染包中可见的网格节点, 世界矩阵由工作线程算好, 这里只叠加旋转动画
+        models = None
+        self.material_table.streamer.reset(viewport.name)
+        if view_packet is not None and len(view_packet.models):
+            models = view_packet.models if rotation is None else rotation @ view_packet.models
+            depths = -(models[:, 3, :3] @ view_z + view[3, 2])
+            # 按去重后的材质槽位排序, 相同的材质不产生切换
+            slots = self.material_table.slots(view_packet.material_ids)
+            transparent = self.material_table.opacity(slots) < 1.0
+            self.queue.submit(SHADER_SCENE, slots, view_packet.mesh_ids, depths, models, transparent)
+            # 纹理流式加载: 裁剪空间 w 决定物体在屏幕上的大小
+            view_projection = view @ projection
+            clip_w = models[:, 3, :3] @ view_projection[:3, 3] + view_projection[3, 3]
+            self.material_table.request_levels(
+                viewport.name, self._scene, view_packet.material_ids, view_packet.mesh_ids, models,
+                clip_w, projection[1, 1] * viewport.render_height * 0.5,
+            )
 
-        # 模型矩阵（旋转）
-        model = pyrr.matrix44.create_from_translation(np.array([0.0, 0.0, 0.0]))
+        # 光源立方体
+        model = pyrr.matrix44.create_from_translation(self.light_pos)
         model = pyrr.matrix44.multiply(
             model,
-            pyrr.matrix44.create_from_axis_rotation(
-                np.array([0.5, 1.0, 0.0]),
-                time * self.rotation_speed
-            )
-        )
-        gl.glUniformMatrix4fv(
-            gl.glGetUniformLocation(self.shader, "model"),
-            1, gl.GL_FALSE, model
+            pyrr.matrix44.create_from_scale(np.array([0.2, 0.2, 0.2]))
         )
+        depth = -(self.light_pos @ view_z + view[3, 2])
+        self.queue.submit(SHADER_LIGHT, [-1], [-1], [depth], [model])
 
-        # 设置光照属性
-        gl.glUniform3f(
-            gl.glGetUniformLocation(self.shader, "light.position"),
-            self.light_pos[0], self.light_pos[1], self.light_pos[2]
-        )
-        gl.glUniform3f(
-            gl.glGetUniformLocation(self.shader, "light.ambient"),
-            0.2 * self.light_intensity,
-            0.2 * self.light_intensity,
-            0.2 * self.light_intensity
-        )
-        gl.glUniform3f(
-            gl.glGetUniformLocation(self.shader, "light.diffuse"),
-            0.5 * self.light_intensity,
-            0.5 * self.light_intensity,
-            0.5 * self.light_intensity
-        )
-        gl.glUniform3f(
-            gl.glGetUniformLocation(self.shader, "light.specular"),
-            1.0 * self.light_intensity,
-            1.0 * self.light_intensity,
-            1.0 * self.light_intensity
-        )
+        self.queue.execute(self, viewport.far)
+        gl.glDepthMask(gl.GL_TRUE)
+        gl.glDisable(gl.GL_CULL_FACE)
 
-        # 设置材质属性
-        gl.glUniform1f(
-            gl.glGetUniformLocation(self.shader, "material.shininess"),
-            32.0
-        )
+        # 解绑
+        gl.glBindVertexArray(0)
+        self.__draw_debug(view_packet, models, view, projection)
+        viewport.gpu_timer.end()
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        viewport.dirty = False
+        viewport.packet = view_packet
+        return True
 
-        # 绑定纹理
-        gl.glActiveTexture(gl.GL_TEXTURE0)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.cube_texture)
-        gl.glUniform1i(gl.glGetUniformLocation(self.shader, "material.texture_diffuse1"), 0)
+    # 渲染队列的回调
 
-        # 绘制立方体
-        gl.glBindVertexArray(self.vao)
-        gl.glDrawElements(gl.GL_TRIANGLES, 36, gl.GL_UNSIGNED_INT, None)
+    def bind_state(self, pass_id, transparent):
+        # 透明物体参与深度测试但不写深度, 按从后往前的顺序混合
+        gl.glDepthMask(gl.GL_FALSE if transparent else gl.GL_TRUE)
 
-        # 渲染光源立方体
-        gl.glUseProgram(self.light_shader)
+    def bind_shader(self, shader):
+        viewport, view, projection = self._view_state
+        if shader == SHADER_SCENE:
+            gl.glUseProgram(self.shader)
 
-        # 设置矩阵
-        gl.glUniformMatrix4fv(
-            gl.glGetUniformLocation(self.light_shader, "view"),
-            1, gl.GL_FALSE, view
-        )
-        gl.glUniformMatrix4fv(
-            gl.glGetUniformLocation(self.light_shader, "projection"),
-            1, gl.GL_FALSE, projection
-        )
+            # 设置矩阵
+            gl.glUniformMatrix4fv(
+                gl.glGetUniformLocation(self.shader, "view"),
+                1, gl.GL_FALSE, view
+            )
+            gl.glUniformMatrix4fv(
+                gl.glGetUniformLocation(self.shader, "projection"),
+                1, gl.GL_FALSE, projection
+            )
 
-        # 模型矩阵（缩放）
-        model = pyrr.matrix44.create_from_translation(self.light_pos)
-        model = pyrr.matrix44.multiply(
-            model,
-            pyrr.matrix44.create_from_scale(np.array([0.2, 0.2, 0.2]))
-        )
-        gl.glUniformMatrix4fv(
-            gl.glGetUniformLocation(self.light_shader, "model"),
-            1, gl.GL_FALSE, model
-        )
+            gl.glUniform3f(gl.glGetUniformLocation(self.shader, "viewPos"), *viewport.camera_pos)
+            gl.glUniform1i(gl.glGetUniformLocation(self.shader, "shadingMode"), self.shading_mode)
 
-        # 设置光源颜色
-        gl.glUniform3f(
-            gl.glGetUniformLocation(self.light_shader, "lightColor"),
-            self.light_color[0] * self.light_intensity,
-            self.light_color[1] * self.light_intensity,
-            self.light_color[2] * self.light_intensity
+            self.clustered_lights.bind(self.shader, viewport.near, viewport.far,
+                                       viewport.render_width, viewport.render_height)
+            self.shadows.bind(self.shader)
+
+            # 设置光照属性
+            gl.glUniform3f(
+                gl.glGetUniformLocation(self.shader, "light.position"),
+                self.light_pos[0], self.light_pos[1], self.light_pos[2]
+            )
+            gl.glUniform3f(
+                gl.glGetUniformLocation(self.shader, "light.ambient"),
+                0.2 * self.light_intensity,
+                0.2 * self.light_intensity,
+                0.2 * self.light_intensity
+            )
+            gl.glUniform3f(
+                gl.glGetUniformLocation(self.shader, "light.diffuse"),
+                0.5 * self.light_intensity,
+                0.5 * self.light_intensity,
+                0.5 * self.light_intensity
+            )
+            gl.glUniform3f(
+                gl.glGetUniformLocation(self.shader, "light.specular"),
+                1.0 * self.light_intensity,
+                1.0 * self.light_intensity,
+                1.0 * self.light_intensity
+            )
+
+            # 材质参数和纹理数组, 之后切换材质只设置 materialIndex
+            self.material_table.bind(self.shader, self.show_mip_overlay)
+            self._model_location = gl.glGetUniformLocation(self.shader, "model")
+            self._material_location = gl.glGetUniformLocation(self.shader, "materialIndex")
+        else:
+            gl.glUseProgram(self.light_shader)
+
+            # 设置矩阵
+            gl.glUniformMatrix4fv(
+                gl.glGetUniformLocation(self.light_shader, "view"),
+                1, gl.GL_FALSE, view
+            )
+            gl.glUniformMatrix4fv(
+                gl.glGetUniformLocation(self.light_shader, "projection"),
+                1, gl.GL_FALSE, projection
+            )
+
+            # 设置光源颜色
+            gl.glUniform3f(
+                gl.glGetUniformLocation(self.light_shader, "lightColor"),
+                self.light_color[0] * self.light_intensity,
+                self.light_color[1] * self.light_intensity,
+                self.light_color[2] * self.light_intensity
+            )
+            self._model_location = gl.glGetUniformLocation(self.light_shader, "model")
+
+    def bind_material(self, shader, material):
+        if shader != SHADER_SCENE:
+            return
+        # material 是材质表中的槽位
+        gl.glUniform1i(self._material_location, material)
+
+    def bind_mesh(self, mesh):
+        # mesh 为 -1 时是光源立方体
+        vao, self._index_count = self.__mesh_vao(mesh)
+        gl.glBindVertexArray(vao)
+
+    def draw(self, shader, model):
+        gl.glUniformMatrix4fv(self._model_location, 1, gl.GL_FALSE, model)
+        gl.glDrawElements(gl.GL_TRIANGLES, self._index_count, gl.GL_UNSIGNED_INT, None)
+
+    def draw_models(self, shader, models, mesh_ids):
+        """用当前着色器逐个绘制模型矩阵 (K, 4, 4), mesh_ids 为对应的网格"""
+        model_location = gl.glGetUniformLocation(shader, "model")
+        for mesh_id in np.unique(mesh_ids):
+            vao, count = self.__mesh_vao(int(mesh_id))
+            gl.glBindVertexArray(vao)
+            for model in models[mesh_ids == mesh_id]:
+                gl.glUniformMatrix4fv(model_location, 1, gl.GL_FALSE, model)
+                gl.glDrawElements(gl.GL_TRIANGLES, count, gl.GL_UNSIGNED_INT, None)
+
+    def __mesh_vao(self, mesh_id):
+        """网格的顶点数组和索引数, 第一次使用或网格数据替换后上传"""
+        if mesh_id < 0 or self._scene is None:
+            return self.vao, CUBE_INDEX_COUNT
+        mesh = self._scene.mesh(mesh_id)
+        cached = self.meshes.get(mesh_id)
+        if cached is not None and cached[0] is mesh.vertices:
+            return cached[1], cached[4]
+        if cached is not None:
+            self.__release_mesh(mesh_id)
+        vertices = np.ascontiguousarray(mesh.vertices, dtype=np.float32)
+        indices = np.ascontiguousarray(mesh.indices, dtype=np.uint32)
+        vao, vbo, ebo = self.upload_geometry(vertices, indices, f"mesh {mesh_id}")
+        self.meshes[mesh_id] = (mesh.vertices, vao, vbo, ebo, indices.size)
+        return vao, indices.size
+
+    def __release_mesh(self, mesh_id):
+        _, vao, vbo, ebo, _ = self.meshes.pop(mesh_id)
+        gl_resources.release("vertex_array", vao)
+        gl_resources.release("buffer", vbo, ebo)
+
+    def __rotation(self, time):
+        """立方体的旋转动画, 没有动画时返回 None"""
+        if not self.rotation_speed:
+            return None
+        return pyrr.matrix44.create_from_axis_rotation(
+            np.array([0.5, 1.0, 0.0]),
+            time * self.rotation_speed
+        ).astype(np.float32)
+
+    def __update_shadows(self, time, rotation):
+        """每帧只更新一次阴影贴图, 所有视口共用"""
+        if self.packet is None:
+            return
+        key = (time, self.packet.frame, *self.light_pos.tolist())
+        if key == self._shadow_key:
+            return
+        self._shadow_key = key
+        self.shadows.update(self.packet, self.light_pos, rotation, self.draw_models)
+
+    def __check_settings(self):
+        """渲染设置变化时所有视口都需要重绘"""
+        settings = (
+            *self.light_pos.tolist(), *self.light_color.tolist(), *self.background_color,
+            self.light_intensity, self.rotation_speed, self.wireframe_mode,
+            self.show_normals, self.show_grid, self.show_mip_overlay, self.shading_mode, self.backface_culling,
+            self.lights.lights.tobytes(),
         )
+        if settings != self._settings:
+            self._settings = settings
+            for viewport in self.viewports:
+                viewport.dirty = True
+
+    def __draw_debug(self, view_packet, models, view, projection):
+        """绘制调试图元; 网格和法线只添加到本视口, 绘制后撤销"""
+        mark = self.debug.mark()
+        if self.show_grid:
+            self.debug.grid()
+        if self.show_normals and models is not None:
+            # 每种网格的局部法线线段只上传一次, 所有可见实例由着色器变换
+            mesh_ids = view_packet.mesh_ids
+            for mesh_id in np.unique(mesh_ids):
+                mesh = self._scene.mesh(int(mesh_id))
+                if mesh is not None:
+                    self.debug.normals(int(mesh_id), mesh, models[mesh_ids == mesh_id])
+        self.debug.draw(view, projection)
+        self.debug.rewind(mark)
+
+    def __invalidate_scene(self, scene):
+        """根据本次上传的区间标记需要重绘的视口: 节点修改前或修改后的位置落在视锥内"""
+        changed = self.dirty_ranges.changed
+        if scene is not self._scene or "materials" in changed:
+            if scene is not self._scene:
+                self.shadows.reset()
+                for mesh_id in list(self.meshes):
+                    self.__release_mesh(mesh_id)
+            self._scene = scene
+            self._positions = scene.transforms[:, :3].copy()
+            for viewport in self.viewports:
+                viewport.dirty = True
+            return
+        if "transforms" not in changed:
+            return
 
-        # 绘制光源立方体
-        gl.glBindVertexArray(self.vao)
-        gl.glDrawElements(gl.GL_TRIANGLES, 36, gl.GL_UNSIGNED_INT, None)
+        lo, hi = changed["transforms"]
+        if np.any(scene.kinds[lo:hi] == NodeKind.LIGHT):
+            # 灯光可以照亮视锥内的物体, 即使它本身不在视锥内
+            for viewport in self.viewports:
+                viewport.dirty = True
+            return
+        if len(self._positions) < scene.node_count:
+            grown = np.zeros((scene.node_count, 3), dtype=np.float32)
+            grown[:len(self._positions)] = self._positions
+            self._positions = grown
+        new = scene.transforms[lo:hi, :3]
+        # 包围球按单位立方体和最大缩放估算
+        radii = np.abs(scene.transforms[lo:hi, 6:9]).max(axis=1) * 0.87
+        centers = np.concatenate([self._positions[lo:hi], new])
+        radii = np.concatenate([radii, radii])
+        self._positions[lo:hi] = new
+        for viewport in self.viewports:
+            if not viewport.dirty and viewport.intersects_spheres(centers, radii):
+                viewport.dirty = True
+
+    def get_texture_uv(self):
+        """主视口显示渲染结果时使用的 uv0, uv1"""
+        return self.main_viewport.get_texture_uv()
 
-        # 解绑
-        gl.glBindVertexArray(0)
-        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
 
     def create_cube_geometry(self):
         """创建立方体几何数据"""
         # 立方体顶点数据 (位置, 法线, 纹理坐标)
-        vertices = np.array([
-            # 前面
-            -0.5, -0.5, 0.5, 0.0, 0.0, 1.0, 0.0, 0.0,
-            0.5, -0.5, 0.5, 0.0, 0.0, 1.0, 1.0, 0.0,
-            0.5, 0.5, 0.5, 0.0, 0.0, 1.0, 1.0, 1.0,
-            -0.5, 0.5, 0.5, 0.0, 0.0, 1.0, 0.0, 1.0,
-
-            # 后面
-            -0.5, -0.5, -0.5, 0.0, 0.0, -1.0, 1.0, 0.0,
-            0.5, -0.5, -0.5, 0.0, 0.0, -1.0, 0.0, 0.0,
-            0.5, 0.5, -0.5, 0.0, 0.0, -1.0, 0.0, 1.0,
-            -0.5, 0.5, -0.5, 0.0, 0.0, -1.0, 1.0, 1.0,
-
-            # 上面
-            -0.5, 0.5, 0.5, 0.0, 1.0, 0.0, 0.0, 0.0,
-            0.5, 0.5, 0.5, 0.0, 1.0, 0.0, 1.0, 0.0,
-            0.5, 0.5, -0.5, 0.0, 1.0, 0.0, 1.0, 1.0,
-            -0.5, 0.5, -0.5, 0.0, 1.0, 0.0, 0.0, 1.0,
-
-            # 下面
-            -0.5, -0.5, 0.5, 0.0, -1.0, 0.0, 0.0, 1.0,
-            0.5, -0.5, 0.5, 0.0, -1.0, 0.0, 1.0, 1.0,
-            0.5, -0.5, -0.5, 0.0, -1.0, 0.0, 1.0, 0.0,
-            -0.5, -0.5, -0.5, 0.0, -1.0, 0.0, 0.0, 0.0,
-
-            # 右面
-            0.5, -0.5, 0.5, 1.0, 0.0, 0.0, 0.0, 0.0,
-            0.5, -0.5, -0.5, 1.0, 0.0, 0.0, 1.0, 0.0,
-            0.5, 0.5, -0.5, 1.0, 0.0, 0.0, 1.0, 1.0,
-            0.5, 0.5, 0.5, 1.0, 0.0, 0.0, 0.0, 1.0,
-
-            # 左面
-            -0.5, -0.5, 0.5, -1.0, 0.0, 0.0, 1.0, 0.0,
-            -0.5, -0.5, -0.5, -1.0, 0.0, 0.0, 0.0, 0.0,
-            -0.5, 0.5, -0.5, -1.0, 0.0, 0.0, 0.0, 1.0,
-            -0.5, 0.5, 0.5, -1.0, 0.0, 0.0, 1.0, 1.0,
-        ], dtype=np.float32)
+        vertices = cube_vertices()
 
         # 立方体索引数据
-        indices = np.array([
-            0, 1, 2, 2, 3, 0,  # 前面
-            4, 5, 6, 6, 7, 4,  # 后面
-            8, 9, 10, 10, 11, 8,  # 上面
-            12, 13, 14, 14, 15, 12,  # 下面
-            16, 17, 18, 18, 19, 16,  # 右面
-            20, 21, 22, 22, 23, 20  # 左面
-        ], dtype=np.uint32)
+        indices = cube_indices()
+
+        self.vao, self.vbo, self.ebo = self.upload_geometry(vertices, indices, "cube")
 
+    def upload_geometry(self, vertices, indices, label):
+        """上传 (位置, 法线, 纹理坐标) 交错的顶点和索引, 返回 (vao, vbo, ebo)"""
         # 创建VAO, VBO, EBO
-        self.vao = gl.glGenVertexArrays(1)
-        self.vbo = gl.glGenBuffers(1)
-        self.ebo = gl.glGenBuffers(1)
+        vao = gl_resources.create("vertex_array", self, label)
+        vbo = gl_resources.create("buffer", self, f"{label} vertices", vertices.nbytes)
+        ebo = gl_resources.create("buffer", self, f"{label} indices", indices.nbytes)
 
         # 绑定VAO
-        gl.glBindVertexArray(self.vao)
+        gl.glBindVertexArray(vao)
 
         # 顶点数据
-        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo)
         gl.glBufferData(gl.GL_ARRAY_BUFFER, vertices.nbytes, vertices, gl.GL_STATIC_DRAW)
 
         # 索引数据
-        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, ebo)
         gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW)
 
         # 位置属性
@@ -592,9 +793,10 @@ class RenderEngine:
         # 解绑
         gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
         gl.glBindVertexArray(0)
+        return vao, vbo, ebo
 
-    def create_shader(self, vertex_source, fragment_source):
-        """创建着色器程序"""
+    def create_shader(self, vertex_source, fragment_source, owner=None, label=""):
+        """创建着色器程序, owner 和 label 用于 GL 资源登记"""
         # 编译顶点着色器
         vertex_shader = gl.glCreateShader(gl.GL_VERTEX_SHADER)
         gl.glShaderSource(vertex_shader, vertex_source)
@@ -612,7 +814,7 @@ class RenderEngine:
             raise RuntimeError(f"片段着色器编译错误:\n{error}")
 
         # 创建着色器程序
-        shader_program = gl.glCreateProgram()
+        shader_program = gl_resources.create("program", owner if owner is not None else self, label)
         gl.glAttachShader(shader_program, vertex_shader)
         gl.glAttachShader(shader_program, fragment_shader)
         gl.glLinkProgram(shader_program)
@@ -627,49 +829,42 @@ class RenderEngine:
         return shader_program
 
     def load_texture(self, filename):
-        """加载纹理"""
-        # 尝试加载纹理，失败则创建默认纹理
-        try:
-            # 这里简化了纹理加载，实际应用中可能需要完整路径
-            image = Image.open(filename)
-            image = image.transpose(Image.FLIP_TOP_BOTTOM)
-            img_data = np.array(image, dtype=np.uint8)
-
-            if image.mode == "RGB":
-                format = gl.GL_RGB
-            elif image.mode == "RGBA":
-                format = gl.GL_RGBA
-            else:
-                raise ValueError(f"不支持的图像格式: {image.mode}")
-        except:
-            # 创建默认棋盘格纹理
-            img_data = np.zeros((64, 64, 3), dtype=np.uint8)
-            for y in range(64):
-                for x in range(64):
-                    if (x // 8 + y // 8) % 2 == 0:
-                        img_data[y, x] = [255, 0, 255]  # 紫色
-                    else:
-                        img_data[y, x] = [0, 255, 255]  # 青色
-            format = gl.GL_RGB
-
-        # 创建纹理
-        texture_id = gl.glGenTextures(1)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, texture_id)
-
-        # 设置纹理参数
-        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_REPEAT)
-        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_REPEAT)
-        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR_MIPMAP_LINEAR)
-        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
-
-        # 上传纹理数据
-        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, format,
-                        img_data.shape[1], img_data.shape[0],
-                        0, format, gl.GL_UNSIGNED_BYTE, img_data)
-        gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
+        """加载纹理; 第一次加载时烘焙到缓存, 之后直接上传缓存的 mip 链"""
+        return self.texture_cache.load(filename)
 
-        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
-        return texture_id
+    def sync_scene(self, scene):
+        """把场景中修改过的变换和材质上传到 GPU"""
+        if not self.initialized:
+            return
+        # 新的一帧开始, 上一帧提交的调试图元失效; 回收几帧之前释放的 GL 对象
+        self.debug.clear()
+        gl_resources.POOL.next_frame()
+        self.stream_buffer.begin_frame()
+        new_scene = scene is not self._scene
+        self.dirty_ranges.sync(scene)
+        self.material_table.sync(scene, new_scene or "materials" in self.dirty_ranges.changed)
+        if self.material_table.streamer.update():
+            # 纹理级别变化后所有视口都需要重绘
+            for viewport in self.viewports:
+                viewport.dirty = True
+        self.__invalidate_scene(scene)
+        if new_scene or self.dirty_ranges.changed.get("transforms"):
+            version = self._snapshot.version + 1 if self._snapshot is not None else 0
+            self._snapshot = SceneSnapshot.capture(scene, version)
+        self.__submit_frame(new_scene)
+
+    def __submit_frame(self, new_scene):
+        """取走最近完成的渲染包用于本帧绘制, 同时把下一帧的输入交给工作线程"""
+        self.packet = self.pipeline.acquire()
+        cameras = [
+            CameraInput(viewport.name, viewport.view_matrix().astype(np.float32),
+                        viewport.projection_matrix().astype(np.float32), viewport.height)
+            for viewport in self.viewports if viewport.visible
+        ]
+        self.pipeline.submit(self._snapshot, cameras)
+        if self.packet is None or new_scene:
+            # 第一帧或换了场景时没有可用的渲染包, 同步生成一次
+            self.packet = self.pipeline.flush(self._snapshot.version)
 
     def get_texture_id(self):
         """获取渲染纹理ID"""
@@ -680,15 +875,25 @@ class RenderEngine:
         if not self.initialized:
             return
 
-        gl.glDeleteFramebuffers(1, [self.framebuffer])
-        gl.glDeleteTextures(1, [self.texture_id])
-        gl.glDeleteRenderbuffers(1, [self.renderbuffer])
-        gl.glDeleteVertexArrays(1, [self.vao])
-        gl.glDeleteBuffers(1, [self.vbo])
-        gl.glDeleteBuffers(1, [self.ebo])
-        gl.glDeleteProgram(self.shader)
-        gl.glDeleteProgram(self.light_shader)
-        gl.glDeleteTextures(1, [self.cube_texture])
+        # 先完成未写出的帧, 读回依赖视口的帧缓冲
+        self.recorder.cleanup()
+        for viewport in self.viewports:
+            viewport.cleanup()
+        gl_resources.delete("vertex_array", self.vao)
+        gl_resources.delete("buffer", self.vbo, self.ebo)
+        # 延迟释放, 由下面的 POOL.flush 删除
+        for mesh_id in list(self.meshes):
+            self.__release_mesh(mesh_id)
+        gl_resources.delete("program", self.shader, self.light_shader)
+        self.material_table.cleanup()
+        self.dirty_ranges.cleanup()
+        self.debug.cleanup()
+        self.clustered_lights.cleanup()
+        self.shadows.cleanup()
+        self.stream_buffer.cleanup()
+        self.pipeline.stop()
+        # 延迟释放的对象和对象池在上下文销毁之前全部删除
+        gl_resources.POOL.flush()
 
         self.initialized = False
 
@@ -703,16 +908,21 @@ class RenderEngine:
         out vec3 FragPos;
         out vec3 Normal;
         out vec2 TexCoords;
+        out float ViewDepth;
+        out vec4 LightSpacePos;
 
         uniform mat4 model;
         uniform mat4 view;
         uniform mat4 projection;
+        uniform mat4 lightSpace;
 
         void main()
         {
             FragPos = vec3(model * vec4(aPos, 1.0));
             Normal = mat3(transpose(inverse(model))) * aNormal;  
             TexCoords = aTexCoords;
+            ViewDepth = -(view * vec4(FragPos, 1.0)).z;
+            LightSpacePos = lightSpace * vec4(FragPos, 1.0);
 
             gl_Position = projection * view * vec4(FragPos, 1.0);
         }
@@ -724,11 +934,6 @@ class RenderEngine:
         #version 330 core
         out vec4 FragColor;
 
-        struct Material {
-            sampler2D texture_diffuse1;
-            float shininess;
-        }; 
-
         struct Light {
             vec3 position;
 
@@ -740,30 +945,56 @@ class RenderEngine:
         in vec3 FragPos;
         in vec3 Normal;
         in vec2 TexCoords;
+        in float ViewDepth;
+        in vec4 LightSpacePos;
 
         uniform vec3 viewPos;
-        uniform Material material;
         uniform Light light;
-
+        // 0 = Lit, 1 = Solid, 2 = Unlit, 与 SHADING_MODES 一致
+        uniform int shadingMode;
+        """ + MATERIAL_SHADER_FUNCTIONS + CLUSTER_SHADER_FUNCTIONS + SHADOW_SHADER_FUNCTIONS + """
         void main()
         {
+            MaterialParams m = fetchMaterial();
+            vec3 albedo = sampleMaterial(m, TexCoords).rgb * m.color;
+            // 粗糙度换算为高光指数; 金属没有漫反射, 高光带材质颜色
+            float shininess = exp2(10.0 * (1.0 - m.roughness) + 1.0);
+            vec3 specularColor = mix(vec3(1.0), albedo, m.metallic);
+            vec3 diffuseColor = albedo * (1.0 - m.metallic);
+
+            if (shadingMode == 2) {
+                FragColor = vec4(albedo, m.opacity);
+                return;
+            }
+            if (shadingMode == 1) {
+                // 只用材质颜色, 光从相机方向照射, 便于查看形状
+                float facing = abs(dot(normalize(Normal), normalize(viewPos - FragPos)));
+                FragColor = vec4(m.color * (0.25 + 0.75 * facing), m.opacity);
+                return;
+            }
+
             // 环境光照
-            vec3 ambient = light.ambient * texture(material.texture_diffuse1, TexCoords).rgb;
+            vec3 ambient = light.ambient * albedo;
 
             // 漫反射 
             vec3 norm = normalize(Normal);
             vec3 lightDir = normalize(light.position - FragPos);
             float diff = max(dot(norm, lightDir), 0.0);
-            vec3 diffuse = light.diffuse * diff * texture(material.texture_diffuse1, TexCoords).rgb;
+            vec3 diffuse = light.diffuse * diff * diffuseColor;
 
             // 镜面反射
             vec3 viewDir = normalize(viewPos - FragPos);
             vec3 reflectDir = reflect(-lightDir, norm);  
-            float spec = pow(max(dot(viewDir, reflectDir), 0.0), material.shininess);
-            vec3 specular = light.specular * spec * vec3(1.0);  
-
-            vec3 result = ambient + diffuse + specular;
-            FragColor = vec4(result, 1.0);
+            float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
+            vec3 specular = light.specular * spec * specularColor;
+
+            // 只有主光源投射阴影
+            float shadow = shadowFactor(LightSpacePos);
+            vec3 result = ambient + shadow * (diffuse + specular);
+            result += clusteredLighting(FragPos, norm, viewDir, ViewDepth, diffuseColor, shininess);
+            if (mipOverlay)
+                result = mipOverlayColor(m, TexCoords, result);
+            FragColor = vec4(result, m.opacity);
         }
         """
 
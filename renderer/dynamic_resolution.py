@@ -0,0 +1,106 @@
+import math
+
+import OpenGL.GL as gl
+
+
+class GpuTimer:
+    """GL_TIME_ELAPSED 查询环: 几帧之后才读取结果, 不会让 CPU 等待 GPU"""
+
+    def __init__(self, size=4):
+        self.size = size
+        self.queries = [int(q) for q in gl.glGenQueries(size)]
+        self.tags = [None] * size
+        self.pending = [False] * size
+        self.index = 0
+        self._active = False
+        # 最近一次可用的结果 (毫秒, begin 时传入的标记)
+        self.last_ms = None
+        self.last_tag = None
+
+    def begin(self, tag=None):
+        self.poll()
+        if self.pending[self.index]:
+            # 结果还没回来, 本帧不计时
+            self._active = False
+            return
+        gl.glBeginQuery(gl.GL_TIME_ELAPSED, self.queries[self.index])
+        self.tags[self.index] = tag
+        self._active = True
+
+    def end(self):
+        if not self._active:
+            return
+        gl.glEndQuery(gl.GL_TIME_ELAPSED)
+        self.pending[self.index] = True
+        self.index = (self.index + 1) % self.size
+        self._active = False
+
+    def poll(self):
+        """按提交顺序取回已完成的查询结果"""
+        for offset in range(self.size):
+            i = (self.index + offset) % self.size
+            if not self.pending[i]:
+                continue
+            if not gl.glGetQueryObjectiv(self.queries[i], gl.GL_QUERY_RESULT_AVAILABLE):
+                break
+            elapsed = gl.glGetQueryObjectui64v(self.queries[i], gl.GL_QUERY_RESULT)
+            self.last_ms = elapsed / 1e6
+            self.last_tag = self.tags[i]
+            self.pending[i] = False
+
+    def cleanup(self):
+        gl.glDeleteQueries(self.size, self.queries)
+        self.queries = []
+
+
+class DynamicResolution:
+    """根据 GPU 耗时调整内部渲染比例
+
+    交互时按 target_ms 积极降低分辨率; 停止交互后回到静止时的比例, 静止时的预算 rest_target_ms
+    更宽松, 只有超出预算时才低于全分辨率。静止时比例只在理想值偏离超过 hysteresis 时才改变,
+    避免测量的抖动让画面反复重绘。
+    """
+
+    def __init__(self, target_ms=12.0, rest_target_ms=33.0, min_scale=0.35, settle_frames=3, hysteresis=0.1):
+        self.enabled = True
+        self.target_ms = target_ms
+        self.rest_target_ms = rest_target_ms
+        self.min_scale = min_scale
+        self.settle_frames = settle_frames
+        self.hysteresis = hysteresis
+        self.scale = 1.0
+        self._idle_frames = 0
+        # 静止时使用的比例, 由静止时测得的耗时调整
+        self._rest_scale = 1.0
+
+    def update(self, gpu_ms, measured_scale, interacting):
+        """gpu_ms 是以 measured_scale 渲染的某一帧的耗时, 可能是几帧之前的"""
+        if not self.enabled:
+            self.scale = 1.0
+            return self.scale
+
+        if not interacting:
+            self._idle_frames += 1
+            if self._idle_frames < self.settle_frames:
+                return self.scale
+            if self._idle_frames == self.settle_frames:
+                # 停止交互几帧后以静止时的比例重新渲染一次
+                self.scale = self._rest_scale
+            elif gpu_ms and measured_scale:
+                ideal = measured_scale * math.sqrt(self.rest_target_ms / gpu_ms)
+                if abs(ideal - self.scale) > self.hysteresis * self.scale:
+                    self.scale = min(max(ideal, self.min_scale), 1.0)
+                self._rest_scale = self.scale
+            return self.scale
+
+        self._idle_frames = 0
+        if gpu_ms and measured_scale:
+            # 像素数与 scale 的平方成正比
+            ideal = measured_scale * math.sqrt(self.target_ms / gpu_ms)
+            if ideal < self.scale:
+                # 超出预算时立即降低, 低于预算时缓慢回升, 避免来回跳动
+                self.scale = ideal
+            else:
+                self.scale += (ideal - self.scale) * 0.1
+        self.scale = min(max(self.scale, self.min_scale), 1.0)
+        return self.scale
@@ -0,0 +1,75 @@
+import numpy as np
+
+
+def cube_vertices():
+    """返回立方体顶点数据 (位置, 法线, 纹理坐标)"""
+    return np.array([
+        # 前面
+        -0.5, -0.5, 0.5, 0.0, 0.0, 1.0, 0.0, 0.0,
+        0.5, -0.5, 0.5, 0.0, 0.0, 1.0, 1.0, 0.0,
+        0.5, 0.5, 0.5, 0.0, 0.0, 1.0, 1.0, 1.0,
+        -0.5, 0.5, 0.5, 0.0, 0.0, 1.0, 0.0, 1.0,
+
+        # 后面
+        -0.5, -0.5, -0.5, 0.0, 0.0, -1.0, 1.0, 0.0,
+        0.5, -0.5, -0.5, 0.0, 0.0, -1.0, 0.0, 0.0,
+        0.5, 0.5, -0.5, 0.0, 0.0, -1.0, 0.0, 1.0,
+        -0.5, 0.5, -0.5, 0.0, 0.0, -1.0, 1.0, 1.0,
+
+        # 上面
+        -0.5, 0.5, 0.5, 0.0, 1.0, 0.0, 0.0, 0.0,
+        0.5, 0.5, 0.5, 0.0, 1.0, 0.0, 1.0, 0.0,
+        0.5, 0.5, -0.5, 0.0, 1.0, 0.0, 1.0, 1.0,
+        -0.5, 0.5, -0.5, 0.0, 1.0, 0.0, 0.0, 1.0,
+
+        # 下面
+        -0.5, -0.5, 0.5, 0.0, -1.0, 0.0, 0.0, 1.0,
+        0.5, -0.5, 0.5, 0.0, -1.0, 0.0, 1.0, 1.0,
+        0.5, -0.5, -0.5, 0.0, -1.0, 0.0, 1.0, 0.0,
+        -0.5, -0.5, -0.5, 0.0, -1.0, 0.0, 0.0, 0.0,
+
+        # 右面
+        0.5, -0.5, 0.5, 1.0, 0.0, 0.0, 0.0, 0.0,
+        0.5, -0.5, -0.5, 1.0, 0.0, 0.0, 1.0, 0.0,
+        0.5, 0.5, -0.5, 1.0, 0.0, 0.0, 1.0, 1.0,
+        0.5, 0.5, 0.5, 1.0, 0.0, 0.0, 0.0, 1.0,
+
+        # 左面
+        -0.5, -0.5, 0.5, -1.0, 0.0, 0.0, 1.0, 0.0,
+        -0.5, -0.5, -0.5, -1.0, 0.0, 0.0, 0.0, 0.0,
+        -0.5, 0.5, -0.5, -1.0, 0.0, 0.0, 0.0, 1.0,
+        -0.5, 0.5, 0.5, -1.0, 0.0, 0.0, 1.0, 1.0,
+    ], dtype=np.float32)
+
+
+def cube_indices():
+    """返回立方体索引数据, 各面从外侧看均为逆时针"""
+    return np.array([
+        0, 1, 2, 2, 3, 0,  # 前面
+        4, 6, 5, 6, 4, 7,  # 后面
+        8, 9, 10, 10, 11, 8,  # 上面
+        12, 14, 13, 14, 12, 15,  # 下面
+        16, 17, 18, 18, 19, 16,  # 右面
+        20, 22, 21, 22, 20, 23  # 左面
+    ], dtype=np.uint32)
+
+
+def sphere_geometry(rings=16, segments=32, radius=0.5):
+    """返回 UV 球的顶点数据 (位置, 法线, 纹理坐标) 和索引数据, 格式与立方体相同"""
+    v = np.linspace(0.0, 1.0, rings + 1, dtype=np.float32)
+    u = np.linspace(0.0, 1.0, segments + 1, dtype=np.float32)
+    theta = v[:, None] * np.pi
+    phi = u[None, :] * 2.0 * np.pi
+    normals = np.stack(np.broadcast_arrays(
+        np.sin(theta) * np.cos(phi), np.cos(theta), -np.sin(theta) * np.sin(phi)
+    ), axis=-1)
+    uvs = np.stack(np.broadcast_arrays(u[None, :], 1.0 - v[:, None]), axis=-1)
+    vertices = np.concatenate([normals * radius, normals, uvs], axis=-1).astype(np.float32).reshape(-1)
+
+    # 每个四边形两个三角形, 从外侧看为逆时针
+    row = np.arange(rings)[:, None] * (segments + 1)
+    col = np.arange(segments)[None, :]
+    a = (row + col).ravel()
+    b = a + segments + 1
+    indices = np.stack([a, b, a + 1, a + 1, b, b + 1], axis=1).astype(np.uint32).reshape(-1)
+    return vertices, indices
@@ -0,0 +1,309 @@
+import collections
+import dataclasses
+import os
+import sys
+import time
+
+import OpenGL.GL as gl
+
+# 对象类型 -> (分配函数, 释放函数); 着色器程序单独处理
+KINDS = {
+    "buffer": ("glGenBuffers", "glDeleteBuffers"),
+    "texture": ("glGenTextures", "glDeleteTextures"),
+    "renderbuffer": ("glGenRenderbuffers", "glDeleteRenderbuffers"),
+    "framebuffer": ("glGenFramebuffers", "glDeleteFramebuffers"),
+    "vertex_array": ("glGenVertexArrays", "glDeleteVertexArrays"),
+    "program": ("glCreateProgram", "glDeleteProgram"),
+}
+# 释放的对象至少等待这么多帧, 并且该帧的栅栏已经触发, 才真正删除或放回对象池
+FRAMES_IN_FLIGHT = 3
+# 对象池中空闲对象的总大小上限, 以及空闲对象在池中保留的帧数
+POOL_LIMIT_MB = 128
+POOL_IDLE_FRAMES = 600
+# 缓冲容量按 2 的幂分桶, 最小桶的字节数
+MIN_BUFFER_BUCKET = 4096
+
+
+@dataclasses.dataclass
+class GLResource:
+    kind: str
+    handle: int
+    owner: str
+    label: str
+    # 分配位置 文件:行号 (函数)
+    site: str
+    size: int = 0
+    created: float = dataclasses.field(default_factory=time.time)
+
+
+class ResourceTracker:
+    """登记所有 GL 对象的类型、显存大小、分配位置和所有者, 供资源浏览器和退出时的泄漏报告使用"""
+
+    def __init__(self):
+        self.resources = {}
+        self.peak_bytes = 0
+        self.allocations = 0
+        self.releases = 0
+
+    def track(self, kind, handle, owner, label, site):
+        self.resources[(kind, handle)] = GLResource(kind, handle, owner, label, site)
+        self.allocations += 1
+
+    def untrack(self, kind, handles):
+        for handle in handles:
+            if self.resources.pop((kind, handle), None) is not None:
+                self.releases += 1
+
+    def set_size(self, kind, handle, size):
+        resource = self.resources.get((kind, int(handle)))
+        if resource is not None:
+            resource.size = int(size)
+            self.peak_bytes = max(self.peak_bytes, self.total_bytes)
+
+    @property
+    def total_bytes(self):
+        return sum(resource.size for resource in self.resources.values())
+
+    def totals(self, key="kind"):
+        """按类型或所有者 (key = "owner") 汇总: {名字: (数量, 字节数)}"""
+        totals = {}
+        for resource in self.resources.values():
+            name = getattr(resource, key)
+            count, size = totals.get(name, (0, 0))
+            totals[name] = (count + 1, size + resource.size)
+        return dict(sorted(totals.items(), key=lambda item: -item[1][1]))
+
+    def live(self, kind=None):
+        """存活的对象, 按大小从大到小"""
+        resources = [r for r in self.resources.values() if kind is None or r.kind == kind]
+        return sorted(resources, key=lambda r: -r.size)
+
+    def leak_report(self):
+        """退出时仍未释放的对象, 没有泄漏时返回空字符串"""
+        if not self.resources:
+            return ""
+        lines = [f"GL 资源泄漏: {len(self.resources)} 个对象, {self.total_bytes / 1048576:.1f} MB"]
+        for resource in self.live():
+            label = f" {resource.label}" if resource.label else ""
+            lines.append(f"  {resource.kind} #{resource.handle} {resource.size} B "
+                         f"{resource.owner}{label} @ {resource.site}")
+        return "\n".join(lines)
+
+
+TRACKER = ResourceTracker()
+
+
+def buffer_bucket(size):
+    """缓冲容量分桶: 不小于 size 的 2 的幂"""
+    return max(MIN_BUFFER_BUCKET, 1 << (max(int(size), 1) - 1).bit_length())
+
+
+class ResourcePool:
+    """GL 对象的延迟删除和复用
+
+    release 的对象先进入延迟队列, 等到释放时所在帧的栅栏触发且已经过去 FRAMES_IN_FLIGHT 帧,
+    确认 GPU 不再使用后, 带有池键的缓冲、纹理和渲染缓冲放回按尺寸分桶的对象池, 其它对象才真正删除。
+    acquire_* 优先从池中取出同一桶的对象, 只有池中没有时才新建和分配存储。
+    """
+
+    def __init__(self):
+        self.frame = 0
+        # 延迟队列: (释放时的帧号, 类型, 句柄), 以及各帧结束时插入的栅栏
+        self._pending = collections.deque()
+        self._fences = {}
+        # 池键: (类型, 句柄) -> 键; 空闲对象: 键 -> [(句柄, 放回的帧号)]
+        self._keys = {}
+        self._free = {}
+        self.free_bytes = 0
+        # 统计
+        self.reused = 0
+        self.created = 0
+        self.deleted = 0
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    # 分配
+
+    def acquire_buffer(self, owner, label, size, usage=gl.GL_DYNAMIC_DRAW):
+        """容量不小于 size 的缓冲, 返回 (句柄, 容量); 新建的缓冲已分配存储, 之后只用 glBufferSubData 写入"""
+        capacity = buffer_bucket(size)
+        key = ("buffer", capacity, int(usage))
+        handle = self.__take(key, owner, label)
+        if handle is None:
+            handle = self.__create("buffer", key, owner, label, capacity)
+            gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, handle)
+            gl.glBufferData(gl.GL_COPY_WRITE_BUFFER, capacity, None, usage)
+            gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, 0)
+        return handle, capacity
+
+    def acquire_texture(self, owner, label, width, height, internal_format, pixel_format, bytes_per_pixel=4):
+        """尺寸和格式完全相同的二维纹理 (单级, 线性过滤), 新建的纹理已分配存储"""
+        key = ("texture", int(width), int(height), int(internal_format))
+        handle = self.__take(key, owner, label)
+        if handle is None:
+            handle = self.__create("texture", key, owner, label, texture_bytes(width, height, bytes_per_pixel))
+            gl.glBindTexture(gl.GL_TEXTURE_2D, handle)
+            gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, internal_format, width, height,
+                            0, pixel_format, gl.GL_UNSIGNED_BYTE, None)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+            gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+        return handle
+
+    def acquire_renderbuffer(self, owner, label, width, height, internal_format, bytes_per_pixel=4):
+        key = ("renderbuffer", int(width), int(height), int(internal_format))
+        handle = self.__take(key, owner, label)
+        if handle is None:
+            handle = self.__create("renderbuffer", key, owner, label, texture_bytes(width, height, bytes_per_pixel))
+            gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, handle)
+            gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, internal_format, width, height)
+            gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, 0)
+        return handle
+
+    def __create(self, kind, key, owner, label, size):
+        handle = create(kind, owner, label, size)
+        self._keys[(kind, handle)] = key
+        self.created += 1
+        return handle
+
+    def __take(self, key, owner, label):
+        free = self._free.get(key)
+        if not free:
+            return None
+        handle, _ = free.pop()
+        resource = TRACKER.resources.get((key[0], handle))
+        if resource is not None:
+            self.free_bytes -= resource.size
+            resource.owner, resource.label, resource.site = _owner_name(owner), label, _call_site()
+        self.reused += 1
+        return handle
+
+    # 释放
+
+    def release(self, kind, *handles):
+        """延迟释放: GPU 可能仍在使用这些对象, 几帧之后再删除或放回对象池"""
+        for handle in handles:
+            if handle:
+                self._pending.append((self.frame, kind, int(handle)))
+
+    def next_frame(self):
+        """每帧开始时调用: 给上一帧插入栅栏, 回收已经安全的对象, 清理池中长期空闲的对象"""
+        if self._pending and self._pending[-1][0] == self.frame:
+            # 栅栏在上一帧的全部命令之后, 触发时这一帧释放的对象已不再被使用
+            self._fences[self.frame] = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self.frame += 1
+        while self._pending:
+            frame, kind, handle = self._pending[0]
+            if self.frame - frame < FRAMES_IN_FLIGHT or not _signaled(self._fences.get(frame)):
+                break
+            self._pending.popleft()
+            self.__recycle(kind, handle)
+        oldest = self._pending[0][0] if self._pending else self.frame
+        for frame in [frame for frame in self._fences if frame < oldest]:
+            gl.glDeleteSync(self._fences.pop(frame))
+        self.__trim(POOL_LIMIT_MB * 1024 * 1024, self.frame - POOL_IDLE_FRAMES)
+
+    def __recycle(self, kind, handle):
+        key = self._keys.get((kind, handle))
+        resource = TRACKER.resources.get((kind, handle))
+        if key is None or resource is None:
+            self.__delete(kind, handle)
+            return
+        resource.owner, resource.label = type(self).__name__, "free"
+        self._free.setdefault(key, []).append((handle, self.frame))
+        self.free_bytes += resource.size
+
+    def __trim(self, limit, idle_before):
+        """删除池中空闲太久的对象; 超过上限时从最早放回的开始删除"""
+        entries = sorted((since, key, handle) for key, free in self._free.items() for handle, since in free)
+        for since, key, handle in entries:
+            if since >= idle_before and self.free_bytes <= limit:
+                break
+            self._free[key].remove((handle, since))
+            resource = TRACKER.resources.get((key[0], handle))
+            self.free_bytes -= resource.size if resource is not None else 0
+            self.__delete(key[0], handle)
+
+    def __delete(self, kind, handle):
+        self._keys.pop((kind, handle), None)
+        delete(kind, handle)
+        self.deleted += 1
+
+    def flush(self):
+        """立即删除延迟队列和对象池中的全部对象, 退出前在 GL 上下文销毁之前调用"""
+        if self._pending or self._fences:
+            gl.glFinish()
+        while self._pending:
+            _, kind, handle = self._pending.popleft()
+            self.__recycle(kind, handle)
+        for fence in self._fences.values():
+            gl.glDeleteSync(fence)
+        self._fences = {}
+        self.__trim(0, self.frame + 1)
+
+
+def _signaled(fence):
+    if fence is None:
+        return True
+    status = gl.glClientWaitSync(fence, 0, 0)
+    return status in (gl.GL_ALREADY_SIGNALED, gl.GL_CONDITION_SATISFIED)
+
+
+POOL = ResourcePool()
+
+
+def _owner_name(owner):
+    return owner if isinstance(owner, str) else type(owner).__name__
+
+
+def _call_site():
+    """本模块之外最近的调用位置"""
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} ({frame.f_code.co_name})"
+
+
+def create(kind, owner, label="", size=0):
+    """分配一个 GL 对象并登记, owner 为所有者对象或名字"""
+    if kind == "program":
+        handle = int(gl.glCreateProgram())
+    else:
+        handle = int(getattr(gl, KINDS[kind][0])(1))
+    TRACKER.track(kind, handle, _owner_name(owner), label, _call_site())
+    if size:
+        TRACKER.set_size(kind, handle, size)
+    return handle
+
+
+def delete(kind, *handles):
+    """释放 GL 对象并注销, 忽略 0 和 None"""
+    handles = [int(handle) for handle in handles if handle]
+    if not handles:
+        return
+    if kind == "program":
+        for handle in handles:
+            gl.glDeleteProgram(handle)
+    else:
+        getattr(gl, KINDS[kind][1])(len(handles), handles)
+    TRACKER.untrack(kind, handles)
+
+
+def release(kind, *handles):
+    """延迟释放, 见 ResourcePool.release"""
+    POOL.release(kind, *handles)
+
+
+def set_size(kind, handle, size):
+    """记录对象当前占用的显存字节数 (缓冲重新分配或纹理重新定义之后调用)"""
+    TRACKER.set_size(kind, handle, size)
+
+
+def texture_bytes(width, height, bytes_per_pixel=4, layers=1, mipmaps=False):
+    """纹理占用的字节数估计, 完整 mip 链约为第 0 级的 4/3"""
+    size = width * height * bytes_per_pixel * layers
+    return size * 4 // 3 if mipmaps else size
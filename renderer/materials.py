@@ -0,0 +1,240 @@
+import time
+
+import numpy as np
+import OpenGL.GL as gl
+
+from Stores.sceneStore import TextureData
+from renderer.clustered_lights import TextureBuffer
+from renderer.texture_streaming import TextureStreamer, mesh_uv_density, wanted_levels
+
+# 每个材质 2 个 RGBA32F 纹素: 颜色+不透明度, 金属度+粗糙度+纹理数组+层
+MATERIAL_TEXELS = 2
+# 纹理按尺寸分组为纹理数组, 片段着色器最多同时使用 MAX_TEXTURE_ARRAYS 组
+MAX_TEXTURE_ARRAYS = 4
+# 未指定纹理 (texture = -1) 的材质使用默认纹理, 材质 id 为 -1 的节点使用默认材质
+DEFAULT_MATERIAL = (1.0, 1.0, 1.0, 0.0, 0.5, 1.0)
+
+
+def group_textures(shapes):
+    """按尺寸 (h, w) 把纹理分到纹理数组; 返回 (数组尺寸列表, 每张纹理的 (数组, 层))
+
+    尺寸种类超过 MAX_TEXTURE_ARRAYS 时, 较少见的尺寸缩放到最常见的尺寸。
+    """
+    sizes, counts = np.unique(shapes, axis=0, return_counts=True)
+    order = np.argsort(-counts, kind="stable")
+    sizes = [tuple(int(v) for v in sizes[i]) for i in order[:MAX_TEXTURE_ARRAYS]]
+    layers = [0] * len(sizes)
+    placement = []
+    for shape in shapes:
+        size = tuple(shape)
+        array = sizes.index(size) if size in sizes else 0
+        placement.append((array, layers[array]))
+        layers[array] += 1
+    return sizes, placement
+
+
+def dedupe_materials(params, layers):
+    """合并参数和纹理完全相同的材质
+
+    params 为 (M, 6) 材质参数, layers 为 (M, 2) 纹理数组和层; 返回 (唯一材质的纹素 (U, 8), 每个材质的槽位 (M,))
+    """
+    rows = np.empty((len(params), MATERIAL_TEXELS * 4), dtype=np.float32)
+    rows[:, 0:3] = params[:, 0:3]
+    rows[:, 3] = params[:, 5]
+    rows[:, 4:6] = params[:, 3:5]
+    rows[:, 6:8] = layers
+    unique, slots = np.unique(rows, axis=0, return_inverse=True)
+    return unique, slots.reshape(-1).astype(np.int32)
+
+
+class MaterialTable:
+    """GPU 上的材质表: 所有材质参数在一个纹理缓冲中, 纹理按尺寸放进纹理数组
+
+    绘制时着色器和纹理数组只绑定一次, 切换材质只需要改变 materialIndex。
+    参数与纹理完全相同的材质共用一个槽位, 渲染队列按槽位排序, 不会产生多余的切换。
+    """
+
+    # 纹理单元, 与分簇光照 (1-3) 和阴影 (4) 错开
+    PARAMS_UNIT = 0
+    ARRAY_UNIT = 5
+
+    def __init__(self):
+        self.params = None
+        self.cache = None
+        self.streamer = None
+        self._default = None
+        self._texture_key = None
+        self._placement = {}
+        # 材质 id + 1 -> 槽位, 下标 0 是默认材质 (材质 id 为 -1)
+        self._slots = np.zeros(1, dtype=np.int32)
+        self._opacity = np.ones(1, dtype=np.float32)
+        # 材质 id + 1 -> 纹理数组, 以及各网格的 uv 密度 {网格 id: (顶点数组, 密度)}
+        self._material_arrays = np.zeros(1, dtype=np.int32)
+        self._uv_density = {}
+        self.material_count = 0
+        self.unique_count = 0
+        self.created = False
+
+    def create(self, cache, default_path):
+        """cache 为 TextureCache, 纹理数组从烘焙好的 mip 链上传"""
+        self.params = TextureBuffer(gl.GL_RGBA32F)
+        self.cache = cache
+        self.streamer = TextureStreamer(cache)
+        self._default = TextureData("Default", default_path)
+        self.created = True
+
+    @property
+    def arrays(self):
+        return [array.texture for array in self.streamer.arrays] if self.streamer is not None else []
+
+    def slots(self, material_ids):
+        """材质 id 对应的 GPU 槽位"""
+        return self._slots[np.clip(np.asarray(material_ids) + 1, 0, len(self._slots) - 1)]
+
+    def opacity(self, slots):
+        return self._opacity[slots]
+
+    def sync(self, scene, params_changed):
+        """纹理集合变化时重建纹理数组, 参数变化时重新去重并上传参数"""
+        referenced = sorted({int(t) for t in scene.material_textures if 0 <= t < len(scene.textures)})
+        key = (id(scene), tuple((t, id(scene.texture(t))) for t in referenced))
+        if key != self._texture_key:
+            self._texture_key = key
+            self.__build_arrays(scene, referenced)
+            params_changed = True
+        if not params_changed:
+            return
+
+        params = np.concatenate([np.asarray([DEFAULT_MATERIAL], dtype=np.float32), scene.materials])
+        layers = np.array(
+            [self._placement[-1]] + [self._placement.get(int(t), self._placement[-1]) for t in scene.material_textures],
+            dtype=np.float32,
+        ).reshape(-1, 2)
+        unique, self._slots = dedupe_materials(params, layers)
+        self._opacity = unique[:, 3].copy()
+        self._material_arrays = layers[:, 0].astype(np.int32)
+        self.params.upload(np.ascontiguousarray(unique))
+        self.material_count = len(scene.materials)
+        self.unique_count = len(unique)
+
+    def request_levels(self, view, scene, material_ids, mesh_ids, models, clip_w, pixels_per_unit):
+        """按视口中物体的投影大小和 uv 密度估计各纹理数组需要的 mip 级别, 交给流式加载
+
+        视口重绘前应先调用 streamer.reset(view) 清除它上一次的请求
+        """
+        if not len(models) or not self.streamer.arrays:
+            return
+        arrays = self._material_arrays[np.clip(np.asarray(material_ids) + 1, 0, len(self._material_arrays) - 1)]
+        sizes = np.array([max(array.width, array.height) for array in self.streamer.arrays], dtype=np.float32)
+        density = np.ones(len(models), dtype=np.float32)
+        for mesh_id in np.unique(mesh_ids):
+            density[mesh_ids == mesh_id] = self.__mesh_density(scene, int(mesh_id))
+        # 行向量约定下模型矩阵前三行是缩放后的坐标轴
+        scales = np.linalg.norm(models[:, :3, :3], axis=2).max(axis=1)
+        levels = wanted_levels(sizes[arrays], density, scales, clip_w, pixels_per_unit)
+        for index in np.unique(arrays):
+            self.streamer.request(view, int(index), levels[arrays == index])
+
+    def __mesh_density(self, scene, mesh_id):
+        mesh = scene.mesh(mesh_id) if 0 <= mesh_id < len(scene.meshes) else None
+        if mesh is None:
+            return 1.0
+        cached = self._uv_density.get(mesh_id)
+        if cached is None or cached[0] is not mesh.vertices:
+            cached = self._uv_density[mesh_id] = (mesh.vertices, mesh_uv_density(mesh))
+        return cached[1]
+
+    def __build_arrays(self, scene, referenced):
+        # 默认纹理总是第一张, 保证至少有一个纹理数组
+        sources = [self._default] + [scene.texture(t) for t in referenced]
+        start = time.perf_counter()
+        shapes, cold = [], []
+        for source in sources:
+            # 第一次使用的纹理在这里烘焙, 之后只读取文件头
+            with self.cache.open(source) as cooked:
+                shapes.append((cooked.height, cooked.width))
+                cold.append(cooked.cold)
+        sizes, placement = group_textures(shapes)
+        self._placement = dict(zip([-1] + referenced, placement))
+        # 只上传常驻的粗级别, 更细的级别由流式加载按需读取
+        self.streamer.clear()
+        for index, size in enumerate(sizes):
+            self.streamer.create_array(size, [source for source, (array, _) in zip(sources, placement) if array == index])
+        seconds = (time.perf_counter() - start) / len(sources)
+        for was_cold in cold:
+            self.cache.stats.record(was_cold, seconds)
+
+    def bind(self, shader, mip_overlay=False):
+        """绑定参数缓冲和全部纹理数组, 每个视口每帧一次"""
+        self.params.bind(self.PARAMS_UNIT)
+        arrays = self.streamer.arrays
+        units = [self.ARRAY_UNIT + i for i in range(MAX_TEXTURE_ARRAYS)]
+        info = np.zeros((MAX_TEXTURE_ARRAYS, 4), dtype=np.float32)
+        for i, unit in enumerate(units):
+            # 空闲的采样器也绑定一个有效的纹理数组
+            array = arrays[min(i, len(arrays) - 1)]
+            gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+            gl.glBindTexture(gl.GL_TEXTURE_2D_ARRAY, array.texture)
+            info[i] = (array.width, array.height, array.resident, array.target)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glUniform1i(gl.glGetUniformLocation(shader, "materialParams"), self.PARAMS_UNIT)
+        gl.glUniform1iv(gl.glGetUniformLocation(shader, "materialTextures"), MAX_TEXTURE_ARRAYS, units)
+        gl.glUniform4fv(gl.glGetUniformLocation(shader, "materialArrayInfo"), MAX_TEXTURE_ARRAYS, info)
+        gl.glUniform1i(gl.glGetUniformLocation(shader, "mipOverlay"), int(mip_overlay))
+
+    def cleanup(self):
+        if not self.created:
+            return
+        self.streamer.shutdown()
+        self.params.cleanup()
+        self._texture_key = None
+        self.created = False
+
+
+# 片段着色器中读取材质的函数, 由 RenderEngine 的片段着色器拼接使用
+MATERIAL_SHADER_FUNCTIONS = f"""
+        uniform samplerBuffer materialParams;
+        uniform sampler2DArray materialTextures[{MAX_TEXTURE_ARRAYS}];
+        uniform int materialIndex;
+
+        struct MaterialParams {{
+            vec3 color;
+            float opacity;
+            float metallic;
+            float roughness;
+            int array;
+            float layer;
+        }};
+
+        MaterialParams fetchMaterial()
+        {{
+            vec4 colorOpacity = texelFetch(materialParams, materialIndex * {MATERIAL_TEXELS});
+            vec4 surface = texelFetch(materialParams, materialIndex * {MATERIAL_TEXELS} + 1);
+            return MaterialParams(colorOpacity.rgb, colorOpacity.a, surface.x, surface.y, int(surface.z), surface.w);
+        }}
+
+        vec4 sampleMaterial(MaterialParams m, vec2 uv)
+        {{
+            // GLSL 3.30 的采样器数组只能用常量下标
+            vec3 coord = vec3(uv, m.layer);
+            if (m.array == 1) return texture(materialTextures[1], coord);
+            if (m.array == 2) return texture(materialTextures[2], coord);
+            if (m.array == 3) return texture(materialTextures[3], coord);
+            return texture(materialTextures[0], coord);
+        }}
+
+        uniform vec4 materialArrayInfo[{MAX_TEXTURE_ARRAYS}];  // 宽, 高, 驻留的最细级别, 目标级别
+        uniform bool mipOverlay;
+
+        vec3 mipOverlayColor(MaterialParams m, vec2 uv, vec3 color)
+        {{
+            // 绿: 驻留级别正好满足屏幕纹素密度; 红: 比需要的粗 (等待加载); 蓝: 比需要的细
+            vec4 info = materialArrayInfo[m.array];
+            vec2 texels = uv * info.xy;
+            float density = max(length(dFdx(texels)), length(dFdy(texels)));
+            float wanted = floor(max(log2(max(density, 1e-6)), 0.0));
+            float diff = info.z - wanted;
+            vec3 tint = diff > 0.5 ? vec3(1.0, 0.2, 0.2) : (diff < -0.5 ? vec3(0.2, 0.4, 1.0) : vec3(0.2, 1.0, 0.2));
+            return mix(color, tint * max(dot(color, vec3(0.333)), 0.3), 0.6);
+        }}
+"""
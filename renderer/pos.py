@@ -1,3 +1,9 @@
+import numpy as np
+
+# 点数组可以处于的坐标空间
+SPACES = ("world", "scene", "view")
+
+
 class Pos:
 
     def __init__(self, x, y):
@@ -23,10 +29,147 @@ class ScenePos(Pos):
 
 
 class WorldPos(Pos):
-    """世界坐标: 原点在左上角，会根据相机位置改变"""
+    """世界坐标: 三维场景中的位置，投影到画布上的位置会根据相机位置改变"""
     pass
 
 
 class ViewPos(Pos):
     """视图坐标: 原点在左上角，不会随相机位置改变"""
     pass
+
+
+class Points:
+    """同一坐标空间中的 N 个点, 存在一个 (N, 3) float32 数组中
+
+    world: 世界坐标 x, y, z;
+    scene: 相对画布中心的像素坐标 (y 向上), z 为归一化设备坐标的深度 [-1, 1];
+    view: 相对画布左上角的像素坐标 (y 向下), z 同 scene。
+    算术运算和坐标转换都对整个数组进行, 不为每个点创建 Python 对象。
+    """
+
+    def __init__(self, data, space="world"):
+        if space not in SPACES:
+            raise ValueError(f"未知的坐标空间: {space}")
+        data = np.asarray(data, dtype=np.float32)
+        if data.ndim == 2 and data.shape[1] == 2:
+            # 只给出平面坐标时深度为 0 (近平面与远平面之间)
+            data = np.concatenate([data, np.zeros((len(data), 1), dtype=np.float32)], axis=1)
+        self.data = data.reshape(-1, 3)
+        self.space = space
+
+    @classmethod
+    def from_pos(cls, positions, space):
+        """由 Pos 对象列表创建"""
+        return cls(np.array([(p.x, p.y) for p in positions], dtype=np.float32).reshape(-1, 2), space)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return Points(self.data[index], self.space)
+
+    @property
+    def xy(self):
+        return self.data[:, :2]
+
+    @property
+    def depth(self):
+        return self.data[:, 2]
+
+    def __check(self, other):
+        if isinstance(other, Points):
+            if other.space != self.space:
+                raise ValueError(f"坐标空间不同: {self.space} 和 {other.space}")
+            return other.data
+        return np.asarray(other, dtype=np.float32)
+
+    def __add__(self, other):
+        return Points(self.data + self.__check(other), self.space)
+
+    def __sub__(self, other):
+        return Points(self.data - self.__check(other), self.space)
+
+    def __mul__(self, other):
+        return Points(self.data * self.__check(other), self.space)
+
+    def __truediv__(self, other):
+        return Points(self.data / self.__check(other), self.space)
+
+    def to(self, space, converter):
+        return converter.convert(self, space)
+
+
+class SpaceConverter:
+    """按视口当前的相机和画布大小在 world / scene / view 之间批量转换点
+
+    转换矩阵缓存到相机或画布大小改变为止。相机后方的点投影后坐标为 NaN,
+    绘制手柄和标签前可以用 np.isfinite 过滤。
+    """
+
+    def __init__(self, viewport):
+        self.viewport = viewport
+        self._key = None
+        self._to_scene = None
+        self._to_world = None
+
+    def __key(self):
+        viewport = self.viewport
+        return (*viewport.camera_pos.tolist(), *viewport.camera_front.tolist(), *viewport.camera_up.tolist(),
+                viewport.projection, viewport.fov, viewport.ortho_size, viewport.near, viewport.far,
+                viewport.width, viewport.height)
+
+    def matrices(self):
+        """(世界 -> 场景, 场景 -> 世界) 的 4x4 矩阵, 行向量约定, 场景一侧是齐次坐标"""
+        key = self.__key()
+        if key != self._key:
+            self._key = key
+            viewport = self.viewport
+            # 裁剪坐标的 x, y 乘以半个画布的像素数, 透视除法之后即为相对中心的像素坐标
+            scale = np.diag([viewport.width / 2.0, viewport.height / 2.0, 1.0, 1.0])
+            matrix = viewport.view_matrix() @ viewport.projection_matrix() @ scale
+            self._to_scene = matrix.astype(np.float64)
+            self._to_world = np.linalg.inv(self._to_scene)
+        return self._to_scene, self._to_world
+
+    def convert(self, points, space):
+        if space not in SPACES:
+            raise ValueError(f"未知的坐标空间: {space}")
+        if points.space == space:
+            return points
+        data = points.data
+        if points.space == "view":
+            data = self.__view_to_scene(data)
+        elif points.space == "world":
+            data = self.__world_to_scene(data)
+        if space == "view":
+            data = self.__scene_to_view(data)
+        elif space == "world":
+            data = self.__scene_to_world(data)
+        return Points(data, space)
+
+    def __world_to_scene(self, data):
+        to_scene, _ = self.matrices()
+        clip = data.astype(np.float64) @ to_scene[:3] + to_scene[3]
+        w = clip[:, 3:4]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scene = np.where(w > 0.0, clip[:, :3] / w, np.nan)
+        return scene.astype(np.float32)
+
+    def __scene_to_world(self, data):
+        _, to_world = self.matrices()
+        world = data.astype(np.float64) @ to_world[:3] + to_world[3]
+        return (world[:, :3] / world[:, 3:4]).astype(np.float32)
+
+    def __scene_to_view(self, data):
+        offset = np.array([self.viewport.width / 2.0, self.viewport.height / 2.0], dtype=np.float32)
+        view = data.copy()
+        view[:, 0] = data[:, 0] + offset[0]
+        view[:, 1] = offset[1] - data[:, 1]
+        return view
+
+    def __view_to_scene(self, data):
+        offset = np.array([self.viewport.width / 2.0, self.viewport.height / 2.0], dtype=np.float32)
+        scene = data.copy()
+        scene[:, 0] = data[:, 0] - offset[0]
+        scene[:, 1] = offset[1] - data[:, 1]
+        return scene
@@ -0,0 +1,259 @@
+import ctypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import OpenGL.GL as gl
+from PIL import Image
+
+from renderer import gl_resources
+
+# 像素缓冲环的大小: 第 N 帧的读回在第 N + RING_SIZE - 1 帧之前都不需要等待 GPU
+RING_SIZE = 3
+# 等待读回完成时每次 glClientWaitSync 的超时 (纳秒), 超时后继续等待
+WAIT_TIMEOUT = 1_000_000_000
+# Pillow 能写入的格式; EXR 需要额外的依赖, 暂不支持
+IMAGE_FORMATS = {".png": "PNG", ".tif": "TIFF", ".tiff": "TIFF", ".jpg": "JPEG", ".jpeg": "JPEG"}
+
+
+def image_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in IMAGE_FORMATS:
+        raise ValueError(f"不支持的图像格式: {extension or path}")
+    return IMAGE_FORMATS[extension]
+
+
+def write_image(path, pixels):
+    """pixels 为 (H, W, 3) uint8, 第一行在下(与帧缓冲一致)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    Image.fromarray(pixels[::-1]).save(path, format=image_format(path))
+
+
+class ImageWriter:
+    """编码和写盘的线程池, Pillow 编码时会释放 GIL; write(path, pixels) 在线程池中执行"""
+
+    def __init__(self, workers=None, write=write_image):
+        self.workers = workers or max(2, min(4, os.cpu_count() or 2))
+        self.write = write
+        self._pool = None
+        self._futures = []
+        self.written = 0
+        self.last_error = None
+
+    def submit(self, path, pixels):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="ImageWriter")
+        self._futures.append(self._pool.submit(self.write, path, pixels))
+
+    @property
+    def pending(self):
+        self.__collect()
+        return len(self._futures)
+
+    def __collect(self):
+        for future in [future for future in self._futures if future.done()]:
+            self._futures.remove(future)
+            try:
+                future.result()
+                self.written += 1
+            except (OSError, ValueError) as e:
+                print(f"写入图像失败, 错误: {e}")
+                self.last_error = str(e)
+
+    def wait(self):
+        for future in list(self._futures):
+            future.exception()
+        self.__collect()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self.__collect()
+
+
+class _PixelBuffer:
+    def __init__(self):
+        self.pbo = gl_resources.create("buffer", "FrameReadback", "readback PBO")
+        self.capacity = 0
+        self.fence = None
+        self.path = None
+        self.width = 0
+        self.height = 0
+
+
+class FrameReadback:
+    """帧缓冲异步读回: glReadPixels 写入像素缓冲对象环, 几帧之后 GPU 完成时再映射读取
+
+    读回请求只在 GPU 命令流中排队, 不会像直接 glReadPixels 到内存那样等待本帧渲染完成。
+    取回的像素交给 ImageWriter 在后台编码写盘。
+    """
+
+    def __init__(self, writer=None):
+        self.writer = writer or ImageWriter()
+        self._buffers = []
+        self._index = 0
+        # 环满时被迫等待 GPU 的次数, 持续增长说明写盘跟不上
+        self.stalls = 0
+
+    def capture(self, viewport, path):
+        """把视口当前的渲染结果排队读回并写入 path"""
+        image_format(path)
+        self.capture_region(viewport.framebuffer, 0, 0, viewport.render_width, viewport.render_height, path)
+
+    def capture_region(self, framebuffer, x, y, width, height, path):
+        """排队读回帧缓冲中的一个区域, 完成后 (path, 像素) 原样交给 writer"""
+        if not self._buffers:
+            self._buffers = [_PixelBuffer() for _ in range(RING_SIZE)]
+        buffer = self._buffers[self._index]
+        if buffer.fence is not None:
+            # 最早的读回还没完成, 只能等待
+            self.stalls += 1
+            self.__complete(buffer, wait=True)
+        self._index = (self._index + 1) % RING_SIZE
+
+        size = width * height * 3
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buffer.pbo)
+        if size > buffer.capacity:
+            gl.glBufferData(gl.GL_PIXEL_PACK_BUFFER, size, None, gl.GL_STREAM_READ)
+            buffer.capacity = size
+            gl_resources.set_size("buffer", buffer.pbo, size)
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, framebuffer)
+        gl.glReadBuffer(gl.GL_COLOR_ATTACHMENT0)
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        # 绑定了 PIXEL_PACK_BUFFER 时最后一个参数是缓冲内的偏移
+        gl.glReadPixels(x, y, width, height, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, 0)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+
+        buffer.fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        buffer.path = path
+        buffer.width = width
+        buffer.height = height
+
+    def poll(self):
+        """每帧调用, 按提交顺序取回 GPU 已经完成的读回"""
+        for offset in range(RING_SIZE if self._buffers else 0):
+            buffer = self._buffers[(self._index + offset) % RING_SIZE]
+            if buffer.fence is not None and not self.__complete(buffer, wait=False):
+                break
+
+    @property
+    def pending(self):
+        return sum(buffer.fence is not None for buffer in self._buffers)
+
+    def flush(self):
+        """等待所有读回完成, 结束录制或截图后调用"""
+        for offset in range(RING_SIZE if self._buffers else 0):
+            buffer = self._buffers[(self._index + offset) % RING_SIZE]
+            if buffer.fence is not None:
+                self.__complete(buffer, wait=True)
+
+    def __complete(self, buffer, wait):
+        """读回完成时取出像素交给写盘线程; wait 为真时一直等到完成, 像素缓冲完成前不能复用"""
+        if wait:
+            status = gl.GL_TIMEOUT_EXPIRED
+            while status == gl.GL_TIMEOUT_EXPIRED:
+                status = gl.glClientWaitSync(buffer.fence, gl.GL_SYNC_FLUSH_COMMANDS_BIT, WAIT_TIMEOUT)
+            if status == gl.GL_WAIT_FAILED:
+                raise RuntimeError("等待帧缓冲读回失败")
+        else:
+            status = gl.glClientWaitSync(buffer.fence, 0, 0)
+        if status not in (gl.GL_ALREADY_SIGNALED, gl.GL_CONDITION_SATISFIED):
+            return False
+        gl.glDeleteSync(buffer.fence)
+        buffer.fence = None
+
+        size = buffer.width * buffer.height * 3
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buffer.pbo)
+        address = gl.glMapBufferRange(gl.GL_PIXEL_PACK_BUFFER, 0, size, gl.GL_MAP_READ_BIT)
+        try:
+            data = (ctypes.c_ubyte * size).from_address(address)
+            pixels = np.frombuffer(data, dtype=np.uint8).reshape(buffer.height, buffer.width, 3).copy()
+        finally:
+            gl.glUnmapBuffer(gl.GL_PIXEL_PACK_BUFFER)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+        self.writer.submit(buffer.path, pixels)
+        return True
+
+    def cleanup(self):
+        self.flush()
+        self.writer.shutdown()
+        if self._buffers:
+            gl_resources.delete("buffer", *[buffer.pbo for buffer in self._buffers])
+        self._buffers = []
+
+
+class SequenceRecorder:
+    """把视口每一帧的渲染结果导出为图像序列, 也用于单张截图"""
+
+    def __init__(self):
+        self.readback = FrameReadback()
+        self.viewport = None
+        self.pattern = None
+        self.frame = 0
+        self._dynamic_resolution = True
+        # 等待完整尺寸重绘的截图: [(视口, 路径, 原来的动态分辨率开关)]
+        self._screenshots = []
+
+    @property
+    def recording(self):
+        return self.viewport is not None
+
+    def start(self, viewport, directory, extension=".png"):
+        """开始录制; 录制期间关闭动态分辨率, 保证每一帧都是完整尺寸"""
+        image_format(extension)
+        self.stop()
+        self.viewport = viewport
+        self.pattern = os.path.join(directory, "frame_{:05d}" + extension)
+        self.frame = 0
+        self._dynamic_resolution = viewport.dynamic_resolution.enabled
+        viewport.dynamic_resolution.enabled = False
+
+    def stop(self):
+        if self.viewport is None:
+            return
+        self.viewport.dynamic_resolution.enabled = self._dynamic_resolution
+        self.viewport = None
+        self.readback.flush()
+
+    def screenshot(self, viewport, path):
+        """保存视口的渲染结果; 以降低的分辨率渲染时先关闭动态分辨率, 完整尺寸重绘后再读回"""
+        if viewport.render_scale == 1.0:
+            self.readback.capture(viewport, path)
+            return
+        image_format(path)
+        self._screenshots.append((viewport, path, viewport.dynamic_resolution.enabled))
+        viewport.dynamic_resolution.enabled = False
+        viewport.dirty = True
+
+    def tick(self):
+        """每帧在视口渲染之后调用"""
+        if self.viewport is not None and self.viewport.visible and self.viewport.render_scale == 1.0:
+            self.readback.capture(self.viewport, self.pattern.format(self.frame))
+            self.frame += 1
+        self.__capture_screenshots()
+        self.readback.poll()
+
+    def __capture_screenshots(self):
+        waiting = []
+        for viewport, path, enabled in self._screenshots:
+            if not viewport.visible or viewport.render_scale != 1.0:
+                waiting.append((viewport, path, enabled))
+                continue
+            self.readback.capture(viewport, path)
+            # 录制同一视口时由 stop 恢复
+            if viewport is not self.viewport:
+                viewport.dynamic_resolution.enabled = enabled
+            elif enabled:
+                self._dynamic_resolution = True
+        self._screenshots = waiting
+
+    def cleanup(self):
+        self.stop()
+        for viewport, _, enabled in self._screenshots:
+            viewport.dynamic_resolution.enabled = enabled
+        self._screenshots = []
+        self.readback.cleanup()
@@ -0,0 +1,128 @@
+import dataclasses
+import time
+
+import numpy as np
+
+# 64 位排序键, 从高到低:
+#   不透明: 通道(4) 透明(1)=0 着色器(7) 材质(16) 网格(16) 深度(20, 由近到远)
+#   透明:   通道(4) 透明(1)=1 深度(20, 由远到近) 着色器(7) 材质(16) 网格(16)
+# 不透明物体按状态分组以减少切换, 透明物体必须按深度从后往前混合
+PASS_BITS, SHADER_BITS, ID_BITS, DEPTH_BITS = 4, 7, 16, 20
+DEPTH_MAX = (1 << DEPTH_BITS) - 1
+ID_MAX = (1 << ID_BITS) - 1
+# 没有材质的绘制 (如光源立方体) 使用的材质编号
+NO_MATERIAL = ID_MAX
+
+PASS_SCENE = 0
+PASS_OVERLAY = 1
+
+
+def sort_keys(passes, transparent, shaders, materials, meshes, depths, far):
+    """批量计算排序键 (uint64); depths 为视图空间深度, 按 far 归一化后量化"""
+    passes = passes.astype(np.uint64)
+    transparent = transparent.astype(np.uint64)
+    shaders = shaders.astype(np.uint64) & np.uint64((1 << SHADER_BITS) - 1)
+    materials = np.where(materials < 0, NO_MATERIAL, np.minimum(materials, ID_MAX)).astype(np.uint64)
+    meshes = np.where(meshes < 0, ID_MAX, np.minimum(meshes, ID_MAX)).astype(np.uint64)
+    depth = (np.clip(depths / far, 0.0, 1.0) * DEPTH_MAX).astype(np.uint64)
+
+    state = (shaders << np.uint64(2 * ID_BITS)) | (materials << np.uint64(ID_BITS)) | meshes
+    opaque = (state << np.uint64(DEPTH_BITS)) | depth
+    blended = ((np.uint64(DEPTH_MAX) - depth) << np.uint64(SHADER_BITS + 2 * ID_BITS)) | state
+    low = np.where(transparent.astype(bool), blended, opaque)
+    return (passes << np.uint64(60)) | (transparent << np.uint64(59)) | low
+
+
+@dataclasses.dataclass
+class QueueStats:
+    draws: int = 0
+    shader_switches: int = 0
+    material_switches: int = 0
+    mesh_switches: int = 0
+    state_switches: int = 0
+    sort_ms: float = 0.0
+
+
+class RenderQueue:
+    """绘制队列: 各处提交的绘制在 execute 时按 64 位键统一排序, 提交时跳过没有变化的状态
+
+    backend 需要实现:
+      bind_state(pass_id, transparent)  通道或透明状态变化
+      bind_shader(shader)               切换着色器程序并设置每帧参数
+      bind_material(shader, material)   设置材质参数; 切换着色器后需要重新设置
+      bind_mesh(mesh)                   绑定网格顶点数组
+      draw(shader, model)               绘制一次
+    """
+
+    def __init__(self):
+        self._batches = []
+        self.stats = QueueStats()
+
+    def __len__(self):
+        return sum(len(batch[0]) for batch in self._batches)
+
+    def clear(self):
+        self._batches = []
+
+    def submit(self, shader, materials, meshes, depths, models, transparent=None, pass_id=PASS_SCENE):
+        """提交一批使用同一着色器的绘制, materials/meshes/depths 为 (K,), models 为 (K, 4, 4)"""
+        count = len(models)
+        if not count:
+            return
+        if transparent is None:
+            transparent = np.zeros(count, dtype=bool)
+        self._batches.append((
+            np.asarray(models, dtype=np.float32),
+            np.full(count, pass_id, dtype=np.int64),
+            np.asarray(transparent, dtype=bool),
+            np.full(count, shader, dtype=np.int64),
+            np.asarray(materials, dtype=np.int64),
+            np.asarray(meshes, dtype=np.int64),
+            np.asarray(depths, dtype=np.float32),
+        ))
+
+    def execute(self, backend, far):
+        """排序并提交全部绘制, 之后队列清空; 返回本次的统计"""
+        stats = self.stats = QueueStats()
+        if not self._batches:
+            return stats
+        models, passes, transparent, shaders, materials, meshes, depths = (
+            np.concatenate(column) for column in zip(*self._batches)
+        )
+        self._batches = []
+
+        start = time.perf_counter()
+        keys = sort_keys(passes, transparent, shaders, materials, meshes, depths, far)
+        order = np.argsort(keys, kind="stable")
+        passes, transparent, shaders = passes[order], transparent[order], shaders[order]
+        materials, meshes, models = materials[order], meshes[order], models[order]
+
+        # 与前一项比较, 预先算出每一项需要改变的状态
+        def changed(values):
+            mask = np.ones(len(values), dtype=bool)
+            mask[1:] = values[1:] != values[:-1]
+            return mask
+        state_changed = changed(passes) | changed(transparent)
+        shader_changed = changed(shaders)
+        # 材质参数是着色器程序的 uniform, 切换程序后需要重新设置
+        material_changed = changed(materials) | shader_changed
+        mesh_changed = changed(meshes)
+        stats.sort_ms = (time.perf_counter() - start) * 1000.0
+
+        stats.draws = len(order)
+        stats.state_switches = int(state_changed.sum())
+        stats.shader_switches = int(shader_changed.sum())
+        stats.material_switches = int(material_changed.sum())
+        stats.mesh_switches = int(mesh_changed.sum())
+
+        for i in range(len(order)):
+            if state_changed[i]:
+                backend.bind_state(int(passes[i]), bool(transparent[i]))
+            if shader_changed[i]:
+                backend.bind_shader(int(shaders[i]))
+            if material_changed[i]:
+                backend.bind_material(int(shaders[i]), int(materials[i]))
+            if mesh_changed[i]:
+                backend.bind_mesh(int(meshes[i]))
+            backend.draw(int(shaders[i]), models[i])
+        return stats
@@ -0,0 +1,257 @@
+import dataclasses
+import time
+from threading import Thread, Condition, Lock
+
+import numpy as np
+
+from Stores.sceneStore import NodeKind
+from renderer.clustered_lights import LIGHT_RANGE_SCALE, pack_lights
+
+# 单位立方体包围球半径
+UNIT_RADIUS = 0.87
+# LOD 切换阈值: 包围球在屏幕上的高度占比
+LOD_THRESHOLDS = (0.25, 0.05)
+
+
+@dataclasses.dataclass(frozen=True)
+class SceneSnapshot:
+    """某一时刻场景数组的只读副本, 供工作线程读取, 主线程可以继续修改场景"""
+    version: int
+    parents: np.ndarray
+    alive: np.ndarray
+    kinds: np.ndarray
+    transforms: np.ndarray
+    mesh_ids: np.ndarray
+    material_ids: np.ndarray
+
+    @classmethod
+    def capture(cls, scene, version):
+        arrays = [scene.parents, scene.alive, scene.kinds, scene.transforms, scene.mesh_ids, scene.material_ids]
+        copies = []
+        for array in arrays:
+            array = array.copy()
+            array.flags.writeable = False
+            copies.append(array)
+        return cls(version, *copies)
+
+
+@dataclasses.dataclass(frozen=True)
+class CameraInput:
+    name: str
+    view: np.ndarray
+    projection: np.ndarray
+    height: int
+
+
+@dataclasses.dataclass(frozen=True)
+class ViewPacket:
+    """一个视口的绘制列表, 已按 网格 -> 材质 -> 深度 排序"""
+    view: np.ndarray
+    projection: np.ndarray
+    nodes: np.ndarray
+    models: np.ndarray  # (K, 4, 4) 世界矩阵, 行向量约定
+    mesh_ids: np.ndarray
+    material_ids: np.ndarray
+    lods: np.ndarray
+
+
+@dataclasses.dataclass(frozen=True)
+class RenderPacket:
+    """一帧的渲染数据, 生成后不再修改, 主线程提交时工作线程可以同时生成下一帧"""
+    frame: int
+    scene_version: int
+    views: dict
+    build_ms: float
+    lights: np.ndarray  # (L, LIGHT_SIZE) 场景灯光节点的世界空间参数
+    caster_nodes: np.ndarray  # 所有网格节点, 不经过视锥裁剪, 用于阴影
+    caster_models: np.ndarray
+    caster_mesh_ids: np.ndarray
+
+
+def local_matrices(transforms):
+    """由 位置/旋转(角度)/缩放 计算局部矩阵 (N, 4, 4), 行向量约定: p' = p @ M"""
+    count = len(transforms)
+    rx, ry, rz = np.radians(transforms[:, 3:6]).T
+    cx, sx = np.cos(rx), np.sin(rx)
+    cy, sy = np.cos(ry), np.sin(ry)
+    cz, sz = np.cos(rz), np.sin(rz)
+    # 依次绕 x, y, z 旋转
+    rotation = np.empty((count, 3, 3), dtype=np.float32)
+    rotation[:, 0, 0] = cy * cz
+    rotation[:, 0, 1] = cy * sz
+    rotation[:, 0, 2] = -sy
+    rotation[:, 1, 0] = sx * sy * cz - cx * sz
+    rotation[:, 1, 1] = sx * sy * sz + cx * cz
+    rotation[:, 1, 2] = sx * cy
+    rotation[:, 2, 0] = cx * sy * cz + sx * sz
+    rotation[:, 2, 1] = cx * sy * sz - sx * cz
+    rotation[:, 2, 2] = cx * cy
+
+    matrices = np.zeros((count, 4, 4), dtype=np.float32)
+    matrices[:, :3, :3] = transforms[:, 6:9, None] * rotation
+    matrices[:, 3, :3] = transforms[:, :3]
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
+def world_matrices(parents, transforms):
+    """逐层传播父节点变换, 每层一次批量矩阵乘法"""
+    world = local_matrices(transforms)
+    depth = np.zeros(len(parents), dtype=np.int32)
+    current = parents.astype(np.int64)
+    while True:
+        has_parent = current >= 0
+        if not has_parent.any():
+            break
+        depth[has_parent] += 1
+        current = np.where(has_parent, parents[np.maximum(current, 0)], -1)
+
+    order = np.argsort(depth, kind="stable")
+    bounds = np.searchsorted(depth[order], np.arange(1, depth.max(initial=0) + 2))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        ids = order[lo:hi]
+        world[ids] = world[ids] @ world[parents[ids]]
+    return world
+
+
+def frustum_planes(view, projection):
+    """视锥的 6 个平面 (6, 4), 法线朝内且已归一化"""
+    m = view @ projection
+    planes = np.array([
+        m[:, 3] + m[:, 0], m[:, 3] - m[:, 0],
+        m[:, 3] + m[:, 1], m[:, 3] - m[:, 1],
+        m[:, 3] + m[:, 2], m[:, 3] - m[:, 2],
+    ], dtype=np.float32)
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+class ScenePipeline:
+    """场景更新与裁剪阶段: 后台线程计算世界矩阵、视锥裁剪、LOD 和绘制排序
+
+    主线程每帧提交下一帧的输入并取走最近完成的渲染包(双缓冲), 不等待工作线程。
+    输入没有变化时不会重新计算, 取到的仍是同一个渲染包对象。
+    """
+
+    def __init__(self):
+        self._condition = Condition()
+        self._pending = None
+        self._last_key = None
+        self._front = None
+        self._frame = 0
+        # 世界矩阵只在场景快照变化时重新计算; flush 和工作线程不能同时修改这份缓存
+        self._build_lock = Lock()
+        self._world_version = None
+        self._world = None
+        self._running = True
+        self._thread = None
+
+    def submit(self, snapshot, cameras):
+        """提交下一帧的输入; 与上次相同则忽略"""
+        key = (snapshot.version, tuple((c.name, c.view.tobytes(), c.projection.tobytes(), c.height) for c in cameras))
+        with self._condition:
+            if key == self._last_key:
+                return
+            self._last_key = key
+            self._frame += 1
+            self._pending = (self._frame, snapshot, cameras)
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="ScenePipeline", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def acquire(self):
+        """返回最近完成的渲染包, 还没有时返回 None"""
+        with self._condition:
+            return self._front
+
+    def flush(self, scene_version=None):
+        """同步生成尚未处理的输入, 第一帧或打开项目后避免显示空白
+
+        给出 scene_version 时, 如果工作线程已经取走了这份输入, 等它发布该版本的渲染包,
+        保证返回的渲染包与当前场景一致 (旧场景的下标不能用于新场景)。
+        """
+        with self._condition:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            self._publish(self.build(*pending))
+        with self._condition:
+            while scene_version is not None and self._running and (
+                    self._front is None or self._front.scene_version < scene_version):
+                self._condition.wait()
+            return self._front
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and self._running:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                pending, self._pending = self._pending, None
+            self._publish(self.build(*pending))
+
+    def _publish(self, packet):
+        with self._condition:
+            # flush 和工作线程可能同时完成, 只保留较新的一帧
+            if self._front is None or packet.frame > self._front.frame:
+                self._front = packet
+            self._condition.notify_all()
+
+    def build(self, frame, snapshot, cameras):
+        start = time.perf_counter()
+        with self._build_lock:
+            if snapshot.version != self._world_version:
+                self._world = world_matrices(snapshot.parents, snapshot.transforms)
+                self._world_version = snapshot.version
+            world = self._world
+
+        meshes = np.flatnonzero(snapshot.alive & (snapshot.kinds == NodeKind.MESH) & (snapshot.mesh_ids >= 0))
+        models = world[meshes]
+        caster_mesh_ids = snapshot.mesh_ids[meshes]
+        centers = models[:, 3, :3]
+        radii = np.linalg.norm(models[:, :3, :3], axis=2).max(axis=1) * UNIT_RADIUS
+
+        # 灯光节点: 白色点光源, 影响半径随缩放变化
+        light_world = world[np.flatnonzero(snapshot.alive & (snapshot.kinds == NodeKind.LIGHT))]
+        lights = pack_lights(
+            light_world[:, 3, :3], np.ones((len(light_world), 3), dtype=np.float32),
+            np.linalg.norm(light_world[:, :3, :3], axis=2).max(axis=1, initial=0.0) * LIGHT_RANGE_SCALE,
+        )
+        lights.flags.writeable = False
+        models.flags.writeable = False
+        caster_mesh_ids.flags.writeable = False
+
+        views = {}
+        for camera in cameras:
+            planes = frustum_planes(camera.view, camera.projection)
+            visible = np.all(centers @ planes[:, :3].T + planes[:, 3] >= -radii[:, None], axis=1)
+            ids = meshes[visible]
+            view_centers = np.hstack([centers[visible], np.ones((len(ids), 1), dtype=np.float32)]) @ camera.view
+            depth = np.maximum(-view_centers[:, 2], 1e-3)
+
+            # 包围球投影高度占视口高度的比例决定 LOD, 正交投影与深度无关
+            perspective = camera.projection[3, 3] == 0.0
+            screen = radii[visible] * camera.projection[1, 1] / (depth if perspective else 1.0)
+            lods = np.searchsorted(-np.asarray(LOD_THRESHOLDS), -screen).astype(np.uint8)
+
+            mesh_ids = snapshot.mesh_ids[ids]
+            material_ids = snapshot.material_ids[ids]
+            order = np.lexsort((depth, material_ids, mesh_ids))
+            packet = ViewPacket(
+                camera.view, camera.projection, ids[order], models[visible][order],
+                mesh_ids[order], material_ids[order], lods[order],
+            )
+            for array in (packet.nodes, packet.models, packet.mesh_ids, packet.material_ids, packet.lods):
+                array.flags.writeable = False
+            views[camera.name] = packet
+
+        return RenderPacket(frame, snapshot.version, views, (time.perf_counter() - start) * 1000.0, lights,
+                            meshes, models, caster_mesh_ids)
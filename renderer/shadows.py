@@ -0,0 +1,291 @@
+import math
+
+import numpy as np
+import OpenGL.GL as gl
+import pyrr
+
+from renderer import gl_resources
+from renderer.scene_pipeline import UNIT_RADIUS
+
+SHADOW_SIZE = 2048
+# 静态阴影按 4x4 区块失效和重绘
+SHADOW_TILES = 4
+# 节点停止移动这么多帧后才算回到静态, 拖动过程中不会反复重绘静态阴影
+SETTLE_FRAMES = 30
+# 阴影贴图的纹理单元
+SHADOW_UNIT = 4
+
+
+def caster_bounds(models):
+    """投射体的包围球 (centers (N, 3), radii (N,))"""
+    return models[:, 3, :3], np.linalg.norm(models[:, :3, :3], axis=2).max(axis=1, initial=0.0) * UNIT_RADIUS
+
+
+class ShadowMap:
+    """主光源的阴影贴图, 分为缓存的静态部分和每帧的动态部分
+
+    静态投射体只在自身或光源移动时, 按受影响的区块重绘到静态深度纹理;
+    有动态投射体(最近移动过的节点)时, 每帧把静态深度复制一份, 只在副本上画动态投射体。
+    光源按指向场景中心的平行光处理, 正交投影覆盖场景的包围球。
+    """
+
+    def __init__(self):
+        self.static_fbo = self.frame_fbo = None
+        self.static_depth = self.frame_depth = None
+        self.shader = None
+        self.light_space = np.identity(4, dtype=np.float32)
+        self.dirty_tiles = np.ones((SHADOW_TILES, SHADOW_TILES), dtype=bool)
+        self._frame = 0
+        self._light_key = None
+        self._scene_version = None
+        self._animated = None
+        # 上一次看到的投射体, 按节点 id 排序
+        self._nodes = np.zeros(0, dtype=np.int64)
+        self._models = np.zeros((0, 4, 4), dtype=np.float32)
+        self._mesh_ids = np.zeros(0, dtype=np.int32)
+        self._moved_frame = np.zeros(0, dtype=np.int64)
+        self._settling = np.zeros(0, dtype=bool)
+        # 统计: 本帧重绘的静态区块数和动态投射体数
+        self.redrawn_tiles = 0
+        self.dynamic_count = 0
+        self.texture_id = None
+
+    def create(self, create_shader):
+        self.shader = create_shader(SHADOW_VERTEX_SHADER, SHADOW_FRAGMENT_SHADER, owner=self)
+        self.static_fbo, self.static_depth = self.__create_target("static")
+        self.frame_fbo, self.frame_depth = self.__create_target("frame")
+        self.texture_id = self.static_depth
+
+    def __create_target(self, label):
+        texture = gl_resources.create("texture", self, f"{label} depth", gl_resources.texture_bytes(SHADOW_SIZE, SHADOW_SIZE))
+        gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_DEPTH_COMPONENT24, SHADOW_SIZE, SHADOW_SIZE,
+                        0, gl.GL_DEPTH_COMPONENT, gl.GL_FLOAT, None)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+        # 阴影贴图范围之外视为受光
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_BORDER)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_BORDER)
+        gl.glTexParameterfv(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_BORDER_COLOR, [1.0, 1.0, 1.0, 1.0])
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_COMPARE_MODE, gl.GL_COMPARE_REF_TO_TEXTURE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_COMPARE_FUNC, gl.GL_LEQUAL)
+
+        framebuffer = gl_resources.create("framebuffer", self, label)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, framebuffer)
+        gl.glFramebufferTexture2D(gl.GL_FRAMEBUFFER, gl.GL_DEPTH_ATTACHMENT, gl.GL_TEXTURE_2D, texture, 0)
+        gl.glDrawBuffer(gl.GL_NONE)
+        gl.glReadBuffer(gl.GL_NONE)
+        if gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER) != gl.GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("阴影帧缓冲不完整")
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        # 静态部分在第一次更新时整体绘制
+        self.dirty_tiles[:] = True
+        return framebuffer, texture
+
+    def __update_light(self, light_pos, centers, radii):
+        """场景包围球按 2 的幂取整, 编辑时包围球的小变化不会让整张静态阴影失效"""
+        if len(centers):
+            lo = (centers - radii[:, None]).min(axis=0)
+            hi = (centers + radii[:, None]).max(axis=0)
+            center = (lo + hi) * 0.5
+            radius = max(float(np.linalg.norm(hi - lo)) * 0.5, 1.0)
+        else:
+            center, radius = np.zeros(3, dtype=np.float32), 1.0
+        radius = 2.0 ** math.ceil(math.log2(radius))
+        center = np.round(center / (radius / 8.0)) * (radius / 8.0)
+        key = (*np.asarray(light_pos).tolist(), *center.tolist(), radius)
+        if key == self._light_key:
+            return
+        self._light_key = key
+
+        direction = np.asarray(light_pos, dtype=np.float64) - center
+        length = np.linalg.norm(direction)
+        direction = direction / length if length > 1e-6 else np.array([0.0, 1.0, 0.0])
+        up = np.array([0.0, 0.0, 1.0]) if abs(direction[1]) > 0.99 else np.array([0.0, 1.0, 0.0])
+        eye = center + direction * radius * 2.0
+        view = pyrr.matrix44.create_look_at(eye, center, up)
+        projection = pyrr.matrix44.create_orthogonal_projection(-radius, radius, -radius, radius, radius * 0.5, radius * 3.5)
+        self.light_space = (view @ projection).astype(np.float32)
+        self._radius = radius
+        self.dirty_tiles[:] = True
+
+    def __tile_ranges(self, centers, radii):
+        """包围球在阴影贴图上覆盖的区块范围 (x0, x1, y0, y1), 完全在贴图之外的为空范围"""
+        ndc = (np.hstack([centers, np.ones((len(centers), 1), dtype=np.float32)]) @ self.light_space)[:, :2]
+        extent = (radii / self._radius)[:, None]
+        lo = np.floor((ndc - extent + 1.0) * 0.5 * SHADOW_TILES).astype(np.int64)
+        hi = np.floor((ndc + extent + 1.0) * 0.5 * SHADOW_TILES).astype(np.int64)
+        inside = np.all((hi >= 0) & (lo < SHADOW_TILES), axis=1)
+        lo = np.clip(lo, 0, SHADOW_TILES - 1)
+        hi = np.clip(hi, 0, SHADOW_TILES - 1)
+        return lo, hi, inside
+
+    def __invalidate(self, models):
+        if not len(models):
+            return
+        lo, hi, inside = self.__tile_ranges(*caster_bounds(models))
+        for (x0, y0), (x1, y1) in zip(lo[inside], hi[inside]):
+            self.dirty_tiles[y0:y1 + 1, x0:x1 + 1] = True
+
+    def __track(self, nodes, models, mesh_ids):
+        """与上一次的投射体比较, 移动、换了网格、新增和删除的节点所在区块失效"""
+        old_nodes, old_models = self._nodes, self._models
+        _, old_index, new_index = np.intersect1d(old_nodes, nodes, assume_unique=True, return_indices=True)
+        moved = np.any(old_models[old_index] != models[new_index], axis=(1, 2))
+        moved |= self._mesh_ids[old_index] != mesh_ids[new_index]
+        removed = np.setdiff1d(np.arange(len(old_nodes)), old_index, assume_unique=True)
+
+        # 原来属于静态部分的节点: 旧位置的阴影要擦掉, 新位置在停止移动后再画进静态部分
+        was_static = ~self._settling
+        self.__invalidate(old_models[old_index[moved & was_static[old_index]]])
+        self.__invalidate(old_models[removed[was_static[removed]]])
+
+        moved_frame = np.full(len(nodes), self._frame, dtype=np.int64)
+        settling = np.ones(len(nodes), dtype=bool)
+        still = ~moved
+        moved_frame[new_index[still]] = self._moved_frame[old_index[still]]
+        settling[new_index[still]] = self._settling[old_index[still]]
+        if not len(old_nodes):
+            # 第一次看到的场景整体属于静态部分; 之后新增的节点和移动的一样, 稳定后再画进静态部分
+            settling[:] = False
+        self._nodes = nodes
+        self._models = models
+        self._mesh_ids = mesh_ids
+        self._moved_frame = moved_frame
+        self._settling = settling
+
+    def reset(self):
+        """换了场景后重新开始跟踪, 静态部分整体重绘"""
+        self._scene_version = None
+        self._nodes = np.zeros(0, dtype=np.int64)
+        self._models = np.zeros((0, 4, 4), dtype=np.float32)
+        self._mesh_ids = np.zeros(0, dtype=np.int32)
+        self._moved_frame = np.zeros(0, dtype=np.int64)
+        self._settling = np.zeros(0, dtype=bool)
+        self.dirty_tiles[:] = True
+
+    def update(self, packet, light_pos, rotation, draw):
+        """每帧渲染视口之前调用; rotation 为 None 表示没有动画, 否则所有投射体都是动态的
+
+        draw(shader, models, mesh_ids) 用给定着色器绘制一组模型矩阵, mesh_ids 为对应的网格。
+        """
+        self._frame += 1
+        nodes, models, mesh_ids = packet.caster_nodes, packet.caster_models, packet.caster_mesh_ids
+        if packet.scene_version != self._scene_version:
+            self._scene_version = packet.scene_version
+            self.__track(nodes, models, mesh_ids)
+
+        animated = rotation is not None
+        if animated != self._animated:
+            self._animated = animated
+            self.dirty_tiles[:] = True
+        self.__update_light(light_pos, *caster_bounds(models))
+
+        # 停止移动足够久的节点画回静态部分
+        settled = self._settling & (self._frame - self._moved_frame >= SETTLE_FRAMES)
+        if settled.any():
+            self._settling &= ~settled
+            self.__invalidate(models[settled])
+        dynamic = self._settling | animated
+        static_models, static_meshes = models[~dynamic], mesh_ids[~dynamic]
+        dynamic_models = models[dynamic] if not animated else rotation @ models
+        dynamic_meshes = mesh_ids[dynamic]
+        self.dynamic_count = len(dynamic_models)
+
+        previous_viewport = gl.glGetIntegerv(gl.GL_VIEWPORT)
+        gl.glUseProgram(self.shader)
+        gl.glUniformMatrix4fv(gl.glGetUniformLocation(self.shader, "lightSpace"), 1, gl.GL_FALSE, self.light_space)
+        gl.glViewport(0, 0, SHADOW_SIZE, SHADOW_SIZE)
+        gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_FILL)
+        gl.glEnable(gl.GL_POLYGON_OFFSET_FILL)
+        gl.glPolygonOffset(2.0, 4.0)
+
+        self.redrawn_tiles = int(self.dirty_tiles.sum())
+        if self.redrawn_tiles:
+            self.__draw_static(static_models, static_meshes, draw)
+
+        if len(dynamic_models):
+            # 在静态深度的副本上叠加动态投射体
+            gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, self.static_fbo)
+            gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, self.frame_fbo)
+            gl.glBlitFramebuffer(0, 0, SHADOW_SIZE, SHADOW_SIZE, 0, 0, SHADOW_SIZE, SHADOW_SIZE,
+                                 gl.GL_DEPTH_BUFFER_BIT, gl.GL_NEAREST)
+            gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.frame_fbo)
+            draw(self.shader, dynamic_models, dynamic_meshes)
+            self.texture_id = self.frame_depth
+        else:
+            self.texture_id = self.static_depth
+
+        gl.glDisable(gl.GL_POLYGON_OFFSET_FILL)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        gl.glViewport(*previous_viewport)
+
+    def __draw_static(self, models, mesh_ids, draw):
+        """只重绘失效的区块: 裁剪到区块, 只画覆盖该区块的投射体"""
+        lo, hi, inside = self.__tile_ranges(*caster_bounds(models))
+        tile = SHADOW_SIZE // SHADOW_TILES
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.static_fbo)
+        gl.glEnable(gl.GL_SCISSOR_TEST)
+        for y, x in zip(*np.nonzero(self.dirty_tiles)):
+            gl.glScissor(int(x) * tile, int(y) * tile, tile, tile)
+            gl.glClear(gl.GL_DEPTH_BUFFER_BIT)
+            overlaps = inside & (lo[:, 0] <= x) & (hi[:, 0] >= x) & (lo[:, 1] <= y) & (hi[:, 1] >= y)
+            if overlaps.any():
+                draw(self.shader, models[overlaps], mesh_ids[overlaps])
+        gl.glDisable(gl.GL_SCISSOR_TEST)
+        self.dirty_tiles[:] = False
+
+    def bind(self, shader):
+        gl.glActiveTexture(gl.GL_TEXTURE0 + SHADOW_UNIT)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glUniform1i(gl.glGetUniformLocation(shader, "shadowMap"), SHADOW_UNIT)
+        gl.glUniformMatrix4fv(gl.glGetUniformLocation(shader, "lightSpace"), 1, gl.GL_FALSE, self.light_space)
+
+    def cleanup(self):
+        if self.shader is None:
+            return
+        gl_resources.delete("framebuffer", self.static_fbo, self.frame_fbo)
+        gl_resources.delete("texture", self.static_depth, self.frame_depth)
+        gl_resources.delete("program", self.shader)
+        self.shader = None
+
+
+SHADOW_VERTEX_SHADER = """
+#version 330 core
+layout (location = 0) in vec3 aPos;
+
+uniform mat4 model;
+uniform mat4 lightSpace;
+
+void main()
+{
+    gl_Position = lightSpace * model * vec4(aPos, 1.0);
+}
+"""
+
+SHADOW_FRAGMENT_SHADER = """
+#version 330 core
+
+void main()
+{
+}
+"""
+
+# 片段着色器中的阴影查询 (3x3 PCF), 由 RenderEngine 的片段着色器拼接使用
+SHADOW_SHADER_FUNCTIONS = """
+        uniform sampler2DShadow shadowMap;
+
+        float shadowFactor(vec4 lightSpacePos)
+        {
+            vec3 coords = lightSpacePos.xyz / lightSpacePos.w * 0.5 + 0.5;
+            if (coords.z > 1.0)
+                return 1.0;
+            vec2 texel = 1.0 / vec2(textureSize(shadowMap, 0));
+            float lit = 0.0;
+            for (int x = -1; x <= 1; x++)
+                for (int y = -1; y <= 1; y++)
+                    lit += texture(shadowMap, vec3(coords.xy + vec2(x, y) * texel, coords.z));
+            return lit / 9.0;
+        }
+"""
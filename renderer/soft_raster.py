@@ -0,0 +1,297 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyrr
+
+from Stores.sceneStore import TextureData
+from renderer.ds_engine import SHADING_SOLID, SHADING_UNLIT
+from renderer.geometry import cube_vertices, cube_indices
+from renderer.materials import DEFAULT_MATERIAL
+from renderer.scene_pipeline import CameraInput, SceneSnapshot, ScenePipeline
+from renderer.texture_cache import source_pixels
+
+TILE_SIZE = 32
+# RenderEngine 中软件渲染没有实现的设置, 界面据此提示
+UNSUPPORTED = ("Wireframe", "Show Normals", "Show Grid", "Mip Overlay", "shadows", "scene lights")
+# 每次与一个图块做边函数测试的三角形数, 限制 (三角形 x 像素) 临时数组的大小
+TRIANGLE_BATCH = 64
+NEAR_W = 1e-3
+
+
+def texture_pixels(texture):
+    """纹理解码为 (H, W, 3) float32, 与 GL 上传的行序一致 (第一行在下), 读取失败时为棋盘格"""
+    return source_pixels(texture)[..., :3].astype(np.float32) / 255.0
+
+
+def _normalize(vectors):
+    return vectors / (np.sqrt(np.einsum("pc,pc->p", vectors, vectors))[:, None] + 1e-12)
+
+
+class SoftwareRenderer:
+    """纯 NumPy 软件光栅化: 与 RenderEngine 相同的场景、材质和着色模式, 不需要 GPU
+
+    三角形按 32x32 图块分箱, 各图块在线程池中并行做边函数和深度测试,
+    最后对整帧的可见像素统一做一次着色。输出 (H, W, 3) uint8 图像, 第一行在上。
+
+    支持材质颜色、金属度、粗糙度、每个材质的纹理、着色模式和背面剔除; 每个像素只保留最近的表面,
+    半透明表面只与背景混合。不支持阴影、场景中的其他灯光、线框和调试绘制 (见 UNSUPPORTED)。
+    """
+
+    def __init__(self, threads=None, texture="container2.png"):
+        self.threads = threads or os.cpu_count() or 4
+        self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix="SoftRaster")
+        # 复用场景更新阶段的世界矩阵计算、视锥裁剪和排序
+        self.pipeline = ScenePipeline()
+        self._snapshot = None
+        self._scene = None
+        # 未指定纹理的材质使用的默认纹理, 以及材质纹理的解码缓存 {纹理 id: (TextureData, 像素)}
+        self.texture = texture_pixels(TextureData("Default", texture))
+        self._textures = {}
+        self.light_mesh = (cube_vertices().reshape(-1, 8), cube_indices())
+        # 最近一帧的统计
+        self.triangle_count = 0
+
+    def _snapshot_for(self, scene):
+        previous = self._snapshot
+        if (previous is not None and scene is self._scene
+                and len(previous.transforms) == scene.node_count
+                and np.array_equal(previous.alive, scene.alive)
+                and np.array_equal(previous.transforms, scene.transforms)):
+            return previous
+        self._scene = scene
+        self._snapshot = SceneSnapshot.capture(scene, previous.version + 1 if previous is not None else 0)
+        return self._snapshot
+
+    def render(self, scene, viewport, time, settings, width=None, height=None):
+        """settings 提供灯光和渲染开关(与 RenderEngine 的属性同名), viewport 提供相机"""
+        width = width or viewport.width
+        height = height or viewport.height
+        view = viewport.view_matrix().astype(np.float32)
+        projection = viewport.projection_matrix(width / height).astype(np.float32)
+        camera = CameraInput(viewport.name, view, projection, height)
+        packet = self.pipeline.build(0, self._snapshot_for(scene), [camera]).views[viewport.name]
+
+        triangles = self._gather(scene, packet, time, settings)
+        self.triangle_count = len(triangles[0])
+        image = np.empty((height, width, 3), dtype=np.float32)
+        image[:] = settings.background_color[:3]
+        if len(triangles[0]):
+            ids, weights = self._rasterize(triangles[0], view, projection, width, height, settings)
+            self._shade(image, ids, weights, triangles, scene, viewport, settings)
+        return (np.clip(image, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+
+    def _gather(self, scene, packet, time, settings):
+        """把可见节点的网格变换到世界空间, 返回 (位置, 法线, uv, 是否为光源, 材质 id) 五个三角形数组"""
+        rotation = pyrr.matrix44.create_from_axis_rotation(
+            np.array([0.5, 1.0, 0.0]), time * settings.rotation_speed
+        ).astype(np.float32)
+        groups = []
+        for mesh_id in np.unique(packet.mesh_ids):
+            mesh = scene.mesh(int(mesh_id))
+            instances = packet.mesh_ids == mesh_id
+            models = rotation @ packet.models[instances]
+            groups.append((mesh.vertices, mesh.indices, models, packet.material_ids[instances], False))
+
+        # 光源立方体, 矩阵与 RenderEngine 完全相同 (平移乘缩放), 两种渲染模式下位置一致
+        light = pyrr.matrix44.multiply(
+            pyrr.matrix44.create_from_translation(settings.light_pos),
+            pyrr.matrix44.create_from_scale(np.array([0.2, 0.2, 0.2])),
+        ).astype(np.float32)
+        groups.append((*self.light_mesh, light[None], np.full(1, -1), True))
+
+        positions, normals, uvs, unlit, materials = [], [], [], [], []
+        for vertices, indices, models, material_ids, is_light in groups:
+            corners = vertices[indices.reshape(-1, 3)]  # (T, 3, 8)
+            homogeneous = np.concatenate([corners[..., :3], np.ones(corners.shape[:2] + (1,), np.float32)], axis=2)
+            world = np.einsum("tvi,kij->ktvj", homogeneous, models)[..., :3]
+            # 法线使用逆转置矩阵, 行向量约定下为 n @ inv(M).T
+            normal_matrices = np.linalg.inv(models[:, :3, :3]).transpose(0, 2, 1)
+            normal = np.einsum("tvi,kij->ktvj", corners[..., 3:6], normal_matrices)
+            positions.append(world.reshape(-1, 3, 3))
+            normals.append(normal.reshape(-1, 3, 3))
+            uvs.append(np.broadcast_to(corners[..., 6:8], (len(models),) + corners[..., 6:8].shape).reshape(-1, 3, 2))
+            unlit.append(np.full(len(models) * len(corners), is_light))
+            # 三角形按实例排列, 每个实例的材质重复 T 次
+            materials.append(np.repeat(np.asarray(material_ids, dtype=np.int64), len(corners)))
+        return (np.concatenate(positions).astype(np.float32), np.concatenate(normals).astype(np.float32),
+                np.concatenate(uvs).astype(np.float32), np.concatenate(unlit), np.concatenate(materials))
+
+    def _rasterize(self, positions, view, projection, width, height, settings):
+        """返回每个像素命中的三角形 (H*W,) 和透视校正后的重心坐标 (H*W, 3), 未命中为 -1"""
+        count = len(positions)
+        homogeneous = np.concatenate([positions, np.ones((count, 3, 1), np.float32)], axis=2)
+        clip = homogeneous @ (view @ projection)
+        w = clip[..., 3]
+        # 不做近平面裁剪, 跨过相机的三角形直接丢弃
+        keep = np.all(w > NEAR_W, axis=1)
+        ndc = clip[..., :3] / np.where(keep[:, None], w, 1.0)[..., None]
+        screen_x = (ndc[..., 0] + 1.0) * 0.5 * width
+        screen_y = (1.0 - ndc[..., 1]) * 0.5 * height
+        area = ((screen_x[:, 2] - screen_x[:, 0]) * (screen_y[:, 1] - screen_y[:, 0])
+                - (screen_y[:, 2] - screen_y[:, 0]) * (screen_x[:, 1] - screen_x[:, 0]))
+        keep &= np.abs(area) > 1e-8
+        if settings.backface_culling:
+            # 按这里的边函数定义, 屏幕 y 轴向下时逆时针(正面)三角形的有向面积为正
+            keep &= area > 0
+
+        # 包围盒裁剪到屏幕, 并换算成图块范围
+        x_min = np.floor(screen_x.min(axis=1)).clip(0, width - 1)
+        x_max = np.ceil(screen_x.max(axis=1)).clip(0, width - 1)
+        y_min = np.floor(screen_y.min(axis=1)).clip(0, height - 1)
+        y_max = np.ceil(screen_y.max(axis=1)).clip(0, height - 1)
+        keep &= (screen_x.max(axis=1) >= 0) & (screen_x.min(axis=1) < width)
+        keep &= (screen_y.max(axis=1) >= 0) & (screen_y.min(axis=1) < height)
+        keep &= ~np.all(ndc[..., 2] > 1.0, axis=1)
+        tris = np.flatnonzero(keep)
+
+        tiles_x = (width + TILE_SIZE - 1) // TILE_SIZE
+        tile_x0 = (x_min[tris] // TILE_SIZE).astype(np.int64)
+        tile_x1 = (x_max[tris] // TILE_SIZE).astype(np.int64)
+        tile_y0 = (y_min[tris] // TILE_SIZE).astype(np.int64)
+        tile_y1 = (y_max[tris] // TILE_SIZE).astype(np.int64)
+        spans_x = tile_x1 - tile_x0 + 1
+        counts = spans_x * (tile_y1 - tile_y0 + 1)
+
+        # 展开 (三角形, 图块) 对并按图块排序
+        owner = np.repeat(np.arange(len(tris)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        tile = (tile_y0[owner] + local // spans_x[owner]) * tiles_x + tile_x0[owner] + local % spans_x[owner]
+        order = np.argsort(tile, kind="stable")
+        tile, binned = tile[order], tris[owner[order]]
+        bounds = np.flatnonzero(np.diff(tile)) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [len(tile)]])
+
+        hit = np.full(height * width, -1, dtype=np.int64)
+        weights = np.zeros((height * width, 3), dtype=np.float32)
+        setup = (screen_x, screen_y, ndc[..., 2], w)
+        jobs = [
+            self._executor.submit(self._raster_tile, int(tile[s]), binned[s:e], setup, width, height,
+                                  tiles_x, hit, weights)
+            for s, e in zip(starts, ends) if e > s
+        ]
+        for job in jobs:
+            job.result()
+        return hit, weights
+
+    @staticmethod
+    def _raster_tile(tile, tris, setup, width, height, tiles_x, hit, weights):
+        """对一个图块做边函数和深度测试; 各图块写入互不重叠的像素, 无需加锁"""
+        screen_x, screen_y, depth_ndc, w = setup
+        x0 = (tile % tiles_x) * TILE_SIZE
+        y0 = (tile // tiles_x) * TILE_SIZE
+        ys, xs = np.mgrid[y0:min(y0 + TILE_SIZE, height), x0:min(x0 + TILE_SIZE, width)]
+        pixels = (ys * width + xs).ravel()
+        px = xs.ravel().astype(np.float32) + 0.5
+        py = ys.ravel().astype(np.float32) + 0.5
+
+        depth = np.full(len(pixels), np.inf, dtype=np.float32)
+        best = np.full(len(pixels), -1, dtype=np.int64)
+        best_b = np.zeros((len(pixels), 3), dtype=np.float32)
+        columns = np.arange(len(pixels))
+        for start in range(0, len(tris), TRIANGLE_BATCH):
+            batch = tris[start:start + TRIANGLE_BATCH]
+            sx, sy, sz = screen_x[batch], screen_y[batch], depth_ndc[batch]
+
+            def edge(a, b):
+                return ((px[None] - sx[:, a, None]) * (sy[:, b, None] - sy[:, a, None])
+                        - (py[None] - sy[:, a, None]) * (sx[:, b, None] - sx[:, a, None]))
+
+            area = (sx[:, 2] - sx[:, 0]) * (sy[:, 1] - sy[:, 0]) - (sy[:, 2] - sy[:, 0]) * (sx[:, 1] - sx[:, 0])
+            inv_area = (1.0 / area)[:, None]
+            b0 = edge(1, 2) * inv_area
+            b1 = edge(2, 0) * inv_area
+            b2 = 1.0 - b0 - b1
+            inside = (b0 >= 0) & (b1 >= 0) & (b2 >= 0)
+            z = b0 * sz[:, 0, None] + b1 * sz[:, 1, None] + b2 * sz[:, 2, None]
+            z = np.where(inside & (z >= -1.0) & (z <= 1.0), z, np.inf)
+
+            nearest = np.argmin(z, axis=0)
+            z_min = z[nearest, columns]
+            closer = z_min < depth
+            if not closer.any():
+                continue
+            k = nearest[closer]
+            depth[closer] = z_min[closer]
+            best[closer] = batch[k]
+            best_b[closer] = np.stack([b0[k, columns[closer]], b1[k, columns[closer]], b2[k, columns[closer]]], axis=1)
+
+        covered = best >= 0
+        if covered.any():
+            # 屏幕空间重心坐标换算为透视校正的权重
+            inv_w = 1.0 / w[best[covered]]
+            corrected = best_b[covered] * inv_w
+            corrected /= corrected.sum(axis=1, keepdims=True)
+            hit[pixels[covered]] = best[covered]
+            weights[pixels[covered]] = corrected
+
+    def _texture(self, scene, texture_id):
+        """材质纹理的像素, 纹理对象替换后重新解码"""
+        texture = scene.texture(texture_id) if 0 <= texture_id < len(scene.textures) else None
+        if texture is None:
+            return self.texture
+        cached = self._textures.get(texture_id)
+        if cached is None or cached[0] is not texture:
+            cached = self._textures[texture_id] = (texture, texture_pixels(texture))
+        return cached[1]
+
+    def _sample(self, scene, material, uv):
+        """按各像素材质的纹理采样 (重复寻址, 最近点), v=0 对应纹理的第一行 (与 GL 一致)"""
+        textures = np.where(material >= 0, scene.material_textures[np.maximum(material, 0)], -1) \
+            if len(scene.material_textures) else np.full(len(material), -1)
+        result = np.empty((len(uv), 3), dtype=np.float32)
+        for texture_id in np.unique(textures):
+            pixels = np.flatnonzero(textures == texture_id)
+            texture = self._texture(scene, int(texture_id))
+            tex_h, tex_w = texture.shape[:2]
+            tx = np.floor(uv[pixels, 0] * tex_w).astype(np.int64) % tex_w
+            ty = np.floor(uv[pixels, 1] * tex_h).astype(np.int64) % tex_h
+            result[pixels] = texture[ty, tx]
+        return result
+
+    def _shade(self, image, hit, weights, triangles, scene, viewport, settings):
+        """与 RenderEngine 片段着色器相同的材质和主光源光照, 光源立方体直接输出灯光颜色"""
+        positions, normals, uvs, unlit, materials = triangles
+        covered = np.flatnonzero(hit >= 0)
+        ids = hit[covered]
+        b = weights[covered]
+        frag_pos = np.einsum("pvc,pv->pc", positions[ids], b)
+        normal = _normalize(np.einsum("pvc,pv->pc", normals[ids], b))
+        uv = np.einsum("pvc,pv->pc", uvs[ids], b)
+
+        # 材质参数: 颜色(3) 金属度 粗糙度 不透明度, 材质 id 为 -1 时使用默认材质
+        material = materials[ids]
+        table = np.concatenate([np.asarray([DEFAULT_MATERIAL], dtype=np.float32), scene.materials])
+        params = table[np.clip(material + 1, 0, len(table) - 1)]
+        color, metallic, roughness, opacity = params[:, 0:3], params[:, 3:4], params[:, 4:5], params[:, 5:6]
+        albedo = self._sample(scene, material, uv) * color
+        view_dir = _normalize(viewport.camera_pos[None] - frag_pos)
+
+        if settings.shading_mode == SHADING_UNLIT:
+            result = albedo
+        elif settings.shading_mode == SHADING_SOLID:
+            facing = np.abs(np.einsum("pc,pc->p", normal, view_dir))[:, None]
+            result = color * (0.25 + 0.75 * facing)
+        else:
+            intensity = settings.light_intensity
+            light_dir = _normalize(settings.light_pos[None] - frag_pos)
+            n_dot_l = np.einsum("pc,pc->p", normal, light_dir)
+            diff = np.maximum(n_dot_l, 0.0)[:, None]
+            reflect = 2.0 * n_dot_l[:, None] * normal - light_dir
+            # 粗糙度换算为高光指数; 金属没有漫反射, 高光带材质颜色
+            shininess = np.exp2(10.0 * (1.0 - roughness) + 1.0)
+            spec = np.maximum(np.einsum("pc,pc->p", view_dir, reflect), 0.0)[:, None] ** shininess
+            specular_color = 1.0 + (albedo - 1.0) * metallic
+            diffuse_color = albedo * (1.0 - metallic)
+            result = intensity * (0.2 * albedo + 0.5 * diff * diffuse_color + spec * specular_color)
+
+        # 每个像素只有最近的表面, 半透明只能与背景混合
+        background = image.reshape(-1, 3)[covered]
+        result = result * opacity + background * (1.0 - opacity)
+        result[unlit[ids]] = settings.light_color * settings.light_intensity
+        image.reshape(-1, 3)[covered] = result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        self.pipeline.stop()
@@ -0,0 +1,167 @@
+import collections
+import ctypes
+
+import numpy as np
+import OpenGL.GL as gl
+
+from renderer import gl_resources
+
+# 环形缓冲的初始容量; 一帧写入的数据超过容量时翻倍
+DEFAULT_CAPACITY = 4 * 1024 * 1024
+# 持久映射时等待最早一帧的栅栏的超时 (纳秒)
+WAIT_TIMEOUT = 1_000_000_000
+
+
+def _overlaps(segments, lo, hi):
+    return any(start < hi and lo < end for start, end in segments)
+
+
+class StreamBuffer:
+    """每帧动态数据的上传分配器: 从一个大环形缓冲中顺序切出区间
+
+    支持 glBufferStorage 时整个缓冲持久映射, NumPy 数组直接复制进映射内存;
+    否则每次写入用 GL_MAP_UNSYNCHRONIZED_BIT 映射对应区间。每帧结束插入栅栏,
+    GPU 还在读取的区间不会被覆盖: 持久映射时等待最早一帧的栅栏, 否则换一个同样大小的新缓冲
+    从头开始, 旧缓冲延迟释放。本帧已写入的区间 (例如纹理缓冲的区间视图) 仍然引用旧缓冲,
+    所以不能用 glBufferData 原地孤立。这样写入下一帧的数据从不等待 GPU 读取上一帧。
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.buffer = 0
+        self.persistent = False
+        # 纹理缓冲能否引用缓冲的一段 (glTexBufferRange), 以及偏移的对齐要求
+        self.texture_ranges = False
+        self.texture_alignment = 256
+        self.head = 0
+        self._memory = None
+        # 本帧写入的区间, 以及已提交的各帧 (栅栏, 区间)
+        self._segments = []
+        self._inflight = collections.deque()
+        # 统计: 上一帧写入的字节数, 等待 GPU 和换新缓冲 (孤立) 的次数
+        self.frame_bytes = 0
+        self.last_frame_bytes = 0
+        self.stalls = 0
+        self.orphans = 0
+        self.created = False
+
+    def create(self):
+        self.persistent = bool(gl.glBufferStorage)
+        self.texture_ranges = bool(gl.glTexBufferRange)
+        if self.texture_ranges:
+            self.texture_alignment = int(gl.glGetIntegerv(gl.GL_TEXTURE_BUFFER_OFFSET_ALIGNMENT))
+        self.__allocate_storage()
+        self.created = True
+
+    def __allocate_storage(self):
+        self.buffer = gl_resources.create("buffer", self, "stream ring", self.capacity)
+        gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, self.buffer)
+        if self.persistent:
+            flags = gl.GL_MAP_WRITE_BIT | gl.GL_MAP_PERSISTENT_BIT | gl.GL_MAP_COHERENT_BIT
+            gl.glBufferStorage(gl.GL_COPY_WRITE_BUFFER, self.capacity, None, flags)
+            address = gl.glMapBufferRange(gl.GL_COPY_WRITE_BUFFER, 0, self.capacity, flags)
+            self._memory = np.frombuffer((ctypes.c_ubyte * self.capacity).from_address(address), dtype=np.uint8)
+        else:
+            gl.glBufferData(gl.GL_COPY_WRITE_BUFFER, self.capacity, None, gl.GL_STREAM_DRAW)
+        gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, 0)
+        self.head = 0
+        self._segments = []
+
+    def begin_frame(self):
+        """每帧开始时调用: 给上一帧写入的区间插入栅栏, 回收 GPU 已经读完的区间"""
+        if self._segments:
+            self._inflight.append((gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0), self._segments))
+            self._segments = []
+        self.__retire()
+        self.last_frame_bytes, self.frame_bytes = self.frame_bytes, 0
+
+    def allocate(self, nbytes, alignment=16):
+        """切出 nbytes 字节的区间, 返回偏移; 区间在本帧的命令执行完之前不会被复用"""
+        while True:
+            offset = -(-self.head // alignment) * alignment
+            if offset + nbytes > self.capacity:
+                offset = 0
+            end = offset + nbytes
+            if end > self.capacity or _overlaps(self._segments, offset, end):
+                # 一帧的数据放不下, 换一个更大的缓冲
+                self.__grow(max(self.capacity * 2, gl_resources.buffer_bucket(nbytes)))
+                continue
+            if any(_overlaps(segments, offset, end) for _, segments in self._inflight):
+                self.__retire()
+                if any(_overlaps(segments, offset, end) for _, segments in self._inflight):
+                    self.__reclaim()
+                continue
+            break
+        self.head = end
+        if self._segments and self._segments[-1][0] <= offset:
+            self._segments[-1][1] = end
+        else:
+            self._segments.append([offset, end])
+        self.frame_bytes += nbytes
+        return offset
+
+    def write(self, array, alignment=16):
+        """把数组写入环形缓冲, 返回偏移; 数组直接复制到映射内存, 不经过中间缓冲"""
+        data = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+        offset = self.allocate(data.nbytes, alignment)
+        if not data.nbytes:
+            return offset
+        if self.persistent:
+            self._memory[offset:offset + data.nbytes] = data
+            return offset
+        gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, self.buffer)
+        # 区间已由栅栏保证空闲, 不需要驱动同步
+        flags = gl.GL_MAP_WRITE_BIT | gl.GL_MAP_INVALIDATE_RANGE_BIT | gl.GL_MAP_UNSYNCHRONIZED_BIT
+        address = gl.glMapBufferRange(gl.GL_COPY_WRITE_BUFFER, offset, data.nbytes, flags)
+        try:
+            np.frombuffer((ctypes.c_ubyte * data.nbytes).from_address(address), dtype=np.uint8)[:] = data
+        finally:
+            gl.glUnmapBuffer(gl.GL_COPY_WRITE_BUFFER)
+            gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, 0)
+        return offset
+
+    def __retire(self):
+        """不阻塞地移除栅栏已经触发的帧"""
+        while self._inflight:
+            fence, _ = self._inflight[0]
+            status = gl.glClientWaitSync(fence, 0, 0)
+            if status not in (gl.GL_ALREADY_SIGNALED, gl.GL_CONDITION_SATISFIED):
+                break
+            gl.glDeleteSync(fence)
+            self._inflight.popleft()
+
+    def __reclaim(self):
+        """环已写满而 GPU 还在读取: 持久映射时等待最早一帧, 否则换一个新缓冲"""
+        if self.persistent:
+            fence, _ = self._inflight.popleft()
+            gl.glClientWaitSync(fence, gl.GL_SYNC_FLUSH_COMMANDS_BIT, WAIT_TIMEOUT)
+            gl.glDeleteSync(fence)
+            self.stalls += 1
+            return
+        # 原地孤立会让本帧之前写入的区间失效, 与扩容一样换新缓冲, 旧缓冲等 GPU 用完后释放
+        self.__grow(self.capacity)
+        self.orphans += 1
+
+    def __grow(self, capacity):
+        # 本帧已经写入的数据仍在旧缓冲中, 旧缓冲延迟释放
+        self.__release()
+        self.capacity = capacity
+        self.__allocate_storage()
+
+    def __release(self):
+        self._memory = None
+        gl_resources.release("buffer", self.buffer)
+        self.buffer = 0
+        self.__drop_fences()
+
+    def __drop_fences(self):
+        for fence, _ in self._inflight:
+            gl.glDeleteSync(fence)
+        self._inflight.clear()
+
+    def cleanup(self):
+        if not self.created:
+            return
+        self.__release()
+        self._segments = []
+        self.created = False
@@ -0,0 +1,284 @@
+import dataclasses
+import hashlib
+import os
+import time
+
+import numpy as np
+import OpenGL.GL as gl
+from PIL import Image
+
+from Stores.sceneStore import TextureData
+from renderer import gl_resources
+from Utiles.chunkfile import ChunkAppender, ChunkReader, ChunkWriter
+
+# 烘焙方式变化时递增, 使旧的缓存文件失效
+COOK_VERSION = 1
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "imgui-client", "textures")
+
+# 驱动支持时可用的压缩格式: 内部格式和所需扩展
+COMPRESSIONS = {
+    "bc1": (0x83F0, "GL_EXT_texture_compression_s3tc"),  # COMPRESSED_RGB_S3TC_DXT1
+    "bc3": (0x83F3, "GL_EXT_texture_compression_s3tc"),  # COMPRESSED_RGBA_S3TC_DXT5
+    "bc7": (0x8E8C, "GL_ARB_texture_compression_bptc"),  # COMPRESSED_RGBA_BPTC_UNORM
+}
+
+
+def read_image(filename):
+    """读取图像为 uint8 数组 (第一行在下); 读取失败时返回棋盘格"""
+    try:
+        image = Image.open(filename)
+        if image.mode not in ("RGB", "RGBA"):
+            raise ValueError(f"不支持的图像格式: {image.mode}")
+        return np.array(image.transpose(Image.FLIP_TOP_BOTTOM), dtype=np.uint8)
+    except Exception:
+        # 紫青棋盘格
+        checker = (np.indices((64, 64)) // 8).sum(axis=0) % 2 == 0
+        return np.where(checker[..., None], [255, 0, 255], [0, 255, 255]).astype(np.uint8)
+
+
+def to_rgba(pixels):
+    """统一为 (h, w, 4) 的 RGBA8"""
+    pixels = np.asarray(pixels)
+    if pixels.dtype != np.uint8:
+        pixels = (np.clip(pixels, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+    if pixels.ndim == 2:
+        pixels = pixels[..., None]
+    channels = pixels.shape[2]
+    if channels == 4:
+        return pixels
+    if channels < 3:
+        pixels = np.repeat(pixels[..., :1], 3, axis=2)
+    alpha = np.full(pixels.shape[:2] + (1,), 255, dtype=np.uint8)
+    return np.concatenate([pixels[..., :3], alpha], axis=2)
+
+
+def source_pixels(texture):
+    """解码纹理源: 项目内嵌像素按图像行序保存, 否则从路径读取"""
+    if texture.pixels is not None:
+        return to_rgba(np.asarray(texture.pixels)[::-1])
+    return to_rgba(read_image(texture.path))
+
+
+def source_key(texture):
+    """缓存键: 内嵌像素按内容, 文件按路径、修改时间和大小, 不需要解码"""
+    digest = hashlib.sha1(f"{COOK_VERSION}:".encode())
+    if texture.pixels is not None:
+        pixels = np.ascontiguousarray(texture.pixels)
+        digest.update(f"{pixels.shape}:{pixels.dtype.str}:".encode())
+        digest.update(pixels.tobytes())
+    else:
+        path = os.path.abspath(texture.path)
+        try:
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+        except OSError:
+            digest.update(f"{path}:missing".encode())
+    return digest.hexdigest()
+
+
+def mip_chain_sizes(width, height):
+    """完整 mip 链各级的 (宽, 高)"""
+    sizes = [(width, height)]
+    while max(width, height) > 1:
+        width, height = max(width // 2, 1), max(height // 2, 1)
+        sizes.append((width, height))
+    return sizes
+
+
+def mip_chain(pixels):
+    """(h, w, 4) RGBA8 的完整 mip 链, 各级尺寸与 GL 的规则一致 (减半向下取整, 最小为 1)"""
+    levels = [np.ascontiguousarray(pixels)]
+    while max(pixels.shape[:2]) > 1:
+        height, width = pixels.shape[:2]
+        half_h, half_w = max(height // 2, 1), max(width // 2, 1)
+        if height % 2 == 0 and width % 2 == 0:
+            # 2x2 盒式滤波, 四舍五入
+            blocks = pixels.reshape(half_h, 2, half_w, 2, 4).astype(np.uint16)
+            pixels = ((blocks.sum(axis=(1, 3)) + 2) >> 2).astype(np.uint8)
+        else:
+            pixels = np.asarray(Image.fromarray(pixels).resize((half_w, half_h), Image.BOX))
+        levels.append(np.ascontiguousarray(pixels))
+    return levels
+
+
+@dataclasses.dataclass
+class TextureLoadStats:
+    """冷加载: 解码并烘焙; 热加载: 从缓存文件映射上传"""
+    cold_count: int = 0
+    cold_ms: float = 0.0
+    warm_count: int = 0
+    warm_ms: float = 0.0
+
+    def record(self, cold, seconds):
+        if cold:
+            self.cold_count += 1
+            self.cold_ms += seconds * 1000.0
+        else:
+            self.warm_count += 1
+            self.warm_ms += seconds * 1000.0
+
+    def average_ms(self, cold):
+        count, total = (self.cold_count, self.cold_ms) if cold else (self.warm_count, self.warm_ms)
+        return total / count if count else 0.0
+
+
+class CookedTexture:
+    """烘焙好的纹理: 以内存映射打开缓存文件, 各级数据在 close 之前直接从映射内存上传"""
+
+    def __init__(self, path, cold):
+        self.cold = cold
+        self.reader = ChunkReader(path)
+        try:
+            info = self.reader.read_json("info")
+        except Exception:
+            self.reader.close()
+            raise
+        self.width = info["width"]
+        self.height = info["height"]
+        self.levels = info["levels"]
+        self.compression = self.reader.read_json("compression") if "compression" in self.reader else None
+
+    def level(self, index):
+        """第 index 级的 RGBA8 像素 (h, w, 4)"""
+        return self.reader.view_array(f"rgba/{index}")
+
+    def compressed_level(self, index):
+        return self.reader.view_array(f"compressed/{index}")
+
+    def level_size(self, index):
+        return max(self.width >> index, 1), max(self.height >> index, 1)
+
+    def close(self):
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TextureCache:
+    """纹理烘焙缓存: 第一次使用时解码图像并生成完整 mip 链 (可选由驱动压缩), 写入缓存文件
+
+    之后的加载不再经过 Pillow 解码和 glGenerateMipmap, 直接映射缓存文件逐级上传。
+    压缩需要 GL 上下文, 烘焙和上传都在渲染线程进行。
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, compression="auto"):
+        self.cache_dir = cache_dir
+        # None 不压缩, "auto" 按是否有透明选择 bc1/bc3, 也可以指定 COMPRESSIONS 中的格式
+        self.compression = compression
+        self.stats = TextureLoadStats()
+        self._extensions = None
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".tex")
+
+    def open(self, source, compress=False):
+        """打开纹理源的烘焙结果, 缺失或损坏时先烘焙; source 为 TextureData 或文件路径"""
+        if isinstance(source, str):
+            source = TextureData(os.path.basename(source), source)
+        path = self.path(source_key(source))
+        cold = False
+        try:
+            cooked = CookedTexture(path, cold)
+        except (OSError, ValueError, KeyError):
+            cold = True
+            self.__cook(source, path)
+            cooked = CookedTexture(path, cold)
+
+        if compress and cooked.compression is None:
+            compression = self.__choose_compression(cooked)
+            if compression is not None:
+                # 已有未压缩的烘焙结果, 追加压缩后的各级数据
+                levels = [np.array(cooked.level(i)) for i in range(cooked.levels)]
+                cooked.close()
+                self.__append_compressed(path, levels, compression)
+                cooked = CookedTexture(path, cold)
+        return cooked
+
+    def load(self, source):
+        """加载为带完整 mip 链的 GL_TEXTURE_2D, 返回纹理 id"""
+        start = time.perf_counter()
+        with self.open(source, compress=self.compression is not None) as cooked:
+            texture_id = gl_resources.create("texture", self, source if isinstance(source, str) else source.name)
+            gl.glBindTexture(gl.GL_TEXTURE_2D, texture_id)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_REPEAT)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_REPEAT)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR_MIPMAP_LINEAR)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAX_LEVEL, cooked.levels - 1)
+            gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+            compression = cooked.compression
+            if compression is not None and not self.__supported(compression["name"]):
+                compression = None
+            size = 0
+            for index in range(cooked.levels):
+                width, height = cooked.level_size(index)
+                if compression is not None:
+                    data = cooked.compressed_level(index)
+                    gl.glCompressedTexImage2D(gl.GL_TEXTURE_2D, index, compression["format"],
+                                              width, height, 0, data.nbytes, data)
+                else:
+                    data = cooked.level(index)
+                    gl.glTexImage2D(gl.GL_TEXTURE_2D, index, gl.GL_RGBA8, width, height,
+                                    0, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, data)
+                size += data.nbytes
+                # 视图引用映射内存, 关闭文件之前释放
+                del data
+            gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+            gl_resources.set_size("texture", texture_id, size)
+            self.stats.record(cooked.cold, time.perf_counter() - start)
+        return texture_id
+
+    def __cook(self, source, path):
+        levels = mip_chain(source_pixels(source))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with ChunkWriter(path) as writer:
+            height, width = levels[0].shape[:2]
+            writer.write_json("info", {"name": source.name, "width": width, "height": height,
+                                       "levels": len(levels)})
+            for index, level in enumerate(levels):
+                writer.write_array(f"rgba/{index}", level)
+
+    def __append_compressed(self, path, levels, compression):
+        """由驱动压缩各级数据并读回, 之后的加载直接上传压缩块"""
+        internal_format = COMPRESSIONS[compression][0]
+        texture = gl_resources.create("texture", self, "compression")
+        gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        blocks = []
+        try:
+            for index, level in enumerate(levels):
+                height, width = level.shape[:2]
+                gl.glTexImage2D(gl.GL_TEXTURE_2D, index, internal_format, width, height,
+                                0, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, level)
+                if not gl.glGetTexLevelParameteriv(gl.GL_TEXTURE_2D, index, gl.GL_TEXTURE_COMPRESSED):
+                    return
+                size = gl.glGetTexLevelParameteriv(gl.GL_TEXTURE_2D, index, gl.GL_TEXTURE_COMPRESSED_IMAGE_SIZE)
+                data = np.empty(int(size), dtype=np.uint8)
+                gl.glGetCompressedTexImage(gl.GL_TEXTURE_2D, index, data)
+                blocks.append(data)
+        finally:
+            gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+            gl_resources.delete("texture", texture)
+
+        with ChunkAppender(path) as appender:
+            for index, data in enumerate(blocks):
+                appender.write_array(f"compressed/{index}", data)
+            appender.write_json("compression", {"name": compression, "format": internal_format})
+
+    def __choose_compression(self, cooked):
+        if self.compression == "auto":
+            # bc1 没有透明通道
+            compression = "bc1" if np.all(cooked.level(0)[..., 3] == 255) else "bc3"
+        else:
+            compression = self.compression
+        return compression if compression in COMPRESSIONS and self.__supported(compression) else None
+
+    def __supported(self, compression):
+        if self._extensions is None:
+            count = gl.glGetIntegerv(gl.GL_NUM_EXTENSIONS)
+            self._extensions = {gl.glGetStringi(gl.GL_EXTENSIONS, i).decode() for i in range(int(count))}
+        return COMPRESSIONS[compression][1] in self._extensions
@@ -0,0 +1,247 @@
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+import OpenGL.GL as gl
+from PIL import Image
+
+from renderer import gl_resources
+from renderer.texture_cache import mip_chain_sizes
+
+# 边长不超过该尺寸的级别总是驻留, 保证任何时候都有可采样的数据
+MIN_RESIDENT_SIZE = 64
+# 纹理数组占用的显存上限
+DEFAULT_BUDGET_MB = 256
+# 每帧最多上传的级别数, 避免一次上传太多造成卡顿
+UPLOADS_PER_FRAME = 2
+# 不再需要的细级别保留的帧数, 相机来回移动时不反复加载
+EVICT_FRAMES = 120
+
+
+def mesh_uv_density(mesh):
+    """网格每单位局部长度对应的 uv 长度: sqrt(uv 面积 / 表面积)"""
+    triangles = mesh.vertices[np.asarray(mesh.indices).reshape(-1, 3)]
+    positions, uvs = triangles[..., 0:3], triangles[..., 6:8]
+    area = np.linalg.norm(np.cross(positions[:, 1] - positions[:, 0], positions[:, 2] - positions[:, 0]), axis=1).sum()
+    du, dv = uvs[:, 1] - uvs[:, 0], uvs[:, 2] - uvs[:, 0]
+    uv_area = np.abs(du[:, 0] * dv[:, 1] - du[:, 1] * dv[:, 0]).sum()
+    return float(np.sqrt(uv_area / area)) if area > 0.0 else 1.0
+
+
+def wanted_levels(texture_sizes, uv_density, scales, clip_w, pixels_per_unit):
+    """每个物体需要的最细 mip 级别
+
+    texture_sizes: 纹理最大边长, uv_density: 网格的 uv 密度, scales: 模型最大缩放,
+    clip_w: 物体中心的裁剪空间 w, pixels_per_unit: w = 1 处每单位长度对应的像素数。
+    一个屏幕像素覆盖的纹素数为 2^level 时需要 level 级。
+    """
+    texels_per_unit = texture_sizes * uv_density / np.maximum(scales, 1e-6)
+    pixels = pixels_per_unit / np.maximum(clip_w, 1e-6)
+    ratio = np.maximum(texels_per_unit / pixels, 1.0)
+    return np.floor(np.log2(ratio)).astype(np.int32)
+
+
+def _level_bytes(width, height, layers):
+    return [w * h * 4 * layers for w, h in mip_chain_sizes(width, height)]
+
+
+def _read_level(cache, sources, size, level):
+    """工作线程: 从烘焙缓存读取所有层的一级数据, 尺寸不同的纹理缩放到该级尺寸"""
+    height, width = size
+    level_w, level_h = mip_chain_sizes(width, height)[level]
+    layers = []
+    for source in sources:
+        with cache.open(source) as cooked:
+            if (cooked.height, cooked.width) == size:
+                layers.append(np.array(cooked.level(level)))
+            else:
+                image = Image.fromarray(np.asarray(cooked.level(0))).resize((level_w, level_h), Image.BOX)
+                layers.append(np.asarray(image))
+    return np.ascontiguousarray(np.stack(layers))
+
+
+@dataclasses.dataclass
+class StreamedArray:
+    texture: int
+    width: int
+    height: int
+    sources: list
+    level_bytes: list
+    # 常驻的最细级别, 当前驻留的最细级别 (GL_TEXTURE_BASE_LEVEL)
+    tail: int
+    resident: int
+    # 本帧需要的级别, 以及延迟淘汰期间保留的级别
+    wanted: int = 0
+    hold: int = 0
+    hold_until: int = 0
+    # 预算限制后的目标级别
+    target: int = 0
+    loading: int = -1
+    future: object = None
+
+    @property
+    def levels(self):
+        return len(self.level_bytes)
+
+    def bytes_at(self, level):
+        return sum(self.level_bytes[level:])
+
+
+class TextureStreamer:
+    """纹理数组的 mip 流式加载: 只保留屏幕上需要的级别, 更细的级别在后台读取, 超出预算时淘汰
+
+    每帧渲染时用 request 报告各数组需要的级别, 下一帧开始时 update 统一处理加载和淘汰。
+    驻留范围通过 GL_TEXTURE_BASE_LEVEL 控制, 未驻留的级别不占显存。
+    """
+
+    def __init__(self, cache, budget_mb=DEFAULT_BUDGET_MB):
+        self.cache = cache
+        self.budget = budget_mb * 1024 * 1024
+        self.arrays = []
+        self.frame = 0
+        # 各视口最近一次渲染时的请求 {视口: {数组: 级别}}, 没有重绘的视口沿用上一次的请求
+        self._requests = {}
+        self._pool = ThreadPoolExecutor(2, thread_name_prefix="TextureStreamer")
+        # 统计
+        self.resident_bytes = 0
+        self.uploaded_levels = 0
+
+    @property
+    def pending(self):
+        return sum(array.future is not None for array in self.arrays)
+
+    @property
+    def settled(self):
+        """没有正在加载的级别, 并且每个数组驻留的级别都等于目标级别"""
+        return all(array.future is None and array.resident == array.target for array in self.arrays)
+
+    def wait(self):
+        """阻塞等待后台正在读取的级别, 离线渲染在下一次 update 之前调用"""
+        wait([array.future for array in self.arrays if array.future is not None])
+
+    def create_array(self, size, sources):
+        """创建纹理数组, 只同步上传常驻的粗级别"""
+        height, width = size
+        sizes = mip_chain_sizes(width, height)
+        tail = next(i for i, (w, h) in enumerate(sizes) if max(w, h) <= MIN_RESIDENT_SIZE)
+        texture = gl_resources.create("texture", self, f"material array {width}x{height}")
+        gl.glBindTexture(gl.GL_TEXTURE_2D_ARRAY, texture)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_WRAP_S, gl.GL_REPEAT)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_WRAP_T, gl.GL_REPEAT)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR_MIPMAP_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_BASE_LEVEL, tail)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_MAX_LEVEL, len(sizes) - 1)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        for level in range(tail, len(sizes)):
+            self.__define_level(level, sizes[level], _read_level(self.cache, sources, size, level))
+        gl.glBindTexture(gl.GL_TEXTURE_2D_ARRAY, 0)
+
+        array = StreamedArray(texture, width, height, list(sources), _level_bytes(width, height, len(sources)),
+                              tail, tail, wanted=tail, hold=tail, target=tail)
+        self.arrays.append(array)
+        self.resident_bytes += array.bytes_at(tail)
+        gl_resources.set_size("texture", texture, array.bytes_at(tail))
+        return array
+
+    def reset(self, view):
+        """视口开始重绘或被删除时清除它的请求"""
+        self._requests.pop(view, None)
+
+    def request(self, view, index, levels):
+        """渲染视口 view 时报告数组 index 需要的级别, 取最细的"""
+        if len(levels):
+            requests = self._requests.setdefault(view, {})
+            level = int(np.min(levels))
+            requests[index] = min(level, requests.get(index, level))
+
+    def update(self):
+        """每帧一次: 按各视口的请求确定目标级别, 淘汰多余的级别, 调度和上传更细的级别
+
+        返回是否有级别上传或淘汰, 此时视口需要重绘
+        """
+        self.frame += 1
+        requests = {}
+        for view_requests in self._requests.values():
+            for index, level in view_requests.items():
+                requests[index] = min(level, requests.get(index, level))
+        changed = False
+        for index, array in enumerate(self.arrays):
+            array.wanted = min(max(requests.get(index, array.tail), 0), array.tail)
+            if array.wanted <= array.hold or self.frame > array.hold_until:
+                array.hold = array.wanted
+                array.hold_until = self.frame + EVICT_FRAMES
+            array.target = min(array.wanted, array.hold)
+        self.__apply_budget()
+
+        uploads = 0
+        for array in self.arrays:
+            if array.resident < array.target:
+                self.__evict(array)
+                changed = True
+            if array.future is not None and array.future.done() and uploads < UPLOADS_PER_FRAME:
+                data = array.future.result()
+                level, array.future, array.loading = array.loading, None, -1
+                # 加载期间目标变粗时丢弃结果
+                if level == array.resident - 1 and level >= array.target:
+                    self.__upload(array, level, data)
+                    uploads += 1
+                    changed = True
+            if array.future is None and array.resident > array.target:
+                # 从粗到细一级一级加载
+                array.loading = array.resident - 1
+                array.future = self._pool.submit(_read_level, self.cache, array.sources,
+                                                 (array.height, array.width), array.loading)
+        return changed
+
+    def __apply_budget(self):
+        """超出预算时, 反复把占用最大的数组的目标级别调粗一级"""
+        total = sum(array.bytes_at(array.target) for array in self.arrays)
+        while total > self.budget:
+            candidates = [array for array in self.arrays if array.target < array.tail]
+            if not candidates:
+                break
+            array = max(candidates, key=lambda a: a.level_bytes[a.target])
+            total -= array.level_bytes[array.target]
+            array.target += 1
+
+    def __upload(self, array, level, data):
+        gl.glBindTexture(gl.GL_TEXTURE_2D_ARRAY, array.texture)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        self.__define_level(level, mip_chain_sizes(array.width, array.height)[level], data)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_BASE_LEVEL, level)
+        gl.glBindTexture(gl.GL_TEXTURE_2D_ARRAY, 0)
+        array.resident = level
+        self.resident_bytes += array.level_bytes[level]
+        self.uploaded_levels += 1
+        gl_resources.set_size("texture", array.texture, array.bytes_at(level))
+
+    def __evict(self, array):
+        """先提高基础级别, 再把更细的级别重新定义为空图像以释放显存"""
+        gl.glBindTexture(gl.GL_TEXTURE_2D_ARRAY, array.texture)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_BASE_LEVEL, array.target)
+        for level in range(array.resident, array.target):
+            self.__define_level(level, (0, 0), None, layers=0)
+            self.resident_bytes -= array.level_bytes[level]
+        gl.glBindTexture(gl.GL_TEXTURE_2D_ARRAY, 0)
+        array.resident = array.target
+        gl_resources.set_size("texture", array.texture, array.bytes_at(array.resident))
+
+    @staticmethod
+    def __define_level(level, size, data, layers=None):
+        width, height = size
+        layers = len(data) if layers is None else layers
+        gl.glTexImage3D(gl.GL_TEXTURE_2D_ARRAY, level, gl.GL_RGBA8, width, height, layers,
+                        0, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, data)
+
+    def clear(self):
+        """释放全部纹理数组 (延迟到 GPU 用完之后); 正在读取的级别完成后直接丢弃"""
+        gl_resources.release("texture", *[array.texture for array in self.arrays])
+        self.arrays = []
+        self._requests = {}
+        self.resident_bytes = 0
+        self.uploaded_levels = 0
+
+    def shutdown(self):
+        self.clear()
+        self._pool.shutdown(wait=True)
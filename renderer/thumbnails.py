@@ -0,0 +1,427 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import OpenGL.GL as gl
+import pyrr
+from PIL import Image
+
+from renderer import gl_resources
+from renderer.geometry import sphere_geometry
+from renderer.readback import FrameReadback, ImageWriter
+
+THUMBNAIL_SIZE = 64
+ATLAS_COLUMNS = 8
+# 图集中的槽位数, 同时驻留的缩略图不超过该数量
+ATLAS_SLOTS = ATLAS_COLUMNS * ATLAS_COLUMNS
+# 每帧最多渲染的缩略图数, 滚动到大量新材质时分几帧完成
+BATCH_SIZE = 16
+# 渲染方式变化时递增, 使旧的磁盘缓存失效
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "imgui-client", "thumbnails")
+# 磁盘缓存的大小上限, 超过时按修改时间删除最久未使用的缩略图
+CACHE_LIMIT_MB = 64
+# 每写入这么多缩略图检查一次磁盘缓存大小
+TRIM_INTERVAL = 64
+# 材质参数保持不变这么久 (秒) 之后才写入磁盘缓存, 拖动滑块时的中间值不写盘
+SAVE_DELAY = 1.0
+BACKGROUND = (0.16, 0.16, 0.16)
+
+
+def thumbnail_key(scene, material_id, texture_hashes):
+    """材质缩略图的缓存键: 材质参数和纹理内容的哈希"""
+    digest = hashlib.sha1()
+    digest.update(f"{CACHE_VERSION}:{THUMBNAIL_SIZE}:".encode())
+    digest.update(np.ascontiguousarray(scene.materials[material_id], dtype=np.float32).tobytes())
+    texture = int(scene.material_textures[material_id])
+    if texture >= 0:
+        digest.update(texture_hashes(texture).encode())
+    return digest.hexdigest()
+
+
+def _load_cached(path):
+    try:
+        with Image.open(path) as image:
+            pixels = np.asarray(image.convert("RGB"), dtype=np.uint8)
+        # 读取时更新修改时间, 裁剪缓存时按最近使用淘汰
+        os.utime(path)
+    except OSError:
+        return None
+    return pixels
+
+
+def _save_cached(path, pixels):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = path + ".tmp"
+    Image.fromarray(pixels).save(temp, format="PNG")
+    os.replace(temp, path)
+
+
+def _save_region(slots, pixels):
+    """把读回的图集区域拆成各个缩略图写盘; slots 为 [(路径, 区域内 x, 区域内 y)], 像素第一行在下"""
+    for path, x, y in slots:
+        _save_cached(path, np.ascontiguousarray(pixels[y:y + THUMBNAIL_SIZE, x:x + THUMBNAIL_SIZE][::-1]))
+
+
+def trim_cache(directory, limit):
+    """删除最久未使用的缩略图, 直到缓存总大小不超过 limit 字节; 返回删除的文件数"""
+    entries = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if not name.endswith(".png"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+class ThumbnailRenderer:
+    """材质库缩略图: 只为本帧可见的行生成, 先查磁盘缓存, 缺失的在一次图集渲染中批量绘制
+
+    缩略图驻留在一张图集纹理中, 槽位按最近使用淘汰。读写磁盘在后台线程完成,
+    主线程每帧只做 GL 上传和渲染; 写盘前的读回经过像素缓冲, 不等待 GPU。
+    材质参数稳定 SAVE_DELAY 秒之后才写入磁盘缓存, 缓存总大小限制为 CACHE_LIMIT_MB。
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.cache_dir = CACHE_DIR
+        self.initialized = False
+        self.framebuffer = None
+        self.texture_id = None
+        self.renderbuffer = None
+        self.shader = None
+        self.vao = self.vbo = self.ebo = 0
+        self.index_count = 0
+        # 缓存键 -> 图集槽位, 按最近使用排序
+        self._slots = OrderedDict()
+        self._free = list(range(ATLAS_SLOTS))
+        self._requested = {}
+        self._loading = {}
+        self._pending_render = OrderedDict()
+        self._gl_textures = {}
+        self._texture_hashes = {}
+        self._io = ThreadPoolExecutor(2, thread_name_prefix="Thumbnails")
+        # 渲染后还没写盘的缩略图: 材质 id -> (缓存键, 渲染时间), 同一材质只保留最新的一张
+        self._unsaved = {}
+        self.save_delay = SAVE_DELAY
+        self.cache_limit = CACHE_LIMIT_MB * 1024 * 1024
+        self._saved_since_trim = 0
+        self.readback = FrameReadback(ImageWriter(2, _save_region))
+        # 统计: 本次运行中渲染和从缓存读取的数量
+        self.rendered = 0
+        self.loaded = 0
+
+    def initialize(self):
+        atlas = THUMBNAIL_SIZE * ATLAS_COLUMNS
+        self.framebuffer = gl_resources.create("framebuffer", self, "atlas")
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+
+        self.texture_id = gl_resources.create("texture", self, "atlas", gl_resources.texture_bytes(atlas, atlas, 3))
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGB, atlas, atlas,
+                        0, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, None)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+        gl.glFramebufferTexture2D(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0,
+                                  gl.GL_TEXTURE_2D, self.texture_id, 0)
+
+        self.renderbuffer = gl_resources.create("renderbuffer", self, "atlas depth", gl_resources.texture_bytes(atlas, atlas))
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, self.renderbuffer)
+        gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_DEPTH24_STENCIL8, atlas, atlas)
+        gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, gl.GL_DEPTH_STENCIL_ATTACHMENT,
+                                     gl.GL_RENDERBUFFER, self.renderbuffer)
+        if gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER) != gl.GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("缩略图帧缓冲不完整")
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+
+        self.shader = self.engine.create_shader(THUMBNAIL_VERTEX_SHADER, THUMBNAIL_FRAGMENT_SHADER, owner=self)
+
+        vertices, indices = sphere_geometry()
+        self.index_count = len(indices)
+        self.vao = gl_resources.create("vertex_array", self, "sphere")
+        self.vbo = gl_resources.create("buffer", self, "sphere vertices", vertices.nbytes)
+        self.ebo = gl_resources.create("buffer", self, "sphere indices", indices.nbytes)
+        gl.glBindVertexArray(self.vao)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, vertices.nbytes, vertices, gl.GL_STATIC_DRAW)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW)
+        for location, size, offset in ((0, 3, 0), (1, 3, 3), (2, 2, 6)):
+            gl.glVertexAttribPointer(location, size, gl.GL_FLOAT, gl.GL_FALSE, 8 * 4, gl.ctypes.c_void_p(offset * 4))
+            gl.glEnableVertexAttribArray(location)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glBindVertexArray(0)
+        # 上次运行留下的缓存可能超过上限
+        self._io.submit(trim_cache, self.cache_dir, self.cache_limit)
+        self.initialized = True
+
+    def _slot_uv(self, slot):
+        """图集中槽位的 uv0, uv1; 帧缓冲内容第一行在下, 显示时翻转 Y 轴"""
+        col, row = slot % ATLAS_COLUMNS, slot // ATLAS_COLUMNS
+        step = 1.0 / ATLAS_COLUMNS
+        return (col * step, (row + 1) * step), ((col + 1) * step, row * step)
+
+    def texture_hash(self, scene, texture_id):
+        texture = scene.texture(texture_id)
+        key = (id(scene), texture_id, id(texture))
+        if key not in self._texture_hashes:
+            digest = hashlib.sha1(f"{texture.name}:{texture.path}".encode())
+            if texture.pixels is not None:
+                digest.update(np.ascontiguousarray(texture.pixels).tobytes())
+            self._texture_hashes[key] = digest.hexdigest()
+        return self._texture_hashes[key]
+
+    def request(self, scene, material_id):
+        """界面绘制可见行时调用; 已驻留时返回 (纹理, uv0, uv1), 否则返回 None 并排队生成"""
+        key = thumbnail_key(scene, material_id, lambda texture: self.texture_hash(scene, texture))
+        self._requested[key] = material_id
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        self._slots.move_to_end(key)
+        return (self.texture_id, *self._slot_uv(slot))
+
+    def update(self, scene):
+        """每帧在可见行请求之后调用: 处理磁盘读取结果, 并批量渲染缺失的缩略图"""
+        if not self.initialized:
+            self.initialize()
+        requested, self._requested = self._requested, {}
+
+        # 新请求先在后台查磁盘缓存
+        for key, material_id in requested.items():
+            if key in self._slots or key in self._loading or key in self._pending_render:
+                continue
+            self._loading[key] = (material_id, self._io.submit(_load_cached, self._cache_path(key)))
+
+        for key, (material_id, future) in list(self._loading.items()):
+            if not future.done():
+                continue
+            del self._loading[key]
+            pixels = future.result()
+            if pixels is not None and pixels.shape[:2] == (THUMBNAIL_SIZE, THUMBNAIL_SIZE):
+                slot = self._allocate(key, requested)
+                if slot is not None:
+                    self._upload(slot, pixels)
+                    self.loaded += 1
+            elif key in requested:
+                self._pending_render[key] = material_id
+
+        # 只渲染仍然可见的缺失项, 滚出视野的请求直接丢弃
+        batch = []
+        for key in list(self._pending_render):
+            material_id = self._pending_render.pop(key)
+            if key not in requested or material_id >= len(scene.material_names):
+                continue
+            slot = self._allocate(key, requested)
+            if slot is None:
+                break
+            batch.append((key, material_id, slot))
+            if len(batch) >= BATCH_SIZE:
+                break
+        if batch:
+            self._render_batch(scene, batch)
+        self._save_settled(time.perf_counter() - self.save_delay)
+        self.readback.poll()
+
+    def _allocate(self, key, requested):
+        """分配槽位, 必要时淘汰最久未使用且本帧不可见的缩略图"""
+        if not self._free:
+            for old in self._slots:
+                if old not in requested:
+                    self._free.append(self._slots.pop(old))
+                    break
+            else:
+                return None
+        slot = self._free.pop()
+        self._slots[key] = slot
+        return slot
+
+    def _save_settled(self, before):
+        """把 before 之前渲染、之后没有再变化的缩略图从图集读回并写盘"""
+        settled = []
+        for material_id, (key, rendered) in list(self._unsaved.items()):
+            if rendered > before:
+                continue
+            del self._unsaved[material_id]
+            # 已被淘汰的缩略图下次可见时重新渲染, 那时再写盘
+            if key in self._slots:
+                settled.append((key, self._slots[key]))
+        if not settled:
+            return
+        # 一次读回覆盖这些槽位的矩形区域
+        origins = np.array([self._slot_origin(slot) for _, slot in settled])
+        x0, y0 = origins.min(axis=0)
+        x1, y1 = origins.max(axis=0) + THUMBNAIL_SIZE
+        slots = [(self._cache_path(key), int(x - x0), int(y - y0)) for (key, _), (x, y) in zip(settled, origins)]
+        self.readback.capture_region(self.framebuffer, int(x0), int(y0), int(x1 - x0), int(y1 - y0), slots)
+
+        self._saved_since_trim += len(settled)
+        if self._saved_since_trim >= TRIM_INTERVAL:
+            self._saved_since_trim = 0
+            self._io.submit(trim_cache, self.cache_dir, self.cache_limit)
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".png")
+
+    def _slot_origin(self, slot):
+        return (slot % ATLAS_COLUMNS) * THUMBNAIL_SIZE, (slot // ATLAS_COLUMNS) * THUMBNAIL_SIZE
+
+    def _upload(self, slot, pixels):
+        x, y = self._slot_origin(slot)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        # 缓存文件第一行在上, 帧缓冲第一行在下
+        gl.glTexSubImage2D(gl.GL_TEXTURE_2D, 0, x, y, THUMBNAIL_SIZE, THUMBNAIL_SIZE,
+                           gl.GL_RGB, gl.GL_UNSIGNED_BYTE, np.ascontiguousarray(pixels[::-1]))
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+
+    def _gl_texture(self, scene, texture_id):
+        key = (id(scene), texture_id)
+        if key not in self._gl_textures:
+            texture = scene.texture(texture_id)
+            self._gl_textures[key] = self.engine.load_texture(texture.path)
+        return self._gl_textures[key]
+
+    def _render_batch(self, scene, batch):
+        """一次渲染通道: 每个缩略图一个视口区域, 画一个受光照的球"""
+        view = pyrr.matrix44.create_look_at(
+            np.array([0.0, 0.0, 1.6]), np.array([0.0, 0.0, 0.0]), np.array([0.0, 1.0, 0.0])
+        ).astype(np.float32)
+        projection = pyrr.matrix44.create_perspective_projection(40.0, 1.0, 0.1, 10.0).astype(np.float32)
+
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+        gl.glEnable(gl.GL_SCISSOR_TEST)
+        gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_FILL)
+        gl.glUseProgram(self.shader)
+        gl.glUniformMatrix4fv(gl.glGetUniformLocation(self.shader, "view"), 1, gl.GL_FALSE, view)
+        gl.glUniformMatrix4fv(gl.glGetUniformLocation(self.shader, "projection"), 1, gl.GL_FALSE, projection)
+        gl.glUniform3f(gl.glGetUniformLocation(self.shader, "background"), *BACKGROUND)
+        gl.glUniform1i(gl.glGetUniformLocation(self.shader, "albedoMap"), 0)
+        params_location = gl.glGetUniformLocation(self.shader, "params")
+        color_location = gl.glGetUniformLocation(self.shader, "color")
+        use_texture_location = gl.glGetUniformLocation(self.shader, "useTexture")
+        gl.glBindVertexArray(self.vao)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+
+        for _, material_id, slot in batch:
+            x, y = self._slot_origin(slot)
+            gl.glViewport(x, y, THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+            gl.glScissor(x, y, THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+            gl.glClearColor(*BACKGROUND, 1.0)
+            gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+
+            params = scene.materials[material_id]
+            gl.glUniform3f(color_location, *params[0:3])
+            gl.glUniform3f(params_location, *params[3:6])
+            texture = int(scene.material_textures[material_id])
+            gl.glUniform1i(use_texture_location, int(texture >= 0))
+            if texture >= 0:
+                gl.glBindTexture(gl.GL_TEXTURE_2D, self._gl_texture(scene, texture))
+            gl.glDrawElements(gl.GL_TRIANGLES, self.index_count, gl.GL_UNSIGNED_INT, None)
+
+        gl.glBindVertexArray(0)
+        gl.glDisable(gl.GL_SCISSOR_TEST)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+
+        # 编辑中的材质每次变化都会重新渲染, 参数稳定之后才写入磁盘缓存
+        rendered = time.perf_counter()
+        for key, material_id, _ in batch:
+            self._unsaved[material_id] = (key, rendered)
+        self.rendered += len(batch)
+
+    def cleanup(self):
+        if self.initialized:
+            # 退出前写入还没稳定的缩略图
+            self._save_settled(float("inf"))
+            self.readback.cleanup()
+        self._io.shutdown(wait=True)
+        if not self.initialized:
+            return
+        gl_resources.delete("framebuffer", self.framebuffer)
+        gl_resources.delete("texture", self.texture_id, *self._gl_textures.values())
+        gl_resources.delete("renderbuffer", self.renderbuffer)
+        gl_resources.delete("vertex_array", self.vao)
+        gl_resources.delete("buffer", self.vbo, self.ebo)
+        gl_resources.delete("program", self.shader)
+        self._gl_textures = {}
+        self.initialized = False
+
+
+THUMBNAIL_VERTEX_SHADER = """
+#version 330 core
+layout (location = 0) in vec3 aPos;
+layout (location = 1) in vec3 aNormal;
+layout (location = 2) in vec2 aTexCoords;
+
+out vec3 FragPos;
+out vec3 Normal;
+out vec2 TexCoords;
+
+uniform mat4 view;
+uniform mat4 projection;
+
+void main()
+{
+    FragPos = aPos;
+    Normal = aNormal;
+    TexCoords = aTexCoords;
+    gl_Position = projection * view * vec4(aPos, 1.0);
+}
+"""
+
+THUMBNAIL_FRAGMENT_SHADER = """
+#version 330 core
+out vec4 FragColor;
+
+in vec3 FragPos;
+in vec3 Normal;
+in vec2 TexCoords;
+
+uniform vec3 color;
+uniform vec3 params;  // 金属度, 粗糙度, 不透明度
+uniform vec3 background;
+uniform bool useTexture;
+uniform sampler2D albedoMap;
+
+void main()
+{
+    vec3 albedo = color;
+    if (useTexture)
+        albedo *= texture(albedoMap, TexCoords).rgb;
+    float metallic = params.x;
+    float roughness = max(params.y, 0.02);
+
+    vec3 norm = normalize(Normal);
+    vec3 lightDir = normalize(vec3(-0.6, 0.8, 0.9));
+    vec3 viewDir = normalize(vec3(0.0, 0.0, 1.6) - FragPos);
+    vec3 halfDir = normalize(lightDir + viewDir);
+
+    // 粗糙度换算为高光指数, 金属的高光带有基础色
+    float shininess = 2.0 / (roughness * roughness * roughness * roughness) - 2.0;
+    float diff = max(dot(norm, lightDir), 0.0);
+    float spec = pow(max(dot(norm, halfDir), 0.0), clamp(shininess, 1.0, 2048.0));
+    vec3 specColor = mix(vec3(0.04), albedo, metallic);
+
+    vec3 result = albedo * (1.0 - metallic) * (0.15 + 0.85 * diff) + specColor * spec * (1.0 - roughness * 0.5);
+    FragColor = vec4(mix(background, result, params.z), 1.0);
+}
+"""
@@ -0,0 +1,213 @@
+import numpy as np
+import OpenGL.GL as gl
+import pyrr
+
+from renderer import gl_resources
+from renderer.dynamic_resolution import DynamicResolution, GpuTimer
+from renderer.pos import SpaceConverter
+from renderer.scene_pipeline import frustum_planes
+
+# 正交视图的默认相机: (位置, 朝向, 上方向)
+ORTHO_CAMERAS = {
+    "top": ((0.0, 10.0, 0.0), (0.0, -1.0, 0.0), (0.0, 0.0, -1.0)),
+    "front": ((0.0, 0.0, 10.0), (0.0, 0.0, -1.0), (0.0, 1.0, 0.0)),
+    "side": ((10.0, 0.0, 0.0), (-1.0, 0.0, 0.0), (0.0, 1.0, 0.0)),
+}
+# 帧缓冲附件的尺寸向上取整到该像素数的倍数, 在同一档内调整窗口大小不重新分配
+ATTACHMENT_BUCKET = 256
+
+
+def attachment_size(width, height):
+    return (-(-width // ATTACHMENT_BUCKET) * ATTACHMENT_BUCKET,
+            -(-height // ATTACHMENT_BUCKET) * ATTACHMENT_BUCKET)
+
+
+class Viewport:
+    """一个视口: 拥有自己的相机和帧缓冲, 着色器、网格和纹理由 RenderEngine 共享"""
+
+    def __init__(self, name, projection="perspective", width=800, height=600):
+        self.name = name
+        self.projection = projection
+        if projection in ORTHO_CAMERAS:
+            position, front, up = ORTHO_CAMERAS[projection]
+        else:
+            position, front, up = (0.0, 0.0, 3.0), (0.0, 0.0, -1.0), (0.0, 1.0, 0.0)
+        self.camera_pos = np.array(position, dtype=np.float32)
+        self.camera_front = np.array(front, dtype=np.float32)
+        self.camera_up = np.array(up, dtype=np.float32)
+        self.fov = 45.0
+        self.ortho_size = 3.0
+        self.near = 0.1
+        self.far = 100.0
+        self.width = width
+        self.height = height
+
+        self.framebuffer = None
+        self.texture_id = None
+        self.renderbuffer = None
+        # 附件的实际尺寸, 不小于 width/height; 渲染只使用左下角
+        self.texture_width = 0
+        self.texture_height = 0
+
+        # 动态分辨率: 实际渲染尺寸为 width/height 乘以 render_scale
+        self.dynamic_resolution = DynamicResolution()
+        self.gpu_timer = None
+        self.interacting = False
+        self.render_scale = 1.0
+        self.render_width = width
+        self.render_height = height
+        self.gpu_time_ms = 0.0
+
+        # 可见性和脏标记: 不可见的视口不渲染, 可见但没有变化的视口复用上一帧结果
+        self.visible = True
+        self.dirty = True
+        self._last_key = None
+        # 上一次渲染使用的绘制列表
+        self.packet = None
+        # 世界坐标与画布像素坐标之间的批量转换, 用于顶点手柄和标签
+        self.spaces = SpaceConverter(self)
+
+    def create(self):
+        """创建帧缓冲和计时查询"""
+        self.framebuffer = gl_resources.create("framebuffer", self, self.name)
+        self.__attach(*attachment_size(self.width, self.height))
+        self.gpu_timer = GpuTimer()
+        self.dirty = True
+
+    def __attach(self, width, height):
+        """从对象池取得颜色纹理和深度模板缓冲并挂到帧缓冲上, 旧的附件延迟释放"""
+        pool = gl_resources.POOL
+        old = self.texture_id, self.renderbuffer
+        self.texture_id = pool.acquire_texture(self, f"{self.name} color", width, height, gl.GL_RGB, gl.GL_RGB, 3)
+        self.renderbuffer = pool.acquire_renderbuffer(self, f"{self.name} depth", width, height,
+                                                      gl.GL_DEPTH24_STENCIL8)
+        self.texture_width, self.texture_height = width, height
+
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+        gl.glFramebufferTexture2D(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0,
+                                  gl.GL_TEXTURE_2D, self.texture_id, 0)
+        gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, gl.GL_DEPTH_STENCIL_ATTACHMENT,
+                                     gl.GL_RENDERBUFFER, self.renderbuffer)
+        # 检查帧缓冲是否完整
+        if gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER) != gl.GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("帧缓冲不完整")
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        gl_resources.release("texture", old[0])
+        gl_resources.release("renderbuffer", old[1])
+
+    def resize(self, width, height):
+        """调整渲染尺寸, 尺寸不变时不重新分配"""
+        if width <= 0 or height <= 0:
+            return
+        if width == self.width and height == self.height:
+            return
+
+        self.width = width
+        self.height = height
+
+        # 只有跨过尺寸档位时才更换附件, 拖动窗口边缘时大多数帧不分配显存
+        size = attachment_size(width, height)
+        if self.framebuffer is not None and size != (self.texture_width, self.texture_height):
+            self.__attach(*size)
+        self.dirty = True
+
+    def set_visible(self, visible):
+        if visible and not self.visible:
+            # 重新可见时内容可能已经过期
+            self.dirty = True
+        self.visible = visible
+
+    def view_matrix(self):
+        return pyrr.matrix44.create_look_at(
+            self.camera_pos,
+            self.camera_pos + self.camera_front,
+            self.camera_up
+        )
+
+    def projection_matrix(self, aspect=None):
+        aspect = aspect or self.width / self.height
+        if self.projection == "perspective":
+            return pyrr.matrix44.create_perspective_projection(self.fov, aspect, self.near, self.far)
+        half_h = self.ortho_size
+        half_w = self.ortho_size * aspect
+        return pyrr.matrix44.create_orthogonal_projection(
+            -half_w, half_w, -half_h, half_h, self.near, self.far
+        )
+
+    def frustum_planes(self):
+        """视锥的 6 个平面 (6, 4), 法线朝内且已归一化"""
+        return frustum_planes(self.view_matrix(), self.projection_matrix())
+
+    def intersects_spheres(self, centers, radii):
+        """任一包围球 (centers (N, 3), radii (N,)) 与视锥相交时返回 True"""
+        if not len(centers):
+            return False
+        planes = self.frustum_planes()
+        distances = centers @ planes[:, :3].T + planes[:, 3]
+        return bool(np.all(distances >= -radii[:, None], axis=1).any())
+
+    def update_render_scale(self):
+        """根据相机是否移动和上一次测得的 GPU 耗时决定本帧的渲染比例, 返回相机是否移动"""
+        key = (*self.camera_pos.tolist(), *self.camera_front.tolist(), *self.camera_up.tolist(),
+               self.fov, self.ortho_size)
+        camera_moved = self._last_key is not None and key != self._last_key
+        self._last_key = key
+
+        self.gpu_timer.poll()
+        if self.gpu_timer.last_ms is not None:
+            self.gpu_time_ms = self.gpu_timer.last_ms
+        scale = self.dynamic_resolution.update(
+            self.gpu_timer.last_ms, self.gpu_timer.last_tag, self.interacting or camera_moved
+        )
+        if scale != self.render_scale:
+            self.dirty = True
+        self.render_scale = scale
+        self.render_width = max(1, int(self.width * scale))
+        self.render_height = max(1, int(self.height * scale))
+        if camera_moved:
+            self.dirty = True
+        return camera_moved
+
+    def get_texture_uv(self):
+        """返回显示渲染结果时使用的 uv0, uv1 (已翻转 Y 轴), 低分辨率时由采样器线性放大"""
+        u = self.render_width / self.texture_width
+        v = self.render_height / self.texture_height
+        return (0, v), (u, 0)
+
+    def cleanup(self):
+        if self.framebuffer is None:
+            return
+        gl_resources.release("framebuffer", self.framebuffer)
+        gl_resources.release("texture", self.texture_id)
+        gl_resources.release("renderbuffer", self.renderbuffer)
+        self.gpu_timer.cleanup()
+        self.framebuffer = self.texture_id = self.renderbuffer = None
+
+
+class ImageTexture:
+    """显示 CPU 生成的图像(如软件渲染结果)的纹理, 尺寸不变时只更新内容"""
+
+    def __init__(self):
+        self.texture_id = None
+        self.width = 0
+        self.height = 0
+
+    def upload(self, image):
+        """image 为 (H, W, 3) uint8, 第一行在上"""
+        height, width = image.shape[:2]
+        if (width, height) != (self.width, self.height):
+            # 尺寸变化时换一张池中的纹理, 旧纹理可能还在被上一帧的界面绘制使用
+            gl_resources.release("texture", self.texture_id)
+            self.texture_id = gl_resources.POOL.acquire_texture(self, "image", width, height, gl.GL_RGB, gl.GL_RGB, 3)
+            self.width, self.height = width, height
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        gl.glTexSubImage2D(gl.GL_TEXTURE_2D, 0, 0, 0, width, height,
+                           gl.GL_RGB, gl.GL_UNSIGNED_BYTE, image)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+
+    def cleanup(self):
+        if self.texture_id is not None:
+            gl_resources.release("texture", self.texture_id)
+            self.texture_id = None
+            self.width = self.height = 0
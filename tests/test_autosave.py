@@ -0,0 +1,48 @@
+import os
+
+from Editor.autosave import AutoSaver, autosave_path
+from Stores.projectStore import ProjectStore
+
+
+def _project(tmp_path, monkeypatch):
+    project = ProjectStore()
+    project.path = str(tmp_path / "scene.xcp")
+    snapshots = []
+    snapshot = project.snapshot
+    monkeypatch.setattr(project, "snapshot", lambda groups=None: snapshots.append(groups) or snapshot(groups))
+    return project, snapshots
+
+
+def test_clean_project_is_not_written(tmp_path, monkeypatch):
+    project, snapshots = _project(tmp_path, monkeypatch)
+    project.scene.dirty.clear()
+    saver = AutoSaver(interval=0.0)
+    saver.tick(project)
+    saver.wait()
+    assert snapshots == []
+    assert not os.path.exists(autosave_path(project.path))
+
+
+def test_reset_waits_for_changes_before_full_write(tmp_path, monkeypatch):
+    project, snapshots = _project(tmp_path, monkeypatch)
+    saver = AutoSaver(interval=0.0)
+    project.scene.mark_dirty("transforms")
+    saver.tick(project)
+    saver.wait()
+    assert snapshots == [None]
+    assert saver.last_error is None
+
+    # 手动保存之后没有修改, 不重写整个项目
+    saver.reset()
+    saver.tick(project)
+    saver.wait()
+    assert snapshots == [None]
+
+    # 有修改后才写入完整项目, 之后只追加脏区块
+    project.scene.mark_dirty("transforms")
+    saver.tick(project)
+    saver.wait()
+    project.scene.mark_dirty("transforms")
+    saver.tick(project)
+    saver.wait()
+    assert snapshots == [None, None, {"transforms"}]
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+from batch_render import render_complete
+
+
+class FakeStreamer:
+    """每次 update 上传一级, 目标级别由上一次渲染的请求决定"""
+
+    def __init__(self, tail):
+        self.resident = tail
+        self.requested = tail
+        self.target = tail
+        self.waits = 0
+
+    @property
+    def settled(self):
+        return self.resident == self.target
+
+    def wait(self):
+        self.waits += 1
+
+    def update(self):
+        self.target = self.requested
+        if self.resident > self.target:
+            self.resident -= 1
+            return True
+        return False
+
+
+class FakeRender:
+    def __init__(self, streamer):
+        self.material_table = SimpleNamespace(streamer=streamer)
+        self.rendered = []
+
+    def sync_scene(self, scene):
+        if self.material_table.streamer.update():
+            self.viewport.dirty = True
+
+    def render_viewport(self, viewport, time):
+        if not viewport.dirty:
+            return
+        viewport.dirty = False
+        streamer = self.material_table.streamer
+        self.rendered.append(streamer.resident)
+        streamer.requested = 0
+
+
+def test_render_complete_waits_for_requested_levels():
+    streamer = FakeStreamer(tail=4)
+    render = FakeRender(streamer)
+    viewport = render.viewport = SimpleNamespace(dirty=True)
+    render_complete(render, viewport, None, 0.0)
+    # 最后一次渲染时完整级别已经驻留
+    assert render.rendered[-1] == 0
+    assert streamer.settled
+
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from Stores.projectStore import ProjectStore
+from Stores.sceneStore import SceneStore
+from Utiles.chunkfile import ChunkAppender, ChunkReader, ChunkWriter
+
+
+def test_empty_array_round_trip(tmp_path):
+    path = tmp_path / "empty.proj"
+    with ChunkWriter(str(path)) as writer:
+        writer.write_array("empty", np.zeros((0, 4, 4), dtype=np.float32))
+        writer.write_array("data", np.arange(6, dtype=np.int32))
+    with ChunkReader(str(path)) as reader:
+        empty = reader.read_array("empty")
+        assert empty.shape == (0, 4, 4) and empty.dtype == np.float32
+        assert reader.view_array("empty").shape == (0, 4, 4)
+        np.testing.assert_array_equal(reader.read_array("data"), np.arange(6, dtype=np.int32))
+
+
+def test_save_and_open_empty_scene(tmp_path):
+    path = str(tmp_path / "scene.proj")
+    store = ProjectStore()
+    store.scene = SceneStore()
+    store.save(path)
+    store.close()
+
+    loaded = ProjectStore()
+    loaded.open(path)
+    try:
+        assert len(loaded.scene.names) == 0
+    finally:
+        loaded.close()
+
+
+@pytest.mark.parametrize("content", [b"", b"ABC", b"not a project file at all, just some text" * 4])
+def test_non_project_file_raises_value_error(tmp_path, content):
+    path = tmp_path / "other.txt"
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        ChunkReader(str(path))
+    with pytest.raises(ValueError):
+        ChunkAppender(str(path))
+
+
+def test_corrupt_toc_raises_value_error(tmp_path):
+    path = tmp_path / "broken.proj"
+    with ChunkWriter(str(path)) as writer:
+        writer.write_json("editor", {})
+    data = bytearray(path.read_bytes())
+    data[-4:] = b"\xff\xfe\x00{"
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        ChunkReader(str(path))
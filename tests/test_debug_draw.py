@@ -0,0 +1,39 @@
+import numpy as np
+import pyrr
+
+from renderer.debug_draw import NORMAL_VERTEX_SIZE, normal_matrices, normal_segments
+
+
+def _world_lines(vertices, models, length):
+    """与 DEBUG_NORMAL_VERTEX_SHADER 相同的计算, 行向量约定"""
+    segments = normal_segments(vertices)
+    lines = []
+    for model, normal_matrix in zip(models, normal_matrices(models)):
+        world = np.c_[segments[:, 0:3], np.ones(len(segments))] @ model
+        normal = segments[:, 3:6] @ normal_matrix
+        normal /= np.linalg.norm(normal, axis=1, keepdims=True)
+        lines.append(world[:, :3] + normal * (length * segments[:, 6:7]))
+    return np.concatenate(lines)
+
+
+def test_normal_segments_layout():
+    vertices = np.arange(16, dtype=np.float32).reshape(2, 8)
+    segments = normal_segments(vertices)
+    assert segments.shape == (4, NORMAL_VERTEX_SIZE)
+    np.testing.assert_array_equal(segments[:, 6], [0.0, 1.0, 0.0, 1.0])
+    np.testing.assert_array_equal(segments[2, :6], vertices[1, :6])
+
+
+def test_normals_stay_perpendicular_under_non_uniform_scale():
+    # 斜面上的一个顶点, 法线 (1, 1, 0) / sqrt(2)
+    vertices = np.array([[1.0, 0.0, 0.0, 0.70710677, 0.70710677, 0.0, 0.0, 0.0]], dtype=np.float32)
+    scale = pyrr.matrix44.create_from_scale([4.0, 1.0, 1.0]).astype(np.float32)
+    translation = pyrr.matrix44.create_from_translation([0.0, 2.0, 0.0]).astype(np.float32)
+    model = scale @ translation
+
+    start, end = _world_lines(vertices, model[None], 0.5)
+    np.testing.assert_allclose(start, [4.0, 2.0, 0.0], atol=1e-5)
+    direction = end - start
+    assert abs(np.linalg.norm(direction) - 0.5) < 1e-5
+    # 缩放后斜面的切线 (1, -1, 0) 变为 (4, -1, 0), 法线必须与它垂直
+    assert abs(direction @ np.array([4.0, -1.0, 0.0])) < 1e-5
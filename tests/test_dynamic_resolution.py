@@ -0,0 +1,23 @@
+from renderer.dynamic_resolution import DynamicResolution
+
+
+def _settle(dynamic, gpu_ms, scale, frames=10):
+    for _ in range(frames):
+        dynamic.update(gpu_ms, scale, False)
+    return dynamic.scale
+
+
+def test_rest_scale_respects_budget():
+    dynamic = DynamicResolution(target_ms=10.0, rest_target_ms=20.0)
+    # 全分辨率需要 80 ms, 静止时也应降到约一半
+    assert abs(_settle(dynamic, 80.0, 1.0) - 0.5) < 1e-6
+    # 之后的测量落在滞回区间内, 比例保持不变
+    assert _settle(dynamic, 21.0, 0.5) == 0.5
+
+
+def test_rest_returns_to_full_resolution_within_budget():
+    dynamic = DynamicResolution(target_ms=10.0, rest_target_ms=20.0)
+    for _ in range(5):
+        dynamic.update(40.0, 1.0, True)
+    assert dynamic.scale < 1.0
+    assert _settle(dynamic, 5.0, dynamic.scale) == 1.0
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("imgui")
+
+from Stores.sceneStore import NodeKind, SceneStore
+from Views.hierarchy import HierarchyView
+
+
+def test_deep_chain_collects_without_recursion():
+    count = 5000
+    scene = SceneStore()
+    scene.add_nodes([f"node_{i}" for i in range(count)], np.arange(-1, count - 1), np.full(count, NodeKind.GROUP))
+    view = HierarchyView()
+    view.bind(scene)
+    view._expanded[:] = True
+    view.rebuild()
+    np.testing.assert_array_equal(view._rows, np.arange(count))
+    np.testing.assert_array_equal(view._depths, np.arange(count))
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from renderer.readback import SequenceRecorder
+
+
+def _viewport(scale):
+    return SimpleNamespace(
+        visible=True, dirty=False, render_scale=scale, dynamic_resolution=SimpleNamespace(enabled=True),
+    )
+
+
+def _recorder():
+    recorder = SequenceRecorder()
+    captured = []
+    recorder.readback.capture = lambda viewport, path: captured.append((path, viewport.render_scale))
+    recorder.readback.poll = lambda: None
+    return recorder, captured
+
+
+def test_screenshot_waits_for_full_resolution():
+    recorder, captured = _recorder()
+    viewport = _viewport(0.5)
+    recorder.screenshot(viewport, "shot.png")
+    assert captured == []
+    assert viewport.dirty and not viewport.dynamic_resolution.enabled
+
+    # 还没有以完整尺寸重绘
+    recorder.tick()
+    assert captured == []
+
+    viewport.render_scale = 1.0
+    recorder.tick()
+    assert captured == [("shot.png", 1.0)]
+    assert viewport.dynamic_resolution.enabled
+
+
+def test_screenshot_at_full_resolution_is_immediate():
+    recorder, captured = _recorder()
+    viewport = _viewport(1.0)
+    recorder.screenshot(viewport, "shot.png")
+    assert captured == [("shot.png", 1.0)]
+    assert viewport.dynamic_resolution.enabled and not viewport.dirty
@@ -0,0 +1,53 @@
+import threading
+
+import numpy as np
+
+from Stores import sceneIndex
+from Stores.sceneIndex import SceneIndex
+from Stores.sceneStore import NodeKind, SceneStore
+
+
+def _scene(count):
+    scene = SceneStore()
+    scene.add_nodes([f"node_{i}" for i in range(count)], np.full(count, -1), np.full(count, NodeKind.GROUP))
+    return scene
+
+
+def _linear(scene, text):
+    return [i for i in np.flatnonzero(scene.alive) if text.lower() in scene.names[i].lower()]
+
+
+def test_search_before_and_after_background_build():
+    scene = _scene(2000)
+    index = SceneIndex()
+    index.bind(scene)
+    # 无论后台索引是否建好, 结果都与逐个比较一致
+    assert index.search_name("de_12").tolist() == _linear(scene, "de_12")
+    assert index.wait(10.0)
+    assert index.search_name("de_12").tolist() == _linear(scene, "de_12")
+    assert index.search_name("E_7").tolist() == _linear(scene, "e_7")
+
+
+def test_changes_during_build_are_kept(monkeypatch):
+    # 让后台建立停在快照之后, 修改一定发生在建立期间
+    release = threading.Event()
+    build = sceneIndex._trigram_postings
+
+    def slow_build(names, ids):
+        release.wait(10.0)
+        return build(names, ids)
+
+    monkeypatch.setattr(sceneIndex, "_trigram_postings", slow_build)
+    scene = _scene(2000)
+    index = SceneIndex()
+    index.bind(scene)
+    scene.rename_node(5, "renamed")
+    scene.remove_nodes(np.array([12]))
+    scene.add_nodes(["node_new"], np.array([-1]), np.array([NodeKind.GROUP]))
+    assert index.search_name("renamed").tolist() == [5]
+    release.set()
+    assert index.wait(10.0)
+    assert index.search_name("renamed").tolist() == [5]
+    assert 5 not in index.search_name("node_5").tolist()
+    assert 12 not in index.search_name("node_12").tolist()
+    assert index.search_name("node_new").tolist() == [2000]
@@ -0,0 +1,44 @@
+import time
+
+import numpy as np
+import pyrr
+
+from Stores.sceneStore import SceneStore
+from renderer.scene_pipeline import CameraInput, ScenePipeline, SceneSnapshot
+
+
+def _camera():
+    view = pyrr.matrix44.create_look_at((0.0, 0.0, 5.0), (0.0, 0.0, 0.0), (0.0, 1.0, 0.0)).astype(np.float32)
+    projection = pyrr.matrix44.create_perspective_projection(45.0, 1.0, 0.1, 100.0).astype(np.float32)
+    return [CameraInput("main", view, projection, 600)]
+
+
+def test_flush_returns_packet_of_requested_scene_version():
+    pipeline = ScenePipeline()
+    try:
+        old = SceneStore.default()
+        pipeline.submit(SceneSnapshot.capture(old, 0), _camera())
+        assert pipeline.flush(0).scene_version == 0
+
+        for attempt in range(20):
+            version = attempt + 1
+            pipeline.submit(SceneSnapshot.capture(SceneStore(), version), _camera())
+            # 让工作线程有机会先取走输入, flush 仍然必须等到这个版本
+            time.sleep(0.001 * (attempt % 3))
+            packet = pipeline.flush(version)
+            assert packet.scene_version == version
+            assert all(len(view.nodes) == 0 for view in packet.views.values())
+    finally:
+        pipeline.stop()
+
+
+def test_casters_carry_their_mesh_ids():
+    pipeline = ScenePipeline()
+    try:
+        scene = SceneStore.default()
+        pipeline.submit(SceneSnapshot.capture(scene, 0), _camera())
+        packet = pipeline.flush(0)
+        assert len(packet.caster_nodes)
+        assert np.array_equal(packet.caster_mesh_ids, scene.mesh_ids[packet.caster_nodes])
+    finally:
+        pipeline.stop()
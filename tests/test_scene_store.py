@@ -0,0 +1,28 @@
+import numpy as np
+
+from Stores.sceneStore import SceneStore
+from renderer.dirty_ranges import DirtyRanges
+
+
+def test_set_transforms_moves_zero_scale_axis():
+    scene = SceneStore.default()
+    ids = np.arange(len(scene.names))
+    scene.transforms[:, 6:9] = [[0.0, 1.0, 3.0]]
+    scene.set_transforms(ids, 6, [0.0, 2.0, 5.0], [False, True, False])
+    np.testing.assert_array_equal(scene.transforms[:, 6:9], np.tile([0.0, 2.0, 3.0], (len(ids), 1)))
+    scene.set_transforms(ids, 6, [4.0, 2.0, 3.0], [True, False, False])
+    assert np.all(scene.transforms[:, 6] == 4.0)
+
+
+def test_dirty_ranges_report_touched_rows():
+    scene = SceneStore.default()
+    ranges = DirtyRanges()
+    ranges.sync(scene)
+    assert ranges.changed["transforms"] == (0, len(scene.names))
+
+    ranges.sync(scene)
+    assert ranges.changed == {}
+
+    scene.set_transforms(np.array([1]), 0, [1.0, 2.0, 3.0])
+    ranges.sync(scene)
+    assert ranges.changed == {"transforms": (1, 2)}
@@ -0,0 +1,71 @@
+import gc
+import threading
+
+from Utiles.signal import AUTO, QUEUED, Signal, dispatch_queued
+
+
+class Receiver:
+    def __init__(self):
+        self.received = []
+        # 循环引用, 只能由循环垃圾回收释放
+        self.cycle = self
+
+    def slot(self, *args):
+        self.received.append(args)
+
+
+def test_direct_emit_and_single_connection():
+    signal = Signal()
+    receiver = Receiver()
+    signal.connect(receiver.slot)
+    signal.connect(receiver.slot)
+    signal.emit(1, 2)
+    assert receiver.received == [(1, 2)]
+    assert len(signal) == 1
+
+
+def test_collected_receiver_is_disconnected():
+    signal = Signal()
+    receiver = Receiver()
+    signal.connect(receiver.slot)
+    del receiver
+    gc.collect()
+    signal.emit()
+    assert len(signal) == 0
+
+
+def test_queued_and_auto_from_other_thread():
+    signal = Signal()
+    queued, auto = Receiver(), Receiver()
+    signal.connect(queued.slot, QUEUED)
+    signal.connect(auto.slot, AUTO)
+    thread = threading.Thread(target=signal.emit, args=("worker",))
+    thread.start()
+    thread.join()
+    assert queued.received == [] and auto.received == []
+    assert dispatch_queued() == 2
+    assert queued.received == [("worker",)] and auto.received == [("worker",)]
+    signal.emit("main")
+    assert auto.received[-1] == ("main",)
+    dispatch_queued()
+
+
+def test_gc_during_connect_does_not_deadlock():
+    signal = Signal()
+
+    def churn():
+        threshold = gc.get_threshold()
+        gc.set_threshold(1, 1, 1)
+        try:
+            for _ in range(500):
+                receiver = Receiver()
+                signal.connect(receiver.slot)
+                del receiver
+                signal.disconnect(Receiver().slot)
+        finally:
+            gc.set_threshold(*threshold)
+
+    thread = threading.Thread(target=churn, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
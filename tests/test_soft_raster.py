@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from Stores.sceneStore import SceneStore
+from renderer.ds_engine import SHADING_LIT, SHADING_UNLIT
+from renderer.soft_raster import SoftwareRenderer
+from renderer.viewport import Viewport
+
+
+def settings(shading_mode, intensity):
+    return SimpleNamespace(
+        background_color=(0.0, 0.0, 0.0, 1.0), rotation_speed=0.0,
+        light_pos=np.array([1.2, 1.0, 2.0], np.float32),
+        light_color=np.array([1.0, 1.0, 1.0], np.float32), light_intensity=intensity,
+        backface_culling=True, shading_mode=shading_mode,
+    )
+
+
+def render(scene, shading_mode, intensity=0.0):
+    renderer = SoftwareRenderer()
+    try:
+        return renderer.render(scene, Viewport("Test", "perspective", 64, 48), 0.0, settings(shading_mode, intensity))
+    finally:
+        renderer.shutdown()
+
+
+def test_unlit_uses_material_color():
+    scene = SceneStore.default()
+    scene.materials[:, 0:3] = (1.0, 0.0, 0.0)
+    image = render(scene, SHADING_UNLIT)
+    assert image[..., 0].max() > 0
+    assert image[..., 1:].max() == 0
+
+
+def test_opacity_blends_with_background():
+    scene = SceneStore.default()
+    opaque = render(scene, SHADING_LIT, 1.0).astype(np.float32)
+    scene.materials[:, 5] = 0.5
+    half = render(scene, SHADING_LIT, 1.0).astype(np.float32)
+    assert half.sum() < opaque.sum()
@@ -0,0 +1,38 @@
+import os
+
+from renderer.thumbnails import THUMBNAIL_SIZE, ThumbnailRenderer, trim_cache
+
+
+def _write(path, size, mtime):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    os.utime(path, (mtime, mtime))
+
+
+def test_trim_cache_removes_least_recently_used(tmp_path):
+    for i in range(4):
+        _write(str(tmp_path / "ab" / f"{i}.png"), 100, 1000 + i)
+    assert trim_cache(str(tmp_path), 250) == 2
+    assert sorted(os.listdir(tmp_path / "ab")) == ["2.png", "3.png"]
+
+
+def test_edited_material_is_saved_once_settled(tmp_path):
+    thumbnails = ThumbnailRenderer(None)
+    thumbnails.cache_dir = str(tmp_path)
+    captured = []
+    thumbnails.readback.capture_region = lambda framebuffer, x, y, w, h, slots: captured.append((x, y, w, h, slots))
+    try:
+        # 拖动滑块: 同一材质连续渲染出三个不同的键, 只有最后一个需要写盘
+        for frame, key in enumerate(["k1", "k2", "k3"]):
+            thumbnails._slots[key] = frame
+            thumbnails._unsaved[0] = (key, float(frame))
+        thumbnails._save_settled(1.0)
+        assert captured == []
+
+        thumbnails._save_settled(2.0)
+        assert captured == [(2 * THUMBNAIL_SIZE, 0, THUMBNAIL_SIZE, THUMBNAIL_SIZE,
+                             [(os.path.join(str(tmp_path), "k3", "k3.png"), 0, 0)])]
+        assert thumbnails._unsaved == {}
+    finally:
+        thumbnails.cleanup()